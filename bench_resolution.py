@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Benchmark: AnySplat speed / size trade-off across input resolutions.
+
+Usage:
+    modal run bench_resolution.py
+    modal run bench_resolution.py --sizes 224,448 --views 1,8,24 --repeats 5
+
+What it does:
+  1. Renders synthetic inputs locally: `views` frames of a layered scene
+     (textured background + two foreground cards) seen by a camera that
+     slides sideways, so near layers shift more than far ones (parallax).
+  2. Runs AnySplatService.process_image once per (views, size) to warm
+     the container, then `repeats` timed runs, all at prune=True.
+  3. Prints a table per view count — round-trip and in-container
+     inference seconds (median), Gaussian count and artifact size, each
+     relative to 448 — and writes every run to `output` as JSON.
+
+Round trips include queueing and artifact upload; inference_seconds is
+AnySplat alone (see process_image).  The draft tier is worth offering
+where its inference time drops well below 448's while the Gaussian
+count stays usable.
+"""
+
+import modal
+
+app = modal.App("anysplat-bench")
+
+
+def synthetic_views(count: int, width: int = 640, height: int = 480, seed: int = 0) -> list[bytes]:
+    """JPEG frames of a three-layer scene under a sideways camera slide."""
+    import io
+
+    import numpy as np
+    from PIL import Image
+
+    rng = np.random.default_rng(seed)
+    pad = 24 * max(count, 1)
+    y, x, c = np.mgrid[:height, : width + pad, :3]
+    background = 120 + 50 * np.sin(x / 23 + c) * np.cos(y / 31) + rng.uniform(-20, 20, x.shape)
+    cards = [  # (left, top, size, px shift per frame, colour)
+        (width // 5, height // 4, height // 3, 8, (200, 60, 40)),
+        (width // 2, height // 2, height // 4, 16, (40, 90, 210)),
+    ]
+    frames = []
+    for i in range(count):
+        frame = background[:, 2 * i : 2 * i + width].copy()
+        for left, top, size, shift, colour in cards:
+            lx = left - shift * i + shift * count // 2
+            v, u = np.mgrid[:size, :size]
+            patch = np.asarray(colour) + 30 * np.sin(u / 5 + v / 7)[..., None]
+            x0, x1 = max(lx, 0), min(lx + size, width)
+            if x1 > x0:
+                frame[top : top + size, x0:x1] = patch[:, x0 - lx : x1 - lx]
+        buf = io.BytesIO()
+        Image.fromarray(frame.clip(0, 255).astype(np.uint8)).save(buf, format="JPEG", quality=92)
+        frames.append(buf.getvalue())
+    return frames
+
+
+@app.local_entrypoint()
+def main(sizes: str = "224,336,448", views: str = "1,8", repeats: int = 3, output: str = "bench_resolution.json"):
+    import json
+    import statistics
+    import time
+
+    from modal_app import ANYSPLAT_INPUT_SIZE, ANYSPLAT_INPUT_SIZES, AnySplatService
+
+    size_list = [int(s) for s in sizes.split(",")]
+    unknown = set(size_list) - set(ANYSPLAT_INPUT_SIZES)
+    if unknown:
+        print(f"❌ Unsupported size(s) {sorted(unknown)}; choose from {list(ANYSPLAT_INPUT_SIZES)}")
+        return
+    service = AnySplatService()
+    runs = []
+
+    for num_views in (int(v) for v in views.split(",")):
+        frames = synthetic_views(num_views)
+        names = [f"synthetic_{i:03d}.jpg" for i in range(num_views)]
+        print("\n" + "=" * 60)
+        print(f"{num_views} synthetic view(s), {sum(map(len, frames)) / 1024:.0f} KB")
+        print("=" * 60)
+        rows = {}
+        for size in size_list:
+            service.process_image.remote(frames, names, input_size=size)  # warm-up
+            timings = []
+            for _ in range(repeats):
+                t0 = time.time()
+                result = service.process_image.remote(frames, names, input_size=size)
+                timings.append((time.time() - t0, result["inference_seconds"]))
+                runs.append({
+                    "views": num_views,
+                    "input_size": size,
+                    "round_trip_seconds": round(timings[-1][0], 3),
+                    "inference_seconds": result["inference_seconds"],
+                    "num_gaussians": result["num_gaussians"],
+                    "artifact_bytes": result["artifact"]["size"],
+                })
+            rows[size] = {
+                "round_trip": statistics.median(t for t, _ in timings),
+                "inference": statistics.median(t for _, t in timings),
+                "gaussians": result["num_gaussians"],
+                "bytes": result["artifact"]["size"],
+            }
+
+        base = rows.get(ANYSPLAT_INPUT_SIZE) or rows[max(rows)]
+        print(f"{'size':>6} {'round trip':>12} {'inference':>12} {'gaussians':>14} {'artifact':>12}")
+        for size, row in rows.items():
+            print(
+                f"{size:>6} {row['round_trip']:>11.2f}s "
+                f"{row['inference']:>7.2f}s {row['inference'] / base['inference']:>4.0%} "
+                f"{row['gaussians']:>9,} {row['gaussians'] / base['gaussians']:>4.0%} "
+                f"{row['bytes'] / 1024**2:>7.1f} MB"
+            )
+
+    with open(output, "w") as f:
+        json.dump(runs, f, indent=2)
+    print(f"\n💾 Wrote {len(runs)} runs to {output}")
@@ -9,14 +9,17 @@ GEN3C: NVIDIA GEN3C-Cosmos-7B — generates orbit videos from a single image
   https://huggingface.co/nvidia/GEN3C-Cosmos-7B
 
 Pipeline (when GEN3C enabled):
-  1. GEN3C generates a 121-frame orbit video at 704×1280 from the input image.
-  2. We sample 12 evenly-spaced keyframes from that video.
+  1. GEN3C generates a 121-frame video at 704×1280 from the input image
+     along one clockwise orbit by default; opting into more trajectories
+     (counterclockwise, up) renders each in parallel on its own GPU.
+  2. We select up to 12 keyframes from each video — the fewest sharp frames
+     that cover its parallax — and merge them.
   3. Those frames are fed into AnySplat for denser 3DGS with fewer holes.
 
 Quality defaults (hardcoded for testing):
   diffusion_steps = 22   (high quality, ~4-6 min)
   movement_distance = 0.3 (wide orbit for strong parallax)
-  num_sampled_frames = 12  (gives AnySplat rich multi-view input)
+  num_sampled_frames = 12  (keyframe budget per video, gives AnySplat rich multi-view input)
 
 Deploy with: modal deploy modal_app.py
 """
@@ -182,472 +185,2926 @@ gen3c_image = (
     )
 )
 
+# ═════════════════════════════════════════════════════════════════════
+# IMAGE 3 — Web (CPU only, FastAPI)
+#   For the router (dispatch, status, uploads, artifacts); no torch, no CUDA.
+# ═════════════════════════════════════════════════════════════════════
+web_image = modal.Image.debian_slim(python_version="3.10").pip_install("fastapi[standard]")
+
+# ─────────────────────────────────────────────────────────────────────
+# Volumes (persistent caches for model weights)
+# ─────────────────────────────────────────────────────────────────────
+volume = modal.Volume.from_name("anysplat-cache", create_if_missing=True)
+gen3c_volume = modal.Volume.from_name("gen3c-cache", create_if_missing=True)
+
+# ─────────────────────────────────────────────────────────────────────
+# Result cache (content-addressed manifests on the anysplat-cache volume)
+#   Each entry is a small JSON manifest of a finished result; the splat
+#   files themselves live in the artifact store (see ARTIFACT_DIR).
+#   Bump RESULT_CACHE_VERSION whenever the reconstruction or export code
+#   changes in a way that alters the output for identical inputs.
+# ─────────────────────────────────────────────────────────────────────
+RESULT_CACHE_VERSION = 3  # 3: keyframe selection, near-duplicate filtering
+RESULT_CACHE_DIR = "/cache/results"
+RESULT_CACHE_MAX_BYTES = 20 * 1024**3  # 20 GB, evicted least-recently-used first
+
+ANYSPLAT_CHECKPOINT = "lhjiang/anysplat"
+GEN3C_CHECKPOINT = "nvidia/GEN3C-Cosmos-7B"
+
+# Flags passed to AnySplat's export_ply — part of every result cache key.
+#   • save_sh_dc_only=True  → DC-band only; full SH (degree 4) makes the
+#     file ~16× larger per Gaussian and exceeds Vercel's 4.5 MB response
+#     limit when transferred as base64.
+#   • shift_and_scale=True  → normalise the scene to [-1, 1]
+ANYSPLAT_EXPORT_FLAGS = {"shift_and_scale": True, "save_sh_dc_only": True}
+
+
+def _sha256(data: bytes) -> str:
+    import hashlib
+
+    return hashlib.sha256(data).hexdigest()
+
+
+def _result_cache_key(image_digests: list[str], **params) -> str:
+    """
+    Build the content-addressed key for a finished reconstruction.
+
+    `image_digests` are SHA-256 digests of the raw upload bytes, in upload
+    order (AnySplat anchors the scene on the first view, so order matters).
+    Filenames are deliberately NOT part of the key.  `params` must contain
+    every argument that changes the output (mode, GEN3C settings, export
+    flags, checkpoint); prompt/elevation are unused by AnySplat and omitted.
+    """
+    import json
+
+    payload = json.dumps(
+        {"version": RESULT_CACHE_VERSION, "images": image_digests, "params": params},
+        sort_keys=True,
+    )
+    return _sha256(payload.encode("utf-8"))
+
+
+def _result_cache_name(cache_key: str) -> str:
+    return f"{cache_key}.json"
+
+
+def _cache_result(cache_key: str, result: dict) -> None:
+    """Store a process_image result's manifest (artifact references, no bytes)."""
+    import json
+
+    _cache_write(
+        RESULT_CACHE_DIR, _result_cache_name(cache_key), json.dumps(result).encode("utf-8"), RESULT_CACHE_MAX_BYTES
+    )
+
+
+def _cached_result(cache_key: str) -> dict | None:
+    """Read a manifest written by _cache_result; an evicted artifact is a miss."""
+    import json
+
+    manifest = _cache_read(RESULT_CACHE_DIR, _result_cache_name(cache_key))
+    if manifest is None:
+        return None
+    result = json.loads(manifest)
+    artifacts = [result["artifact"]] + [lod["artifact"] for lod in result.get("lods", [])]
+    if not all(_touch_artifact(ARTIFACT_DIR, artifact["name"]) for artifact in artifacts):
+        return None
+    return result
+
+
+def _cache_read(root: str, name: str) -> bytes | None:
+    """Return a cached entry's bytes (bumping its LRU recency) or None."""
+    import os
+
+    path = os.path.join(root, name)
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except FileNotFoundError:
+        return None
+    os.utime(path)  # mtime doubles as the LRU timestamp
+    return data
+
+
+def _cache_write(root: str, name: str, data: bytes, max_bytes: int) -> None:
+    """Atomically write a cache entry, then evict down to `max_bytes`."""
+    import os
+    import uuid
+
+    os.makedirs(root, exist_ok=True)
+    path = os.path.join(root, name)
+    tmp_path = f"{path}.tmp-{uuid.uuid4().hex[:8]}"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+    _cache_evict(root, max_bytes, keep={name})
+
+
+def _cache_evict(root: str, max_bytes: int, keep: set[str] | None = None) -> int:
+    """
+    Size-bounded LRU eviction for a cache directory.
+
+    Every top-level file or directory under `root` is one entry; its
+    recency is its mtime (bumped on read).  Oldest entries are removed
+    until the total size fits in `max_bytes`.  Returns the number evicted.
+    """
+    import os
+    import shutil
+
+    keep = keep or set()
+    entries: list[tuple[float, int, str, bool]] = []
+    for entry in os.scandir(root):
+        if ".tmp-" in entry.name:
+            continue
+        if entry.is_dir():
+            size = sum(
+                os.path.getsize(os.path.join(dirpath, fn))
+                for dirpath, _, fns in os.walk(entry.path)
+                for fn in fns
+            )
+        else:
+            size = entry.stat().st_size
+        entries.append((entry.stat().st_mtime, size, entry.name, entry.is_dir()))
+
+    total = sum(size for _, size, _, _ in entries)
+    evicted = 0
+    for _, size, name, is_dir in sorted(entries):
+        if total <= max_bytes:
+            break
+        if name in keep:
+            continue
+        path = os.path.join(root, name)
+        if is_dir:
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            os.unlink(path)
+        total -= size
+        evicted += 1
+    if evicted:
+        print(f"🧹 Cache {root}: evicted {evicted} LRU entr{'y' if evicted == 1 else 'ies'}, "
+              f"{total / 1024**2:.0f} MB retained")
+    return evicted
+
+
+# ─────────────────────────────────────────────────────────────────────
+# Artifact store (content-addressed splat files on the anysplat-cache volume)
+#   process_image writes every finished file to ARTIFACT_DIR/<sha256>.<ext>
+#   and returns only its metadata; clients download it from the
+#   router's GET /artifacts endpoint (Range, ETag/If-None-Match, gzip).
+# ─────────────────────────────────────────────────────────────────────
+ARTIFACT_SUBDIR = "artifacts"
+ARTIFACT_DIR = f"/cache/{ARTIFACT_SUBDIR}"
+ARTIFACT_MAX_BYTES = 50 * 1024**3  # 50 GB, evicted least-recently-used first
+ARTIFACT_GZIP_FORMATS = ("ply",)  # compact / progressive are zlib-compressed already
+ARTIFACT_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+def _store_artifact(root: str, data: bytes, output_format: str, max_bytes: int = ARTIFACT_MAX_BYTES) -> dict:
+    """Write `data` under its content hash (no-op if present) and return its metadata."""
+    digest = _sha256(data)
+    name = f"{digest}.{OUTPUT_EXTENSIONS[output_format]}"
+    if not _touch_artifact(root, name):
+        _cache_write(root, name, data, max_bytes)
+    return {"name": name, "sha256": digest, "size": len(data), "format": output_format}
+
+
+def _touch_artifact(root: str, name: str) -> bool:
+    """Bump an artifact's LRU recency; False if it is not in the store."""
+    import os
+
+    try:
+        os.utime(os.path.join(root, name))
+    except FileNotFoundError:
+        return False
+    return True
+
+
+def _artifact_format(name: str) -> str | None:
+    """Output format of a well-formed artifact name ("<sha256>.<ext>"), else None."""
+    import re
+
+    match = re.fullmatch(r"[0-9a-f]{64}\.(\w+)", name)
+    if not match:
+        return None
+    formats = {ext: fmt for fmt, ext in OUTPUT_EXTENSIONS.items()}
+    return formats.get(match.group(1))
+
+
+def _parse_range(header: str, size: int) -> tuple[int, int] | None:
+    """
+    Parse a single-range "bytes=" Range header into an inclusive (start, end).
+
+    Returns None for headers we ignore (other units, multiple ranges), so
+    the caller serves the whole file; raises ValueError when unsatisfiable.
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, _, last = spec.strip().partition("-")
+    try:
+        if first:
+            start = int(first)
+            end = int(last) if last else size - 1
+        else:
+            start, end = max(size - int(last), 0), size - 1  # suffix range: last N bytes
+    except ValueError:
+        return None
+    if start < 0 or start >= size or end < start:
+        raise ValueError(f"Range {header!r} not satisfiable for {size} bytes")
+    return start, min(end, size - 1)
+
+
+def _artifact_gzip_name(name: str) -> str:
+    """Store name of an artifact's cached gzip encoding (never served by name)."""
+    return f"{name}.gz"
+
+
+def _serve_artifact(root: str, name: str, headers: dict, head: bool = False, max_bytes: int = ARTIFACT_MAX_BYTES):
+    """
+    Resolve a GET (or, with `head`, a HEAD) for an artifact into
+    (status, response headers, body).
+
+    `headers` are the request headers with lower-case names.  Supports
+    If-None-Match (→ 304), a single byte Range (→ 206 / 416, always on the
+    identity encoding) and gzip Content-Encoding for ARTIFACT_GZIP_FORMATS.
+    The gzip encoding is compressed on the first GET that asks for it and
+    kept next to the artifact (see _artifact_gzip_name) as its own LRU
+    entry.  A HEAD is answered from os.stat alone with an empty body and
+    Content-Length set; it reports the gzip encoding only once it is cached.
+    """
+    import gzip
+    import os
+
+    output_format = _artifact_format(name)
+    path = os.path.join(root, name)
+    try:
+        size = os.stat(path).st_size
+    except FileNotFoundError:
+        size = None
+    if output_format is None or size is None:
+        return 404, {}, b""
+    os.utime(path)
+
+    digest = name.split(".", 1)[0]
+    response_headers = {
+        "Accept-Ranges": "bytes",
+        "Cache-Control": ARTIFACT_CACHE_CONTROL,
+        "Content-Type": "application/octet-stream",
+        "ETag": f'"{digest}"',
+        "Vary": "Accept-Encoding",
+    }
+    offered = {tag.strip().removeprefix("W/") for tag in headers.get("if-none-match", "").split(",")}
+    if offered & {"*", f'"{digest}"', f'"{digest}-gzip"'}:
+        return 304, response_headers, b""
+
+    if "range" in headers:
+        try:
+            span = _parse_range(headers["range"], size)
+        except ValueError:
+            return 416, {**response_headers, "Content-Range": f"bytes */{size}"}, b""
+        if span is not None:
+            start, end = span
+            response_headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+            if head:
+                return 206, {**response_headers, "Content-Length": str(end - start + 1)}, b""
+            with open(path, "rb") as f:
+                f.seek(start)
+                body = f.read(end - start + 1)
+            return 206, response_headers, body
+
+    accepts_gzip = "gzip" in headers.get("accept-encoding", "").lower()
+    if output_format in ARTIFACT_GZIP_FORMATS and accepts_gzip:
+        gzip_name = _artifact_gzip_name(name)
+        gzip_headers = {**response_headers, "Content-Encoding": "gzip", "ETag": f'"{digest}-gzip"'}
+        if head:
+            try:
+                gzip_size = os.stat(os.path.join(root, gzip_name)).st_size
+            except FileNotFoundError:
+                pass  # not compressed yet: describe the identity encoding
+            else:
+                return 200, {**gzip_headers, "Content-Length": str(gzip_size)}, b""
+        else:
+            body = _cache_read(root, gzip_name)
+            if body is None:
+                with open(path, "rb") as f:
+                    body = gzip.compress(f.read(), compresslevel=6, mtime=0)
+                _cache_write(root, gzip_name, body, max_bytes)
+            return 200, gzip_headers, body
+
+    if head:
+        return 200, {**response_headers, "Content-Length": str(size)}, b""
+    with open(path, "rb") as f:
+        return 200, response_headers, f.read()
+
+
+# ─────────────────────────────────────────────────────────────────────
+# Upload store (content-addressed input images on the anysplat-cache volume)
+#   The router's POST /uploads streams raw or multipart request bodies to
+#   UPLOAD_DIR/<sha256> and returns the digests as upload ids.  The router
+#   and GPU functions pass ids around instead of image bytes; an id is the
+#   same digest _result_cache_key uses for the image.
+# ─────────────────────────────────────────────────────────────────────
+UPLOAD_SUBDIR = "uploads"
+UPLOAD_DIR = f"/cache/{UPLOAD_SUBDIR}"
+UPLOAD_MAX_BYTES = 10 * 1024**3  # 10 GB, evicted least-recently-used first
+UPLOAD_MAX_FILE_BYTES = 64 * 1024**2  # per image
+UPLOAD_MAX_VIDEO_BYTES = 1024**3  # per video (see _is_video)
+UPLOAD_CHUNK_BYTES = 1024**2
+
+
+def _is_upload_id(upload_id) -> bool:
+    import re
+
+    return isinstance(upload_id, str) and re.fullmatch(r"[0-9a-f]{64}", upload_id) is not None
+
+
+async def _store_upload(
+    root: str, chunks, max_file_bytes: int = UPLOAD_MAX_FILE_BYTES, max_bytes: int = UPLOAD_MAX_BYTES
+) -> dict:
+    """
+    Stream `chunks` (an async iterable of bytes) into the upload store.
+
+    The body is hashed while it is written to a temp file, so it is never
+    held in memory.  Raises ValueError for empty or oversized uploads.
+    Returns {"upload_id", "size"}.
+    """
+    import hashlib
+    import os
+    import uuid
+
+    os.makedirs(root, exist_ok=True)
+    tmp_path = os.path.join(root, f"upload.tmp-{uuid.uuid4().hex[:8]}")
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with open(tmp_path, "wb") as f:
+            async for chunk in chunks:
+                size += len(chunk)
+                if size > max_file_bytes:
+                    raise ValueError(f"Upload exceeds {max_file_bytes // 1024**2} MB")
+                digest.update(chunk)
+                f.write(chunk)
+        if size == 0:
+            raise ValueError("Empty upload")
+        upload_id = digest.hexdigest()
+        if not _touch_artifact(root, upload_id):
+            os.replace(tmp_path, os.path.join(root, upload_id))
+    finally:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+    _cache_evict(root, max_bytes, keep={upload_id})
+    return {"upload_id": upload_id, "size": size}
+
+
+def _read_uploads(root: str, upload_ids: list[str]) -> list[bytes]:
+    """Read uploaded images by id (callers reload the volume first)."""
+    images = [_cache_read(root, upload_id) if _is_upload_id(upload_id) else None for upload_id in upload_ids]
+    missing = [upload_id for upload_id, data in zip(upload_ids, images) if data is None]
+    if missing:
+        raise FileNotFoundError(f"Unknown upload id(s): {', '.join(map(str, missing))}")
+    return images
+
+
+# ─────────────────────────────────────────────────────────────────────
+# Job progress (stage / percentage / ETA in a shared modal.Dict)
+#   Workers publish through _JobProgress under the job id — the call id
+#   the router handed out, passed down by gen3c_pipeline to its GPU calls.
+#   The router's status op reads it and can long-poll for changes.
+#   Percentages and ETAs are weighted by each stage's typical duration.
+# ─────────────────────────────────────────────────────────────────────
+job_progress = modal.Dict.from_name("anysplat-jobs", create_if_missing=True)
+
+JOB_STAGE_SECONDS = {
+    "gen3c": (
+        ("startup", 60),  # queue + cold start + checkpoint load of Gen3cService
+        ("moge_depth", 10),
+        ("diffusion", 240),
+        ("keyframe_sampling", 10),
+        ("anysplat_inference", 30),
+        ("export", 15),
+    ),
+    "anysplat": (("anysplat_inference", 30), ("export", 15)),
+}
+JOB_PROGRESS_MIN_INTERVAL = 1.0  # seconds between publishes within one stage
+JOB_STATUS_MAX_WAIT = 20.0  # long-poll cap, below the web client's 30 s fetch timeout
+JOB_STATUS_POLL_INTERVAL = 1.0
+
+
+class _JobProgress:
+    """
+    Publishes one job's progress to `store` (job_progress by default) as
+    {"stage", "stage_pct", "pct", "eta_seconds", "detail", "updated"}.
+
+    A None `job_id` (local runs) turns every call into a no-op, and
+    publishing errors are only logged: progress must never fail a job.
+    """
+
+    def __init__(self, job_id: str | None, mode: str, store=None):
+        self.job_id = job_id
+        self.stages = dict(JOB_STAGE_SECONDS[mode])
+        self.store = job_progress if store is None else store
+        self.stage_name: str | None = None
+        self.stage_started = 0.0
+        self.published = 0.0
+
+    def stage(self, name: str, detail: str = "") -> None:
+        import time
+
+        self.stage_name, self.stage_started = name, time.time()
+        self.update(0, 1, detail, force=True)
+
+    def update(self, done: float, total: float, detail: str = "", force: bool = False) -> None:
+        import time
+
+        now = time.time()
+        if self.job_id is None or (not force and now - self.published < JOB_PROGRESS_MIN_INTERVAL):
+            return
+        names, seconds = list(self.stages), list(self.stages.values())
+        index = names.index(self.stage_name)
+        fraction = min(max(done / total, 0.0), 1.0) if total else 1.0
+        expected, elapsed = seconds[index], now - self.stage_started
+        if fraction >= 0.05:
+            stage_left = elapsed * (1 - fraction) / fraction
+        else:
+            stage_left = max(expected - elapsed, 0.0)
+        record = {
+            "stage": self.stage_name,
+            "stage_pct": round(100 * fraction, 1),
+            "pct": round(100 * (sum(seconds[:index]) + fraction * expected) / sum(seconds), 1),
+            "eta_seconds": round(stage_left + sum(seconds[index + 1 :])),
+            "detail": detail,
+            "updated": now,
+        }
+        self._publish(record)
+
+    def part(self, name: str) -> str | None:
+        """Job id under which one part of a fan-out publishes (see combine)."""
+        return None if self.job_id is None else f"{self.job_id}/{name}"
+
+    def combine(self, names: list[str], done: int) -> None:
+        """
+        Publish the parts `names` (each reported under part(name)) as this
+        job's progress: the record of the slowest part, with a count of the
+        finished ones.  Parts that have not published yet are skipped.
+        """
+        if self.job_id is None:
+            return
+        try:
+            records = [record for name in names if (record := self.store.get(self.part(name))) is not None]
+        except Exception as e:
+            print(f"⚠️  Could not read part progress for {self.job_id}: {e}")
+            return
+        if not records:
+            return
+        slowest = min(records, key=lambda record: record["pct"])
+        detail = f"{done}/{len(names)} trajectories done"
+        self._publish(
+            {
+                **slowest,
+                "detail": f"{slowest['detail']} — {detail}" if slowest["detail"] else detail,
+                "updated": max(record["updated"] for record in records),
+            }
+        )
+
+    def _publish(self, record: dict) -> None:
+        try:
+            self.store[self.job_id] = record
+            self.published = record["updated"]
+        except Exception as e:
+            print(f"⚠️  Could not publish progress for {self.job_id}: {e}")
+
+
+# ─────────────────────────────────────────────────────────────────────
+# Raw frame transport (GEN3C → AnySplat without a JPEG round-trip)
+#   A payload is {"shape": (N, H, W, 3), "data": bytes} — one contiguous
+#   uint8 RGB buffer.  Plain bytes + shape keeps it picklable on images
+#   without numpy (the gen3c_pipeline orchestrator).
+# ─────────────────────────────────────────────────────────────────────
+FRAME_TRANSPORTS = ("jpeg", "raw")
+ANYSPLAT_INPUT_SIZE = 448
+# Selectable view sizes (multiples of the encoder's 14 px patch): 224 is the
+# draft tier, ~4× fewer tokens per view than 448 — see bench_resolution.py
+ANYSPLAT_INPUT_SIZES = (224, 336, 448)
+
+
+def _pack_raw_frames(frames) -> dict:
+    """Pack a uint8 [N, H, W, 3] array (numpy or CPU tensor) into a payload."""
+    import numpy as np
+
+    arr = np.ascontiguousarray(np.asarray(frames), dtype=np.uint8)
+    assert arr.ndim == 4 and arr.shape[-1] == 3, f"Expected [N, H, W, 3] frames, got {arr.shape}"
+    return {"shape": tuple(arr.shape), "data": arr.tobytes()}
+
+
+def _raw_frames_tensor(payload: dict):
+    """Zero-copy uint8 [N, H, W, 3] CPU tensor over a raw frame payload."""
+    import warnings
+
+    import torch
+
+    with warnings.catch_warnings():
+        # frombuffer warns that bytes are read-only; the view is never written
+        warnings.simplefilter("ignore", UserWarning)
+        flat = torch.frombuffer(payload["data"], dtype=torch.uint8)
+    return flat.view(*payload["shape"])
+
+
+def _merge_keyframes(parts: list) -> list[bytes] | dict:
+    """
+    Concatenate keyframes from several GEN3C trajectories, in order, into
+    one AnySplat input: JPEG lists are joined, raw payloads stacked (their
+    frames must share one size).
+    """
+    if not isinstance(parts[0], dict):
+        return [frame for part in parts for frame in part]
+    sizes = {tuple(part["shape"][1:]) for part in parts}
+    if len(sizes) != 1:
+        raise ValueError(f"Cannot merge raw keyframes of different sizes: {sorted(sizes)}")
+    count = sum(part["shape"][0] for part in parts)
+    return {"shape": (count, *sizes.pop()), "data": b"".join(part["data"] for part in parts)}
+
+
+# ─────────────────────────────────────────────────────────────────────
+# View preprocessing (batched, on-device)
+#   Every AnySplat view is a crop box of an input image resampled to
+#   size×size.  All boxes of a same-sized image batch go through ONE
+#   torchvision roi_align call; its adaptive sampling grid averages
+#   ceil(crop/size)² bilinear taps per output pixel, i.e. an antialiased
+#   area resample standing in for PIL's per-view Lanczos.  Groups go to
+#   the device in slices of VIEW_BATCH_IMAGES (uint8, converted to float
+#   per slice), so GPU memory stays flat however many photos are uploaded.
+# ─────────────────────────────────────────────────────────────────────
+VIEW_BATCH_IMAGES = 8  # images per roi_align call (~1.2 GB float32 at 12 MP)
+# Single-image augmentation: (dx, dy) as fractions of the image size
+# (min 12 px) and zoom > 1 meaning a tighter crop.
+SINGLE_IMAGE_AUGMENTATIONS = [
+    (0.0, 0.0, 1.0),    # centre
+    (-0.04, 0.0, 1.0),  # left
+    (0.04, 0.0, 1.0),   # right
+    (0.0, -0.04, 1.0),  # up
+    (0.0, 0.04, 1.0),   # down
+    (0.0, 0.0, 1.08),   # zoom in
+]
+
+
+def _decode_image(image_bytes: bytes):
+    """Decode image bytes in memory to a uint8 [H, W, 3] RGB array."""
+    import io
+
+    import numpy as np
+    from PIL import Image
+
+    with Image.open(io.BytesIO(image_bytes)) as img:
+        return np.asarray(img.convert("RGB"))
+
+
+def _view_boxes(w: int, h: int, augment: bool) -> list[tuple[int, int, int, int]]:
+    """
+    Pixel crop boxes (left, top, right, bottom) for one input image.
+
+    augment=True yields the 6 single-image views; otherwise a single
+    full-frame centre crop.  Offsets are clamped to the image exactly as
+    the original PIL crop did.
+    """
+    specs = SINGLE_IMAGE_AUGMENTATIONS if augment else SINGLE_IMAGE_AUGMENTATIONS[:1]
+    boxes = []
+    for fx, fy, zoom in specs:
+        dx = 0 if fx == 0 else int(max(12, int(w * abs(fx))) * (1 if fx > 0 else -1))
+        dy = 0 if fy == 0 else int(max(12, int(h * abs(fy))) * (1 if fy > 0 else -1))
+        crop_w = int(w / zoom)
+        crop_h = int(h / zoom)
+        cx = w // 2 + dx
+        cy = h // 2 + dy
+        left = max(0, cx - crop_w // 2)
+        top = max(0, cy - crop_h // 2)
+        boxes.append((left, top, min(w, left + crop_w), min(h, top + crop_h)))
+    return boxes
+
+
+def _preprocess_views(images, augment: bool, device, size: int = ANYSPLAT_INPUT_SIZE):
+    """
+    Build AnySplat views from uint8 RGB images in one batched GPU pass.
+
+    `images` is either a list of [H, W, 3] arrays (any sizes) or a uint8
+    [N, H, W, 3] tensor (raw frame transport).  Images of the same size are
+    copied to `device` together, up to VIEW_BATCH_IMAGES at a time, and
+    every crop/zoom of a slice is produced by a single roi_align.  Returns
+    [V, 3, size, size] float in [-1, 1], matching ToTensor() * 2 - 1, with
+    views in input order.
+    """
+    import torch
+    from torchvision.ops import roi_align
+
+    if isinstance(images, torch.Tensor):
+        groups = {tuple(images.shape[1:3]): list(range(images.shape[0]))}
+    else:
+        groups = {}
+        for i, img in enumerate(images):
+            groups.setdefault(tuple(img.shape[:2]), []).append(i)
+
+    per_image: dict[int, torch.Tensor] = {}
+    for (h, w), group in groups.items():
+        boxes = _view_boxes(w, h, augment)
+        for start in range(0, len(group), VIEW_BATCH_IMAGES):
+            idxs = group[start:start + VIEW_BATCH_IMAGES]
+            if isinstance(images, torch.Tensor):
+                batch = images[idxs[0]:idxs[-1] + 1]
+            else:
+                batch = torch.stack([torch.from_numpy(images[i]) for i in idxs])
+            batch = batch.to(device, non_blocking=True).permute(0, 3, 1, 2).float()
+
+            rois = [(float(b), *map(float, box)) for b in range(len(idxs)) for box in boxes]
+            crops = roi_align(
+                batch,
+                torch.tensor(rois, dtype=torch.float32, device=device),
+                output_size=(size, size),
+                spatial_scale=1.0,
+                sampling_ratio=0,  # adaptive: area-average when downscaling
+                aligned=True,  # box edges are pixel edges, like PIL.crop
+            )
+            del batch
+            for b, i in enumerate(idxs):
+                per_image[i] = crops[b * len(boxes):(b + 1) * len(boxes)]
+
+    views = torch.cat([per_image[i] for i in sorted(per_image)], dim=0)
+    return (views / 255.0 * 2.0 - 1.0).clamp(-1.0, 1.0)
+
+
+# ─────────────────────────────────────────────────────────────────────
+# Near-duplicate filtering (multi-image uploads)
+#   Phone bursts add views without adding parallax.  All views are scored
+#   in one batched pass: a 64-bit perceptual hash (low 8×8 DCT
+#   coefficients of a 32×32 thumbnail vs their median), a 16×16
+#   zero-mean, unit-norm thumbnail embedding and Laplacian-variance
+#   sharpness.  Views whose hashes AND embeddings agree are
+#   near-duplicates; each cluster keeps its sharpest view.
+# ─────────────────────────────────────────────────────────────────────
+DEDUP_MAX_HASH_DISTANCE = 10  # differing bits out of 64
+DEDUP_MIN_SIMILARITY = 0.92  # cosine similarity of the embeddings
+
+
+def _view_signatures(views):
+    """(hashes bool [V, 64], embeddings [V, 256], sharpness [V]) of views [V, 3, H, W]."""
+    import math
+
+    import torch
+    import torch.nn.functional as F
+
+    luma = torch.tensor([0.299, 0.587, 0.114], device=views.device).view(1, 3, 1, 1)
+    gray = (views.float() * luma).sum(dim=1, keepdim=True)
+    laplacian = torch.tensor([[0.0, 1.0, 0.0], [1.0, -4.0, 1.0], [0.0, 1.0, 0.0]], device=views.device)
+    sharpness = F.conv2d(gray, laplacian.view(1, 1, 3, 3)).flatten(1).var(dim=1)
+
+    thumb = F.adaptive_avg_pool2d(gray, 32)[:, 0]
+    n = torch.arange(32, dtype=torch.float32, device=views.device)
+    dct = torch.cos(math.pi * (2 * n[None, :] + 1) * n[:, None] / 64)  # DCT-II basis [k, n]
+    coeffs = (dct @ thumb @ dct.T)[:, :8, :8].flatten(1)
+    hashes = coeffs > coeffs[:, 1:].median(dim=1, keepdim=True).values  # median without DC
+
+    small = F.adaptive_avg_pool2d(gray, 16).flatten(1)
+    embeddings = F.normalize(small - small.mean(dim=1, keepdim=True), dim=1)
+    return hashes, embeddings, sharpness
+
+
+def _dedupe_views(views) -> list[int | None]:
+    """
+    Cluster near-duplicate views (see above).  Returns duplicate_of: None
+    for each cluster's kept view, else the index of the kept view it
+    duplicates.
+    """
+    hashes, embeddings, sharpness = _view_signatures(views)
+    distance = (hashes[:, None] != hashes[None]).sum(dim=-1)
+    duplicate = ((distance <= DEDUP_MAX_HASH_DISTANCE) & (embeddings @ embeddings.T >= DEDUP_MIN_SIMILARITY)).cpu()
+
+    duplicate_of: list[int | None] = [None] * len(views)
+    kept: list[int] = []
+    for i in sharpness.argsort(descending=True).tolist():
+        match = next((k for k in kept if duplicate[i, k]), None)
+        if match is None:
+            kept.append(i)
+        else:
+            duplicate_of[i] = match
+    return duplicate_of
+
+
+# ─────────────────────────────────────────────────────────────────────
+# Video ingestion (walk-around videos → AnySplat views)
+#   A video upload is decoded by ffmpeg straight from the upload store at
+#   VIDEO_SAMPLE_FPS, downscaled to VIDEO_DECODE_SHORT_SIDE px, and piped
+#   as raw RGB frames one at a time — nothing is written to disk.
+#   _VideoKeyframes picks keyframes online by motion and sharpness and
+#   holds at most max_frames + VIDEO_CANDIDATE_WINDOW frames, so memory
+#   is bounded by the keyframe budget, not by the video's length.
+# ─────────────────────────────────────────────────────────────────────
+VIDEO_EXTENSIONS = (".mp4", ".mov", ".m4v", ".webm", ".mkv", ".avi")
+VIDEO_SAMPLE_FPS = 4
+VIDEO_DECODE_SHORT_SIDE = 480  # views are resampled to ANYSPLAT_INPUT_SIZE anyway
+VIDEO_MAX_KEYFRAMES = 48  # default budget; > ANYSPLAT_CHUNK_VIEWS runs windowed
+VIDEO_MAX_KEYFRAMES_LIMIT = 128
+VIDEO_MIN_MOTION = 6.0  # RMS grey-level change (0-255) since the last keyframe
+VIDEO_CANDIDATE_WINDOW = 4  # the sharpest of this many frames becomes the keyframe
+VIDEO_THUMB_SIZE = 64  # short side of the motion thumbnail
+# Part of the result cache key of video inputs: change it with the picker
+VIDEO_CACHE_PARAMS = {
+    "fps": VIDEO_SAMPLE_FPS,
+    "short_side": VIDEO_DECODE_SHORT_SIDE,
+    "min_motion": VIDEO_MIN_MOTION,
+    "window": VIDEO_CANDIDATE_WINDOW,
+}
+
+
+def _is_video(filename: str | None, content_type: str | None = None) -> bool:
+    return (content_type or "").startswith("video/") or (filename or "").lower().endswith(VIDEO_EXTENSIONS)
+
+
+class _VideoKeyframes:
+    """
+    Online keyframe picker over a stream of uint8 [H, W, 3] frames.
+
+    A keyframe is due once a frame's grey thumbnail differs from the last
+    keyframe's by `min_motion` (RMS) and at least `min_gap` seconds have
+    passed; the sharpest (Laplacian variance) of that frame and the next
+    `window` - 1 becomes the keyframe.  When more than `max_frames`
+    accumulate every other one is dropped and `min_gap` grows to the
+    thinned spacing, so the picks stay spread over the whole video.
+    """
+
+    def __init__(self, max_frames: int, min_motion: float = VIDEO_MIN_MOTION, window: int = VIDEO_CANDIDATE_WINDOW):
+        self.max_frames = max_frames
+        self.min_motion = min_motion
+        self.window = window
+        self.min_gap = 0.0
+        self.keyframes: list[tuple] = []  # (time, frame, thumbnail)
+        self.candidates: list[tuple] = []  # (sharpness, time, frame, thumbnail)
+        self.seen = 0
+
+    @staticmethod
+    def _score(frame):
+        """(grey thumbnail, Laplacian-variance sharpness) of a frame."""
+        import numpy as np
+
+        gray = frame.astype(np.float32) @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+        laplacian = (
+            gray[:-2, 1:-1] + gray[2:, 1:-1] + gray[1:-1, :-2] + gray[1:-1, 2:] - 4.0 * gray[1:-1, 1:-1]
+        )
+        stride = max(1, min(gray.shape) // VIDEO_THUMB_SIZE)
+        return gray[::stride, ::stride], float(laplacian.var())
+
+    def push(self, t: float, frame) -> None:
+        import numpy as np
+
+        self.seen += 1
+        thumb, sharpness = self._score(frame)
+        if not self.candidates and self.keyframes:
+            last_t, _, last_thumb = self.keyframes[-1]
+            if t - last_t < self.min_gap:
+                return
+            if float(np.sqrt(np.mean((thumb - last_thumb) ** 2))) < self.min_motion:
+                return
+        self.candidates.append((sharpness, t, frame, thumb))
+        if len(self.candidates) >= self.window:
+            self._commit()
+
+    def _commit(self) -> None:
+        _, t, frame, thumb = max(self.candidates, key=lambda c: c[0])
+        self.candidates = []
+        self.keyframes.append((t, frame, thumb))
+        if len(self.keyframes) > self.max_frames:
+            self.keyframes = self.keyframes[::2]
+            span = self.keyframes[-1][0] - self.keyframes[0][0]
+            self.min_gap = max(self.min_gap * 2, span / max(len(self.keyframes) - 1, 1))
+
+    def finish(self) -> list[tuple]:
+        """The keyframes as [(time, frame), ...] in stream order."""
+        if self.candidates:
+            self._commit()
+        return [(t, frame) for t, frame, _ in self.keyframes]
+
+
+def _probe_video(path: str) -> tuple[int, int]:
+    """Display (width, height) of a video, rotation metadata applied."""
+    import json
+    import subprocess
+
+    probe = subprocess.run(
+        [
+            "ffprobe", "-v", "error", "-select_streams", "v:0",
+            "-show_entries", "stream=width,height:stream_side_data=rotation:stream_tags=rotate",
+            "-of", "json", path,
+        ],
+        capture_output=True, text=True, check=False,
+    )
+    streams = json.loads(probe.stdout or "{}").get("streams") if probe.returncode == 0 else None
+    if not streams:
+        raise ValueError(f"Not a readable video: {probe.stderr.strip() or 'no video stream'}")
+    stream = streams[0]
+    rotation = stream.get("tags", {}).get("rotate") or next(
+        (d.get("rotation") for d in stream.get("side_data_list", []) if "rotation" in d), 0
+    )
+    width, height = int(stream["width"]), int(stream["height"])
+    return (height, width) if int(float(rotation)) % 180 else (width, height)
+
+
+def _stream_video_frames(path: str, fps: float = VIDEO_SAMPLE_FPS, short_side: int = VIDEO_DECODE_SHORT_SIDE):
+    """
+    Yield (time, uint8 [H, W, 3]) frames of a video sampled at `fps` and
+    scaled so the short side is at most `short_side`.  ffmpeg writes raw
+    RGB to a pipe that is read one frame at a time.
+    """
+    import subprocess
+
+    import numpy as np
+
+    width, height = _probe_video(path)
+    scale = min(1.0, short_side / min(width, height))
+    width, height = max(2, round(width * scale / 2) * 2), max(2, round(height * scale / 2) * 2)
+    frame_bytes = width * height * 3
+
+    proc = subprocess.Popen(
+        [
+            "ffmpeg", "-v", "error", "-nostdin", "-i", path,
+            "-vf", f"fps={fps},scale={width}:{height}:flags=area",
+            "-f", "rawvideo", "-pix_fmt", "rgb24", "pipe:1",
+        ],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE, bufsize=frame_bytes,
+    )
+    try:
+        index = 0
+        while True:
+            data = proc.stdout.read(frame_bytes)
+            if len(data) < frame_bytes:
+                break
+            yield index / fps, np.frombuffer(data, dtype=np.uint8).reshape(height, width, 3)
+            index += 1
+    finally:
+        proc.stdout.close()
+        if proc.poll() is None:
+            proc.kill()  # consumer stopped early
+        stderr = proc.stderr.read().decode(errors="replace").strip()
+        proc.stderr.close()
+        returncode = proc.wait()
+    if returncode != 0:
+        raise RuntimeError(f"ffmpeg failed ({returncode}): {stderr[-500:]}")
+
+
+def _video_keyframes(path: str, max_frames: int = VIDEO_MAX_KEYFRAMES) -> tuple[list, dict]:
+    """Stream a video through _VideoKeyframes → (frames, stats)."""
+    picker = _VideoKeyframes(max_frames)
+    for t, frame in _stream_video_frames(path):
+        picker.push(t, frame)
+    keyframes = picker.finish()
+    if not keyframes:
+        raise ValueError("Video has no decodable frames")
+    stats = {
+        "decoded_frames": picker.seen,
+        "keyframes": len(keyframes),
+        "times": [round(t, 2) for t, _ in keyframes],
+        "min_gap": round(picker.min_gap, 2),
+    }
+    return [frame for _, frame in keyframes], stats
+
+
+# ─────────────────────────────────────────────────────────────────────
+# GEN3C stage cache (keyframes + orbit video on the gen3c-cache volume)
+#   Gen3cService.generate_views is fully seeded, so its output depends only on
+#   the input image, diffusion_steps and movement_distance.  Each entry
+#   is a directory <key>/ (one per trajectory) holding video.mp4 plus one keyframes_n<N>/
+#   subdirectory per keyframe budget N (the selected JPEGs, the same frames
+#   raw at each of ANYSPLAT_INPUT_SIZES as frames_<size>.u8, and meta.json
+#   listing their video indices).
+#   Bump GEN3C_CACHE_VERSION to
+#   invalidate every entry; pass gen3c_refresh=true to regenerate one.
+# ─────────────────────────────────────────────────────────────────────
+GEN3C_CACHE_VERSION = 2  # 2: keyframes chosen by _select_keyframes
+GEN3C_CACHE_SUBDIR = "keyframes"  # relative to the gen3c-cache volume root
+GEN3C_CACHE_MAX_BYTES = 50 * 1024**3  # 50 GB, evicted least-recently-used first
+GEN3C_SEED = 42
+
+
+def _gen3c_cache_key(
+    image_digest: str, diffusion_steps: int, movement_distance: float, trajectory: str = "clockwise"
+) -> str:
+    """Key for one trajectory's GEN3C stage output (independent of any AnySplat setting)."""
+    import json
+
+    payload = json.dumps(
+        {
+            "version": GEN3C_CACHE_VERSION,
+            "checkpoint": GEN3C_CHECKPOINT,
+            "image": image_digest,
+            "diffusion_steps": diffusion_steps,
+            "movement_distance": movement_distance,
+            "trajectory": trajectory,
+            "seed": GEN3C_SEED,
+        },
+        sort_keys=True,
+    )
+    return _sha256(payload.encode("utf-8"))
+
+
+def _keyframe_cache_read(
+    root: str, key: str, num_frames: int, transport: str = "jpeg", raw_size: int = ANYSPLAT_INPUT_SIZE
+) -> list[bytes] | dict | None:
+    """
+    Return the keyframes cached for `key` with budget `num_frames` (bumping
+    LRU recency) or None.
+
+    transport="jpeg" returns a list of JPEG buffers; transport="raw" returns
+    a raw frame payload (see _pack_raw_frames) already resized to
+    raw_size×raw_size, the same bytes a fresh generate_views call returns.
+    """
+    import json
+    import os
+
+    frames_dir = os.path.join(root, key, f"keyframes_n{num_frames}")
+    if not os.path.isdir(frames_dir):
+        return None
+    with open(os.path.join(frames_dir, "meta.json")) as f:
+        meta = json.load(f)
+
+    frames: list[bytes] | dict
+    if transport == "raw":
+        raw_path = os.path.join(frames_dir, f"frames_{raw_size}.u8")
+        if not os.path.exists(raw_path):
+            return None  # entry written before sized raw frames existed, or another size
+        with open(raw_path, "rb") as f:
+            frames = {"shape": tuple(meta["raw_shapes"][str(raw_size)]), "data": f.read()}
+    else:
+        names = sorted(fn for fn in os.listdir(frames_dir) if fn.endswith(".jpg"))
+        if len(names) != len(meta["keyframe_indices"]):
+            return None  # partial entry — treat as a miss
+        frames = []
+        for fn in names:
+            with open(os.path.join(frames_dir, fn), "rb") as f:
+                frames.append(f.read())
+    os.utime(os.path.join(root, key))
+    return frames
+
+
+def _keyframe_cache_write(
+    root: str,
+    key: str,
+    num_frames: int,
+    frames: list[bytes],
+    meta: dict,
+    raw_frames: dict[int, dict] | None = None,
+    video_path: str | None = None,
+) -> None:
+    """
+    Store the JPEG keyframes selected for budget `num_frames`, their raw
+    payloads by size (`raw_frames`: {size: payload}) and optionally the
+    full video under `key`.  `meta` must list the frames' video indices as
+    "keyframe_indices".
+    """
+    import json
+    import os
+    import shutil
+    import uuid
+
+    entry_dir = os.path.join(root, key)
+    os.makedirs(entry_dir, exist_ok=True)
+
+    frames_dir = os.path.join(entry_dir, f"keyframes_n{num_frames}")
+    tmp_dir = f"{frames_dir}.tmp-{uuid.uuid4().hex[:8]}"
+    os.makedirs(tmp_dir)
+    for i, frame in enumerate(frames):
+        with open(os.path.join(tmp_dir, f"frame_{i:03d}.jpg"), "wb") as f:
+            f.write(frame)
+    if raw_frames:
+        for size, payload in raw_frames.items():
+            with open(os.path.join(tmp_dir, f"frames_{size}.u8"), "wb") as f:
+                f.write(payload["data"])
+        meta = {**meta, "raw_shapes": {str(size): list(payload["shape"]) for size, payload in raw_frames.items()}}
+    with open(os.path.join(tmp_dir, "meta.json"), "w") as f:
+        json.dump(meta, f, indent=2)
+    shutil.rmtree(frames_dir, ignore_errors=True)
+    os.replace(tmp_dir, frames_dir)
+
+    if video_path is not None:
+        shutil.move(video_path, os.path.join(entry_dir, "video.mp4"))
+
+    os.utime(entry_dir)
+    _cache_evict(root, GEN3C_CACHE_MAX_BYTES, keep={key})
+
+
+# ─────────────────────────────────────────────────────────────────────
+# MoGe depth cache (gen3c-cache volume)
+#   predict_moge_depth depends only on the input image and GEN3C's 704×1280
+#   frame size, so one entry serves every diffusion_steps /
+#   movement_distance / trajectory variation of an image.  Each entry is a
+#   torch.save file <key>.pt holding the MOGE_OUTPUTS tensors on CPU.
+# ─────────────────────────────────────────────────────────────────────
+GEN3C_MOGE_VERSION = 1
+GEN3C_MOGE_SUBDIR = "moge"  # relative to the gen3c-cache volume root
+GEN3C_MOGE_MAX_BYTES = 5 * 1024**3  # ~16 MB per image
+GEN3C_MOGE_MODEL = "Ruicheng/moge-vitl"
+MOGE_OUTPUTS = ("moge_image", "moge_depth", "moge_mask", "moge_w2c", "moge_intrinsics")
+
+
+def _moge_cache_key(image_digest: str) -> str:
+    """Key for MoGe outputs (independent of every GEN3C generation setting)."""
+    import json
+
+    payload = json.dumps(
+        {"version": GEN3C_MOGE_VERSION, "model": GEN3C_MOGE_MODEL, "image": image_digest, "size": [704, 1280]},
+        sort_keys=True,
+    )
+    return _sha256(payload.encode("utf-8"))
+
+
+def _moge_cache_read(root: str, key: str) -> dict | None:
+    """Cached MoGe outputs for `key` as CPU tensors (bumping LRU recency), or None."""
+    import io
+
+    import torch
+
+    data = _cache_read(root, f"{key}.pt")
+    if data is None:
+        return None
+    return torch.load(io.BytesIO(data), map_location="cpu")
+
+
+def _moge_cache_write(root: str, key: str, outputs: dict) -> None:
+    """Store the MOGE_OUTPUTS tensors of `outputs` under `key`."""
+    import io
+
+    import torch
+
+    buf = io.BytesIO()
+    torch.save({name: outputs[name].detach().cpu() for name in MOGE_OUTPUTS}, buf)
+    _cache_write(root, f"{key}.pt", buf.getvalue(), GEN3C_MOGE_MAX_BYTES)
+
+
+# ─────────────────────────────────────────────────────────────────────
+# Splat export formats
+#   "ply"     — AnySplat's export_ply (DC-only SH, see ANYSPLAT_EXPORT_FLAGS)
+#   "compact" — quantized, zlib-compressed binary (decoder for the viewer
+#               in web/src/lib/compactSplat.ts), keeps SH up to degree 2
+#   "progressive" — compact chunks in Morton, coarse-to-fine order that
+#               render from any prefix (_encode_progressive_splat)
+#
+# Both start from the same Gaussian tensors (_gaussian_tensors); compact
+# moves them to CPU arrays (_gaussians_to_arrays):
+#   means [N, 3], scales [N, 3] (linear), rotations [N, 4] (unit wxyz),
+#   opacities [N] (0-1), sh_dc [N, 3], sh_rest [N, 3, K] (channel-major)
+# ─────────────────────────────────────────────────────────────────────
+OUTPUT_FORMATS = ("ply", "compact", "progressive")
+OUTPUT_EXTENSIONS = {"ply": "ply", "compact": "csplat", "progressive": "psplat"}
+
+# Compact layout (little-endian): fixed header, then one zlib stream with
+#   positions  uint16 [N, 3]  relative to the scene bounds
+#   log-scales uint8  [N, 3]  over [log_scale_min, log_scale_max]
+#   opacity    uint8  [N]     over [0, 1]
+#   rotation   uint32 [N]     smallest-three: 2-bit index + 3 × 10 bits
+#   sh_dc      uint8  [N, 3]  over [sh_dc_min, sh_dc_max]
+#   sh_rest    sh_rest_bits per coefficient, bit-packed, over ±sh_rest_absmax
+#              or, with COMPACT_FLAG_SH_CODEBOOK (see _build_sh_codebook):
+#              uint16 codebook size S, float16 [S, 3, K] codebook, uint16 [N]
+COMPACT_MAGIC = b"CSPL"
+COMPACT_VERSION = 1
+COMPACT_HEADER = "<4sBBHI6f5fB3x"
+COMPACT_SH_DEGREE = 2  # highest band the web viewer renders
+COMPACT_SH_REST_BITS = 5
+COMPACT_ROTATION_BITS = 10
+
+
+def _gaussian_tensors(gaussians) -> dict:
+    """Batch 0 of AnySplat's Gaussians as detached float tensors, left on device."""
+    return {
+        "means": gaussians.means[0].detach().float(),
+        "scales": gaussians.scales[0].detach().float(),
+        "rotations": gaussians.rotations[0].detach().float(),  # xyzw
+        "harmonics": gaussians.harmonics[0].detach().float(),  # [N, 3, d_sh]
+        "opacities": gaussians.opacities[0].detach().float(),
+    }
+
+
+def _gaussians_to_arrays(splat: dict, shift_and_scale: bool = True) -> dict:
+    """
+    Move Gaussian tensors (see _gaussian_tensors) to CPU numpy in the canonical layout.
+
+    Rotations are converted from AnySplat's xyzw to the PLY/3DGS wxyz order.
+    shift_and_scale mirrors export_ply: median-centre the means and divide
+    means and scales by the largest per-axis 95th-percentile |mean|.
+    """
+    means = splat["means"]
+    scales = splat["scales"]
+    if shift_and_scale:
+        means = means - means.median(dim=0).values
+        scale_factor = means.abs().quantile(0.95, dim=0).max()
+        means = means / scale_factor
+        scales = scales / scale_factor
+    rotations = splat["rotations"][:, [3, 0, 1, 2]]
+    harmonics = splat["harmonics"]
+    return {
+        "means": means.cpu().numpy(),
+        "scales": scales.cpu().numpy(),
+        "rotations": rotations.cpu().numpy(),
+        "opacities": splat["opacities"].cpu().numpy(),
+        "sh_dc": harmonics[..., 0].cpu().numpy(),
+        "sh_rest": harmonics[..., 1:].cpu().numpy(),
+    }
+
+
+def _quantize(x, lo: float, hi: float, bits: int):
+    import numpy as np
+
+    levels = (1 << bits) - 1
+    span = max(hi - lo, 1e-12)
+    q = np.rint((np.asarray(x, dtype=np.float64) - lo) / span * levels)
+    return np.clip(q, 0, levels).astype(np.uint16 if bits > 8 else np.uint8)
+
+
+def _dequantize(q, lo: float, hi: float, bits: int):
+    import numpy as np
+
+    levels = (1 << bits) - 1
+    return (lo + q.astype(np.float32) * np.float32((hi - lo) / levels)).astype(np.float32)
+
+
+def _pack_bits(values, bits: int) -> bytes:
+    """Bit-pack unsigned ints (< 2**bits, bits ≤ 8), eight values per `bits` bytes."""
+    import numpy as np
+
+    flat = np.asarray(values, dtype=np.uint64).reshape(-1)
+    pad = (-flat.size) % 8
+    if pad:
+        flat = np.concatenate([flat, np.zeros(pad, dtype=np.uint64)])
+    groups = flat.reshape(-1, 8)
+    shifts = np.arange(7, -1, -1, dtype=np.uint64) * np.uint64(bits)
+    words = (groups << shifts).sum(axis=1, dtype=np.uint64)  # 8·bits ≤ 64 bits used
+    # Big-endian bytes, keep the low `bits` bytes of each 8-byte word
+    return words.astype(">u8").view(np.uint8).reshape(-1, 8)[:, 8 - bits:].tobytes()
+
+
+def _unpack_bits(data: bytes, bits: int, count: int):
+    import numpy as np
+
+    chunks = np.frombuffer(data, dtype=np.uint8).reshape(-1, bits)
+    padded = np.zeros((chunks.shape[0], 8), dtype=np.uint8)
+    padded[:, 8 - bits:] = chunks
+    words = padded.view(">u8").reshape(-1).astype(np.uint64)
+    shifts = np.arange(7, -1, -1, dtype=np.uint64) * np.uint64(bits)
+    values = (words[:, None] >> shifts) & np.uint64((1 << bits) - 1)
+    return values.reshape(-1)[:count].astype(np.uint8)
+
+
+_SMALLEST_THREE_OTHERS = [[1, 2, 3], [0, 2, 3], [0, 1, 3], [0, 1, 2]]
+
+
+def _encode_rotations(rotations):
+    """Smallest-three quaternion encoding into one uint32 per Gaussian."""
+    import numpy as np
+
+    q = np.asarray(rotations, dtype=np.float64)
+    q = q / np.maximum(np.linalg.norm(q, axis=1, keepdims=True), 1e-12)
+    largest = np.abs(q).argmax(axis=1)
+    # q and -q are the same rotation: make the dropped component positive
+    q = q * np.where(np.take_along_axis(q, largest[:, None], axis=1) < 0, -1.0, 1.0)
+    others = np.take_along_axis(q, np.asarray(_SMALLEST_THREE_OTHERS)[largest], axis=1)
+    # Remaining components lie in [-1/√2, 1/√2]
+    levels = (1 << COMPACT_ROTATION_BITS) - 1
+    quant = np.clip(np.rint((others * np.sqrt(2.0) + 1.0) * 0.5 * levels), 0, levels).astype(np.uint32)
+    bits = COMPACT_ROTATION_BITS
+    return (
+        (largest.astype(np.uint32) << (3 * bits))
+        | (quant[:, 0] << (2 * bits))
+        | (quant[:, 1] << bits)
+        | quant[:, 2]
+    )
+
+
+def _decode_rotations(packed):
+    import numpy as np
+
+    bits = COMPACT_ROTATION_BITS
+    mask = (1 << bits) - 1
+    packed = np.asarray(packed, dtype=np.uint32)
+    largest = (packed >> (3 * bits)).astype(np.int64)
+    quant = np.stack([(packed >> (2 * bits)) & mask, (packed >> bits) & mask, packed & mask], axis=1)
+    others = (quant.astype(np.float32) / mask * 2.0 - 1.0) / np.float32(np.sqrt(2.0))
+    dropped = np.sqrt(np.clip(1.0 - (others**2).sum(axis=1), 0.0, 1.0))
+    q = np.zeros((packed.shape[0], 4), dtype=np.float32)
+    np.put_along_axis(q, np.asarray(_SMALLEST_THREE_OTHERS)[largest], others, axis=1)
+    np.put_along_axis(q, largest[:, None], dropped[:, None].astype(np.float32), axis=1)
+    return q
+
+
+# ── SH codebook (vector quantization of the non-DC harmonics) ───────
+#   Optional stage for the compact format: k-means over each Gaussian's
+#   [3, K] SH rest coefficients, so every Gaussian stores one uint16 index
+#   and the file carries a float16 codebook (COMPACT_FLAG_SH_CODEBOOK).
+#   Trained on a CPU subsample with a fixed iteration budget.
+COMPACT_FLAG_SH_CODEBOOK = 1
+SH_CODEBOOK_MAX_SIZE = 1024  # ~5 s for 500k Gaussians on one core; build time grows linearly with the size
+SH_CODEBOOK_ITERATIONS = 12
+SH_CODEBOOK_TRAIN_SAMPLES = 65536
+SH_CODEBOOK_SEED_SAMPLES = 8192  # k-means++ seeding runs on a prefix of this many rows…
+SH_CODEBOOK_SEED_PER_ENTRY = 4  # …or this many per codebook entry, if more
+SH_CODEBOOK_CHUNK_BYTES = 256 * 1024**2  # float32 distance matrix per assignment matmul
+SH_CODEBOOK_EVAL_SAMPLES = 16384
+SH_CODEBOOK_EVAL_DIRECTIONS = 64
+
+# Real SH basis constants (same as the 3DGS rasteriser), bands 1-3
+_SH_C1 = 0.4886025119029199
+_SH_C2 = (1.0925484305920792, -1.0925484305920792, 0.31539156525252005, -1.0925484305920792, 0.5462742152960396)
+_SH_C3 = (
+    -0.5900435899266435, 2.890611442640554, -0.4570457994644658, 0.3731763325901154,
+    -0.4570457994644658, 1.445305721320277, -0.5900435899266435,
+)
+
+
+def _sh_rest_basis(dirs, num_rest: int):
+    """Evaluate the non-DC real SH basis at unit directions → [D, num_rest]."""
+    import numpy as np
+
+    x, y, z = dirs[:, 0], dirs[:, 1], dirs[:, 2]
+    xx, yy, zz = x * x, y * y, z * z
+    basis = [-_SH_C1 * y, _SH_C1 * z, -_SH_C1 * x]
+    basis += [
+        _SH_C2[0] * x * y,
+        _SH_C2[1] * y * z,
+        _SH_C2[2] * (2 * zz - xx - yy),
+        _SH_C2[3] * x * z,
+        _SH_C2[4] * (xx - yy),
+    ]
+    basis += [
+        _SH_C3[0] * y * (3 * xx - yy),
+        _SH_C3[1] * x * y * z,
+        _SH_C3[2] * y * (4 * zz - xx - yy),
+        _SH_C3[3] * z * (2 * zz - 3 * xx - 3 * yy),
+        _SH_C3[4] * x * (4 * zz - xx - yy),
+        _SH_C3[5] * z * (xx - yy),
+        _SH_C3[6] * x * (xx - 3 * yy),
+    ]
+    if num_rest > len(basis):
+        raise ValueError(f"SH colour evaluation supports up to degree 3, got {num_rest} rest coefficients")
+    return np.stack(basis[:num_rest], axis=1)
+
+
+def _nearest_codewords(vectors, codebook):
+    """Index of the nearest codeword for each row, in matmul chunks of ≤ SH_CODEBOOK_CHUNK_BYTES."""
+    import numpy as np
+
+    code_sq = (codebook**2).sum(axis=1)
+    rows = max(1, SH_CODEBOOK_CHUNK_BYTES // (4 * len(codebook)))
+    indices = np.empty(vectors.shape[0], dtype=np.int64)
+    for start in range(0, vectors.shape[0], rows):
+        chunk = vectors[start:start + rows]
+        # |x - c|² up to the per-row constant |x|²
+        indices[start:start + rows] = (code_sq - 2.0 * chunk @ codebook.T).argmin(axis=1)
+    return indices
+
+
+def _kmeans_plus_plus(vectors, size: int, rng):
+    """k-means++ seeding: each new centre drawn ∝ squared distance to the nearest one."""
+    import numpy as np
+
+    centres = np.empty((size, vectors.shape[1]), dtype=np.float32)
+    centres[0] = vectors[rng.integers(len(vectors))]
+    nearest = ((vectors - centres[0]) ** 2).sum(axis=1)
+    for i in range(1, size):
+        cumulative = np.cumsum(nearest, dtype=np.float64)
+        if cumulative[-1] > 0:
+            pick = np.searchsorted(cumulative, rng.random() * cumulative[-1], side="right")
+            pick = min(int(pick), len(vectors) - 1)
+        else:
+            pick = rng.integers(len(vectors))
+        centres[i] = vectors[pick]
+        nearest = np.minimum(nearest, ((vectors - centres[i]) ** 2).sum(axis=1))
+    return centres
+
+
+def _build_sh_codebook(sh_rest, size: int, seed: int = 0) -> dict:
+    """
+    Cluster SH rest coefficients [N, 3, K] into a codebook of `size` entries.
+
+    Returns {"codebook" [size, 3, K] float16, "indices" [N] uint16, "stats"}.
+    The stats report the codebook's share of the bytes and the colour error
+    it introduces: RMS difference of the view-dependent RGB (0-1 units) over
+    a Fibonacci sphere of directions, on a subsample of Gaussians.
+    """
+    import time
+
+    import numpy as np
+
+    if not 1 <= size <= SH_CODEBOOK_MAX_SIZE:
+        raise ValueError(f"SH codebook size must be in [1, {SH_CODEBOOK_MAX_SIZE}], got {size}")
+    t = time.perf_counter()
+    sh_rest = np.asarray(sh_rest, dtype=np.float32)
+    n, channels, num_rest = sh_rest.shape
+    vectors = sh_rest.reshape(n, channels * num_rest)
+    rng = np.random.default_rng(seed)
+
+    train = vectors[rng.permutation(n)[:SH_CODEBOOK_TRAIN_SAMPLES]]
+    size = min(size, max(len(train), 1))
+    seed_rows = max(SH_CODEBOOK_SEED_SAMPLES, SH_CODEBOOK_SEED_PER_ENTRY * size)
+    codebook = _kmeans_plus_plus(train[:seed_rows], size, rng) if n else np.zeros(
+        (size, vectors.shape[1]), np.float32
+    )
+
+    for _ in range(SH_CODEBOOK_ITERATIONS if n else 0):
+        assign = _nearest_codewords(train, codebook)
+        counts = np.bincount(assign, minlength=size)
+        sums = np.stack(
+            [np.bincount(assign, weights=train[:, d], minlength=size) for d in range(train.shape[1])], axis=1
+        )
+        filled = counts > 0
+        codebook[filled] = (sums[filled] / counts[filled, None]).astype(np.float32)
+        # Re-seed empty clusters from random training vectors
+        codebook[~filled] = train[rng.choice(len(train), int((~filled).sum()))]
+
+    codebook = codebook.astype(np.float16)
+    indices = _nearest_codewords(vectors, codebook.astype(np.float32)).astype(np.uint16)
+
+    # Colour error over view directions on a subsample of Gaussians
+    k = np.arange(SH_CODEBOOK_EVAL_DIRECTIONS) + 0.5
+    polar = np.arccos(1 - 2 * k / SH_CODEBOOK_EVAL_DIRECTIONS)
+    azimuth = np.pi * (1 + 5**0.5) * k
+    dirs = np.stack([np.cos(azimuth) * np.sin(polar), np.sin(azimuth) * np.sin(polar), np.cos(polar)], axis=1)
+    basis = _sh_rest_basis(dirs, num_rest).astype(np.float32)  # [D, K]
+    sample = rng.choice(n, min(n, SH_CODEBOOK_EVAL_SAMPLES), replace=False)
+    diff = sh_rest[sample] - codebook.astype(np.float32)[indices[sample]].reshape(-1, channels, num_rest)
+    colour_rmse = float(np.sqrt(np.mean((diff @ basis.T) ** 2))) if len(sample) else 0.0
+
+    float_bytes = sh_rest.size * 4
+    vq_bytes = codebook.nbytes + indices.nbytes
+    stats = {
+        "codebook_size": size,
+        "iterations": SH_CODEBOOK_ITERATIONS,
+        "float32_bytes": float_bytes,
+        "codebook_bytes": vq_bytes,
+        "compression_ratio": float_bytes / max(vq_bytes, 1),
+        "colour_rmse": colour_rmse,
+        "seconds": time.perf_counter() - t,
+    }
+    return {"codebook": codebook.reshape(size, channels, num_rest), "indices": indices, "stats": stats}
+
+
+def _encode_compact_splat(
+    arrays: dict,
+    sh_degree: int = COMPACT_SH_DEGREE,
+    sh_rest_bits: int = COMPACT_SH_REST_BITS,
+    sh_codebook: dict | None = None,
+) -> bytes:
+    """
+    Encode canonical splat arrays into the compact binary format.
+
+    `sh_codebook` (from _build_sh_codebook, trained on the same truncated
+    SH rest) replaces the scalar-quantized SH rest with codebook indices.
+    """
+    import struct
+    import zlib
+
+    import numpy as np
+
+    means = np.asarray(arrays["means"], dtype=np.float32)
+    n = means.shape[0]
+    num_rest = min((sh_degree + 1) ** 2, arrays["sh_rest"].shape[-1] + 1) - 1
+    sh_degree = int(round((num_rest + 1) ** 0.5)) - 1
+
+    pos_min = means.min(axis=0) if n else np.zeros(3, np.float32)
+    pos_max = means.max(axis=0) if n else np.zeros(3, np.float32)
+    log_scales = np.log(np.maximum(np.asarray(arrays["scales"], dtype=np.float32), 1e-12))
+    ls_min, ls_max = (float(log_scales.min()), float(log_scales.max())) if n else (0.0, 0.0)
+    sh_dc = np.asarray(arrays["sh_dc"], dtype=np.float32)
+    dc_min, dc_max = (float(sh_dc.min()), float(sh_dc.max())) if n else (0.0, 0.0)
+    sh_rest = np.asarray(arrays["sh_rest"], dtype=np.float32)[..., :num_rest]
+    rest_absmax = float(np.abs(sh_rest).max()) if sh_rest.size else 0.0
+    if sh_codebook is not None and sh_codebook["codebook"].shape[1:] != (3, num_rest):
+        raise ValueError(
+            f"SH codebook entries {sh_codebook['codebook'].shape[1:]} do not match SH degree {sh_degree}"
+        )
+    flags = COMPACT_FLAG_SH_CODEBOOK if sh_codebook is not None and num_rest else 0
+
+    header = struct.pack(
+        COMPACT_HEADER,
+        COMPACT_MAGIC,
+        COMPACT_VERSION,
+        sh_degree,
+        flags,
+        n,
+        *pos_min.tolist(),
+        *pos_max.tolist(),
+        ls_min,
+        ls_max,
+        dc_min,
+        dc_max,
+        rest_absmax,
+        sh_rest_bits,
+    )
+
+    body = b"".join(
+        [
+            np.stack(
+                [_quantize(means[:, a], float(pos_min[a]), float(pos_max[a]), 16) for a in range(3)],
+                axis=1,
+            ).astype("<u2").tobytes(),
+            _quantize(log_scales, ls_min, ls_max, 8).tobytes(),
+            _quantize(arrays["opacities"], 0.0, 1.0, 8).tobytes(),
+            _encode_rotations(arrays["rotations"]).astype("<u4").tobytes(),
+            _quantize(sh_dc, dc_min, dc_max, 8).tobytes(),
+            _encode_sh_rest(sh_rest, rest_absmax, sh_rest_bits, sh_codebook if flags else None)
+            if num_rest
+            else b"",
+        ]
+    )
+    return header + zlib.compress(body, level=9)
+
+
+def _encode_sh_rest(sh_rest, rest_absmax: float, sh_rest_bits: int, sh_codebook: dict | None) -> bytes:
+    import struct
+
+    import numpy as np
+
+    if sh_codebook is None:
+        return _pack_bits(_quantize(sh_rest, -rest_absmax, rest_absmax, sh_rest_bits), sh_rest_bits)
+    codebook = np.asarray(sh_codebook["codebook"], dtype="<f2")
+    return (
+        struct.pack("<H", codebook.shape[0])
+        + codebook.tobytes()
+        + np.asarray(sh_codebook["indices"], dtype="<u2").tobytes()
+    )
+
+
+def _decode_compact_splat(data: bytes) -> dict:
+    """Decode the compact binary format back into canonical splat arrays."""
+    import struct
+    import zlib
+
+    import numpy as np
+
+    fields = struct.unpack_from(COMPACT_HEADER, data)
+    magic, version, sh_degree, flags, n = fields[:5]
+    if magic != COMPACT_MAGIC or version != COMPACT_VERSION:
+        raise ValueError(f"Not a compact splat v{COMPACT_VERSION} file (magic={magic!r}, version={version})")
+    pos_min, pos_max = fields[5:8], fields[8:11]
+    ls_min, ls_max, dc_min, dc_max, rest_absmax, sh_rest_bits = fields[11:17]
+    num_rest = (sh_degree + 1) ** 2 - 1
+
+    body = zlib.decompress(data[struct.calcsize(COMPACT_HEADER):])
+    offset = 0
+
+    def take(nbytes: int) -> bytes:
+        nonlocal offset
+        chunk = body[offset:offset + nbytes]
+        offset += nbytes
+        return chunk
+
+    pos_q = np.frombuffer(take(n * 6), dtype="<u2").reshape(n, 3)
+    means = np.stack([_dequantize(pos_q[:, a], pos_min[a], pos_max[a], 16) for a in range(3)], axis=1)
+    log_scales = _dequantize(np.frombuffer(take(n * 3), np.uint8).reshape(n, 3), ls_min, ls_max, 8)
+    opacities = _dequantize(np.frombuffer(take(n), np.uint8), 0.0, 1.0, 8)
+    rotations = _decode_rotations(np.frombuffer(take(n * 4), dtype="<u4"))
+    sh_dc = _dequantize(np.frombuffer(take(n * 3), np.uint8).reshape(n, 3), dc_min, dc_max, 8)
+    if flags & COMPACT_FLAG_SH_CODEBOOK:
+        (size,) = struct.unpack("<H", take(2))
+        codebook = np.frombuffer(take(size * 3 * num_rest * 2), dtype="<f2").reshape(size, 3, num_rest)
+        indices = np.frombuffer(take(n * 2), dtype="<u2")
+        sh_rest = codebook.astype(np.float32)[indices]
+    else:
+        num_coeffs = n * 3 * num_rest
+        rest_q = _unpack_bits(take((num_coeffs + 7) // 8 * sh_rest_bits), sh_rest_bits, num_coeffs)
+        sh_rest = _dequantize(rest_q, -rest_absmax, rest_absmax, sh_rest_bits).reshape(n, 3, num_rest)
+
+    return {
+        "means": means,
+        "scales": np.exp(log_scales),
+        "rotations": rotations,
+        "opacities": opacities,
+        "sh_dc": sh_dc,
+        "sh_rest": sh_rest,
+    }
+
+
+# ── Progressive stream (Morton-ordered, coarse-to-fine chunks) ──────
+#   "progressive" output: Gaussians are sorted along a Morton (Z-order)
+#   curve, then split into levels — each level keeps the most important
+#   (opacity × volume) not-yet-taken Gaussian of every Morton block of
+#   PROGRESSIVE_LEVEL_BLOCKS[i], the last level takes the rest.  Levels are
+#   cut into chunks of ≤ PROGRESSIVE_CHUNK_GAUSSIANS, each a standalone
+#   compact blob, so any prefix of the stream renders a coarse scene.
+#
+#   Layout (little-endian): PROGRESSIVE_HEADER (magic, version, SH degree,
+#   reserved, total Gaussians, chunk count), then one PROGRESSIVE_INDEX_ENTRY
+#   (byte length, Gaussian count, level) per chunk, then the chunks in order.
+PROGRESSIVE_MAGIC = b"PSPL"
+PROGRESSIVE_VERSION = 1
+PROGRESSIVE_HEADER = "<4sBBHII"
+PROGRESSIVE_INDEX_ENTRY = "<III"
+PROGRESSIVE_LEVEL_BLOCKS = (64, 16, 4)
+PROGRESSIVE_CHUNK_GAUSSIANS = 65536
+MORTON_BITS = 10  # per axis → 30-bit codes
+
+
+def _morton_codes(means):
+    """30-bit Morton codes of positions quantized to the bounding box."""
+    import numpy as np
+
+    lo, hi = means.min(axis=0), means.max(axis=0)
+    cells = _quantize((means - lo) / np.maximum(hi - lo, 1e-12), 0.0, 1.0, MORTON_BITS).astype(np.uint64)
+
+    def spread(v):  # insert two zero bits between each of the low 10 bits
+        v = (v | (v << np.uint64(16))) & np.uint64(0x030000FF)
+        v = (v | (v << np.uint64(8))) & np.uint64(0x0300F00F)
+        v = (v | (v << np.uint64(4))) & np.uint64(0x030C30C3)
+        return (v | (v << np.uint64(2))) & np.uint64(0x09249249)
+
+    return (spread(cells[:, 0]) << np.uint64(2)) | (spread(cells[:, 1]) << np.uint64(1)) | spread(cells[:, 2])
+
+
+def _progressive_levels(importance, blocks=PROGRESSIVE_LEVEL_BLOCKS):
+    """Level per element (Morton order in, 0 = coarsest) — see PROGRESSIVE_LEVEL_BLOCKS."""
+    import numpy as np
+
+    n = len(importance)
+    levels = np.full(n, len(blocks), dtype=np.int64)
+    remaining = np.asarray(importance, dtype=np.float64).copy()
+    for level, block in enumerate(blocks):
+        pad = (-n) % block
+        grid = np.concatenate([remaining, np.full(pad, -np.inf)]).reshape(-1, block)
+        best = grid.argmax(axis=1)
+        picked = np.arange(grid.shape[0]) * block + best
+        picked = picked[np.isfinite(grid[np.arange(grid.shape[0]), best])]
+        levels[picked] = level
+        remaining[picked] = -np.inf
+    return levels
+
+
+def _encode_progressive_splat(arrays: dict, sh_degree: int = COMPACT_SH_DEGREE) -> bytes:
+    """Encode canonical splat arrays as a Morton-ordered progressive stream."""
+    import struct
+
+    import numpy as np
+
+    n = len(arrays["means"])
+    importance = np.asarray(arrays["opacities"], dtype=np.float64) * np.prod(
+        np.asarray(arrays["scales"], dtype=np.float64), axis=1
+    )
+    order = np.argsort(_morton_codes(np.asarray(arrays["means"])), kind="stable") if n else np.zeros(0, np.int64)
+    levels = _progressive_levels(importance[order])
+
+    chunks: list[tuple[bytes, int, int]] = []
+    for level in range(len(PROGRESSIVE_LEVEL_BLOCKS) + 1):
+        members = order[levels == level]  # stays in Morton order
+        for start in range(0, len(members), PROGRESSIVE_CHUNK_GAUSSIANS):
+            take = members[start:start + PROGRESSIVE_CHUNK_GAUSSIANS]
+            chunk = {name: np.asarray(values)[take] for name, values in arrays.items()}
+            chunks.append((_encode_compact_splat(chunk, sh_degree=sh_degree), len(take), level))
+
+    num_rest = min((sh_degree + 1) ** 2, arrays["sh_rest"].shape[-1] + 1) - 1
+    header = struct.pack(
+        PROGRESSIVE_HEADER,
+        PROGRESSIVE_MAGIC,
+        PROGRESSIVE_VERSION,
+        int(round((num_rest + 1) ** 0.5)) - 1,
+        0,
+        n,
+        len(chunks),
+    )
+    index = b"".join(struct.pack(PROGRESSIVE_INDEX_ENTRY, len(blob), count, level) for blob, count, level in chunks)
+    return header + index + b"".join(blob for blob, _, _ in chunks)
+
+
+def _read_progressive_splat(data: bytes) -> dict:
+    """
+    Decode any prefix of a progressive stream.
+
+    Returns the canonical arrays of every chunk that arrived complete, plus
+    "chunks_loaded", "chunks_total" and "complete".  A prefix shorter than
+    the header and index yields zero Gaussians.
+    """
+    import struct
+
+    import numpy as np
+
+    header_size = struct.calcsize(PROGRESSIVE_HEADER)
+    entry_size = struct.calcsize(PROGRESSIVE_INDEX_ENTRY)
+    decoded: list[dict] = []
+    sh_degree, chunks_total, indexed = 0, 0, False
+    if len(data) >= header_size:
+        magic, version, sh_degree, _reserved, _n, chunks_total = struct.unpack_from(PROGRESSIVE_HEADER, data)
+        if magic != PROGRESSIVE_MAGIC or version != PROGRESSIVE_VERSION:
+            raise ValueError(f"Not a progressive splat v{PROGRESSIVE_VERSION} stream (magic={magic!r})")
+        offset = header_size + chunks_total * entry_size
+        indexed = len(data) >= offset
+        if indexed:
+            for i in range(chunks_total):
+                length, _count, _level = struct.unpack_from(
+                    PROGRESSIVE_INDEX_ENTRY, data, header_size + i * entry_size
+                )
+                if offset + length > len(data):
+                    break
+                decoded.append(_decode_compact_splat(data[offset:offset + length]))
+                offset += length
+
+    if decoded:
+        arrays = {name: np.concatenate([d[name] for d in decoded]) for name in decoded[0]}
+    else:
+        num_rest = (sh_degree + 1) ** 2 - 1
+        arrays = {
+            "means": np.zeros((0, 3), np.float32),
+            "scales": np.zeros((0, 3), np.float32),
+            "rotations": np.zeros((0, 4), np.float32),
+            "opacities": np.zeros(0, np.float32),
+            "sh_dc": np.zeros((0, 3), np.float32),
+            "sh_rest": np.zeros((0, 3, num_rest), np.float32),
+        }
+    arrays.update(
+        chunks_loaded=len(decoded),
+        chunks_total=chunks_total,
+        complete=indexed and len(decoded) == chunks_total,
+    )
+    return arrays
+
+
 # ─────────────────────────────────────────────────────────────────────
-# Volumes (persistent caches for model weights)
+# Gaussian reduction (runs on the GPU, before anything reaches the host)
+#   • pruning — drop near-transparent and sub-pixel Gaussians
+#   • voxel LOD — merge Gaussians sharing a voxel, with the voxel size
+#     searched so each level fits its budget (e.g. 100k / 300k / full)
 # ─────────────────────────────────────────────────────────────────────
-volume = modal.Volume.from_name("anysplat-cache", create_if_missing=True)
-gen3c_volume = modal.Volume.from_name("gen3c-cache", create_if_missing=True)
+PRUNE_MIN_OPACITY = 1.0 / 255  # invisible once opacity is stored in 8 bits
+PRUNE_MIN_SCALE = 1e-4  # largest axis, relative to the export normalisation
+LOD_MAX_LEVELS = 4
+LOD_MIN_BUDGET = 1000
+LOD_VOXEL_SEARCH_STEPS = 20
+
+
+def _scene_scale(means):
+    """The factor export_ply's shift_and_scale divides by (see _gaussians_to_arrays)."""
+    centred = means - means.median(dim=0).values
+    return centred.abs().quantile(0.95, dim=0).max().clamp_min(1e-12)
+
+
+def _prune_gaussians(
+    splat: dict, min_opacity: float = PRUNE_MIN_OPACITY, min_scale: float = PRUNE_MIN_SCALE
+) -> dict:
+    """Keep Gaussians with opacity ≥ min_opacity and a largest axis ≥ min_scale (normalised)."""
+    if splat["means"].shape[0] == 0:
+        return splat
+    keep = (splat["opacities"] >= min_opacity) & (
+        splat["scales"].amax(dim=1) >= min_scale * _scene_scale(splat["means"])
+    )
+    return {name: t[keep] for name, t in splat.items()}
+
+
+def _voxel_keys(means, origin, voxel):
+    cells = ((means - origin) / voxel).floor().long().clamp_(0, (1 << 21) - 1)
+    return (cells[:, 0] << 42) | (cells[:, 1] << 21) | cells[:, 2]
+
+
+def _voxel_merge(splat: dict, budget: int) -> dict:
+    """
+    Merge Gaussians that share a voxel so at most `budget` remain.
+
+    The voxel size is found by bisection on the occupied-voxel count.
+    Within a voxel, means/SH/scales are opacity-weighted averages (scales
+    grown to cover the members' spread), opacities composite as
+    1 - Π(1 - α), and the rotation is taken from the most opaque member.
+    """
+    import torch
+
+    means = splat["means"]
+    n = means.shape[0]
+    if n <= budget:
+        return splat
+    origin = means.amin(dim=0)
+    extent = (means.amax(dim=0) - origin).max().clamp_min(1e-12)
+
+    # Bisect between a voxel fine enough to keep ~every point and the whole scene
+    lo, hi = extent / (1 << 21), extent
+    for _ in range(LOD_VOXEL_SEARCH_STEPS):
+        mid = (lo * hi).sqrt()
+        if torch.unique(_voxel_keys(means, origin, mid)).numel() > budget:
+            lo = mid
+        else:
+            hi = mid
+    _, inverse = torch.unique(_voxel_keys(means, origin, hi), return_inverse=True)
+    k = int(inverse.max()) + 1
+
+    alpha = splat["opacities"]
+    weight = alpha.clamp_min(1e-6)
+
+    def weighted_mean(values):
+        flat = values.reshape(n, -1) * weight[:, None]
+        total = torch.zeros(k, flat.shape[1], device=flat.device).index_add_(0, inverse, flat)
+        return total / weight_sum[:, None]
+
+    weight_sum = torch.zeros(k, device=means.device).index_add_(0, inverse, weight)
+    merged_means = weighted_mean(means)
+    spread = (weighted_mean(means**2) - merged_means**2).clamp_min(0).sqrt()
+    merged_scales = torch.maximum(weighted_mean(splat["scales"]), spread)
+    merged_harmonics = weighted_mean(splat["harmonics"]).reshape(k, *splat["harmonics"].shape[1:])
+    log_transmittance = torch.zeros(k, device=means.device).index_add_(
+        0, inverse, torch.log1p(-alpha.clamp(max=1 - 1e-6))
+    )
+    merged_opacities = 1 - log_transmittance.exp()
+
+    # Most opaque member of each voxel (ties → highest index) supplies the rotation
+    best = torch.full((k,), -1.0, device=means.device).scatter_reduce(0, inverse, alpha, "amax")
+    index = torch.arange(n, device=means.device)
+    member = torch.full((k,), -1, dtype=torch.long, device=means.device).scatter_reduce(
+        0, inverse, torch.where(alpha == best[inverse], index, -1), "amax"
+    )
+    return {
+        "means": merged_means,
+        "scales": merged_scales,
+        "rotations": splat["rotations"][member],
+        "harmonics": merged_harmonics,
+        "opacities": merged_opacities,
+    }
+
+
+# ─────────────────────────────────────────────────────────────────────
+# Chunked reconstruction (large image sets)
+#   Above ANYSPLAT_CHUNK_VIEWS views, the views are split into windows of
+#   at most that many, consecutive windows sharing ANYSPLAT_CHUNK_OVERLAP
+#   views, and each window runs on its own AnySplatService container.
+#   AnySplat's pred_context_pose (camera-to-world) of the shared views
+#   gives each window's similarity transform into window 0's frame; in
+#   the overlaps, each voxel keeps the Gaussians of one window only.
+# ─────────────────────────────────────────────────────────────────────
+ANYSPLAT_CHUNK_VIEWS = 32
+ANYSPLAT_CHUNK_OVERLAP = 4
+CHUNK_MERGE_VOXELS = 512  # voxels across twice the scene scale (see _scene_scale)
+CHUNK_SH_COEFFS = (COMPACT_SH_DEGREE + 1) ** 2  # SH sent back per window; no export uses more
+CHUNK_SH_FIT_DIRECTIONS = 64
+
+
+def _chunk_windows(
+    num_views: int, size: int = ANYSPLAT_CHUNK_VIEWS, overlap: int = ANYSPLAT_CHUNK_OVERLAP
+) -> list[list[int]]:
+    """Evenly sized windows of ≤ `size` views, each sharing `overlap` views with the next."""
+    import math
+
+    if num_views <= size:
+        return [list(range(num_views))]
+    count = math.ceil((num_views - overlap) / (size - overlap))
+    step = (num_views - overlap) / count
+    bounds = [math.floor(i * step) for i in range(count)] + [num_views - overlap]
+    return [list(range(bounds[i], bounds[i + 1] + overlap)) for i in range(count)]
+
+
+def _views_to_raw_frames(views) -> dict:
+    """Views in [-1, 1] ([V, 3, H, W], see _preprocess_views) as a raw uint8 frame payload."""
+    frames = ((views + 1) * 127.5).round().clamp(0, 255).byte().permute(0, 2, 3, 1)
+    return _pack_raw_frames(frames.cpu())
+
+
+def _pose_similarity(src, dst) -> tuple:
+    """
+    (scale, rotation, translation) mapping cameras `src` onto `dst`, both
+    camera-to-world [K, 4, 4] poses of the same views.  The rotation is
+    the chordal mean of the per-view relative rotations; scale and
+    translation are the least-squares fit of the camera centres given that
+    rotation (Umeyama with the rotation fixed, so it stays well defined
+    when the shared cameras barely move).
+    """
+    import torch
+
+    u, _, vt = torch.linalg.svd((dst[:, :3, :3] @ src[:, :3, :3].transpose(1, 2)).sum(dim=0))
+    fix = torch.ones(3, dtype=u.dtype, device=u.device)
+    fix[2] = torch.sign(torch.linalg.det(u @ vt))
+    rotation = u @ torch.diag(fix) @ vt
+
+    a, b = dst[:, :3, 3], src[:, :3, 3] @ rotation.T
+    a0, b0 = a - a.mean(dim=0), b - b.mean(dim=0)
+    spread = (b0**2).sum()
+    scale = (a0 * b0).sum() / spread if spread > 1e-12 else torch.ones((), device=a.device)
+    if scale <= 0:
+        print("⚠️  Shared cameras disagree on scale, merging the window unscaled")
+        scale = torch.ones((), device=a.device)
+    return scale, rotation, a.mean(dim=0) - scale * b.mean(dim=0)
+
+
+def _rotation_quaternion(rotation):
+    """Unit quaternion (xyzw) of a 3×3 rotation matrix."""
+    import torch
+
+    m = rotation
+    w = (1 + m[0, 0] + m[1, 1] + m[2, 2]).clamp_min(0).sqrt() / 2
+    x = (1 + m[0, 0] - m[1, 1] - m[2, 2]).clamp_min(0).sqrt() / 2
+    y = (1 - m[0, 0] + m[1, 1] - m[2, 2]).clamp_min(0).sqrt() / 2
+    z = (1 - m[0, 0] - m[1, 1] + m[2, 2]).clamp_min(0).sqrt() / 2
+    x = x.copysign(m[2, 1] - m[1, 2])
+    y = y.copysign(m[0, 2] - m[2, 0])
+    z = z.copysign(m[1, 0] - m[0, 1])
+    return torch.stack([x, y, z, w])
+
+
+def _sh_rotation(rotation, num_rest: int):
+    """
+    [num_rest, num_rest] matrix rotating non-DC SH coefficients by
+    `rotation`: fitted so the rotated colour at d equals the original at
+    Rᵀd over a fixed set of directions (see _sh_rest_basis).
+    """
+    import numpy as np
+    import torch
+
+    i = np.arange(CHUNK_SH_FIT_DIRECTIONS) + 0.5
+    polar, azimuth = np.arccos(1 - 2 * i / CHUNK_SH_FIT_DIRECTIONS), np.pi * (1 + 5**0.5) * i
+    dirs = np.stack([np.sin(polar) * np.cos(azimuth), np.sin(polar) * np.sin(azimuth), np.cos(polar)], axis=1)
+    r = rotation.double().cpu().numpy()
+    basis = _sh_rest_basis(dirs, num_rest)
+    matrix = np.linalg.lstsq(basis, _sh_rest_basis(dirs @ r, num_rest), rcond=None)[0]
+    return torch.from_numpy(matrix).to(rotation)
+
+
+def _transform_splat(splat: dict, scale, rotation, translation) -> dict:
+    """Gaussian tensors (see _gaussian_tensors) moved by x → scale · R x + t."""
+    import torch
+
+    x1, y1, z1, w1 = _rotation_quaternion(rotation)
+    x2, y2, z2, w2 = splat["rotations"].unbind(dim=1)
+    rotations = [
+        w1 * x2 + x1 * w2 + y1 * z2 - z1 * y2,
+        w1 * y2 - x1 * z2 + y1 * w2 + z1 * x2,
+        w1 * z2 + x1 * y2 - y1 * x2 + z1 * w2,
+        w1 * w2 - x1 * x2 - y1 * y2 - z1 * z2,
+    ]
+    harmonics = splat["harmonics"].clone()
+    if harmonics.shape[-1] > 1:
+        harmonics[..., 1:] = harmonics[..., 1:] @ _sh_rotation(rotation, harmonics.shape[-1] - 1).T
+    return {
+        "means": scale * splat["means"] @ rotation.T + translation,
+        "scales": scale * splat["scales"],
+        "rotations": torch.stack(rotations, dim=1),
+        "harmonics": harmonics,
+        "opacities": splat["opacities"],
+    }
+
+
+def _merge_windows(results: list[tuple[dict, object]], windows: list[list[int]]) -> dict:
+    """
+    One scene from per-window (Gaussian tensors, camera-to-world poses)
+    results, in window 0's frame: windows are aligned in order through the
+    views they share with earlier windows, then each voxel of the merged
+    set keeps only the Gaussians of the window with the most opacity in it.
+    """
+    import torch
+
+    world_poses: dict[int, torch.Tensor] = {}
+    parts = []
+    for k, ((splat, poses), views) in enumerate(zip(results, windows)):
+        if k:
+            shared = [i for i, view in enumerate(views) if view in world_poses]
+            if not shared:
+                raise ValueError(f"Window {k} shares no views with the earlier windows")
+            target = torch.stack([world_poses[views[i]] for i in shared])
+            scale, rotation, translation = _pose_similarity(poses[shared], target)
+            splat = _transform_splat(splat, scale, rotation, translation)
+            poses = poses.clone()
+            poses[:, :3, 3] = scale * poses[:, :3, 3] @ rotation.T + translation
+            poses[:, :3, :3] = rotation @ poses[:, :3, :3]
+            print(f"🧩 Window {k}: aligned on {len(shared)} shared view(s), scale {float(scale):.3f}")
+        for i, view in enumerate(views):
+            world_poses.setdefault(view, poses[i])
+        parts.append(splat)
+
+    merged = {name: torch.cat([part[name] for part in parts]) for name in parts[0]}
+    window = torch.cat(
+        [torch.full((part["means"].shape[0],), k, device=part["means"].device) for k, part in enumerate(parts)]
+    )
+    means = merged["means"]
+    voxel = 2 * _scene_scale(means) / CHUNK_MERGE_VOXELS
+    _, inverse = torch.unique(_voxel_keys(means, means.amin(dim=0), voxel), return_inverse=True)
+    slots = inverse * len(parts) + window
+    mass = torch.zeros((int(inverse.max()) + 1) * len(parts), device=means.device)
+    mass.index_add_(0, slots, merged["opacities"])
+    keep = window == mass.view(-1, len(parts)).argmax(dim=1)[inverse]
+    print(f"🧩 Merged {len(parts)} windows: dropped {int((~keep).sum()):,} overlapping Gaussians")
+    return {name: t[keep] for name, t in merged.items()}
 
 
 # ═════════════════════════════════════════════════════════════════════
-# FUNCTION: process_image  (AnySplat — feed-forward 3DGS)
+# SERVICE: AnySplatService  (AnySplat — feed-forward 3DGS)
+#   Load-once lifecycle: imports + CPU weights are loaded in a snapshotted
+#   @modal.enter hook, so cold starts restore them from a memory snapshot
+#   and only pay for the host → GPU copy.
 # ═════════════════════════════════════════════════════════════════════
-@app.function(
+ANYSPLAT_CHECKPOINT_DIR = "/cache/anysplat_checkpoints/anysplat"
+
+
+@app.cls(
     image=anysplat_image,
     gpu="A100",
     timeout=900,  # 15 minutes is plenty for feed-forward AnySplat
     volumes={"/cache": volume},
+    enable_memory_snapshot=True,
 )
-def process_image(image_bytes_list: list[bytes], filenames: list[str], prompt: str = "", elevation: int = 20) -> bytes:
+class AnySplatService:
     """
-    Process one or more images with AnySplat and return a PLY file with 3D Gaussians.
+    AnySplat model held resident for the lifetime of the container.
 
-    Quality improvements over the basic single-duplicate approach:
-    1. Multi-view augmentation: generates 6 synthetic crops from a single image
-       to provide parallax cues for better depth estimation.
-    2. Full SH export: preserves all spherical harmonics (degree 4) for richer,
-       view-dependent colours.
-    3. Scene normalization: centers and scales the scene for better viewer compat.
-    4. Multi-image support: when users upload multiple images the quality is
-       dramatically better because the model gets real parallax.
+    Startup is split in two hooks so the expensive part can be snapshotted:
+      • load()      (snap=True)  — imports, checkpoint download, safetensors
+                                   deserialisation on CPU
+      • to_device() (snap=False) — move the weights to the GPU
+    Each phase is timed; the breakdown is printed once per container.
+
+    `lane` is a class parameter, so each admission lane (see
+    ADMISSION_LANES) gets its own pool of containers: AnySplat-only
+    previews never queue behind the AnySplat stage of GEN3C jobs.
     """
-    import os
-    import sys
-    import tempfile
-    from pathlib import Path
 
-    import torch
-    import torchvision.transforms as T
-    from PIL import Image
-    import torchvision
-
-    # Route heavy downloads through the shared volume
-    os.environ["TORCH_HOME"] = "/cache/torch"
-    os.environ["HF_HOME"] = "/cache/huggingface"
-    os.environ["HF_DATASETS_CACHE"] = "/cache/huggingface/datasets"
-
-    # Add AnySplat to Python path
-    sys.path.insert(0, "/opt/anysplat")
-
-    from src.model.model.anysplat import AnySplat  # type: ignore
-    from src.model.ply_export import export_ply  # type: ignore
-
-    # ------------------------------------------------------------------
-    # Helper: create a 448×448 tensor from a PIL image with a specific
-    # crop offset (dx, dy in pixels) and zoom factor.
-    # ------------------------------------------------------------------
-    def make_view(pil_img: Image.Image, dx: int = 0, dy: int = 0, zoom: float = 1.0) -> torch.Tensor:
-        """Crop, resize to 448×448, normalise to [-1, 1]."""
-        w, h = pil_img.size
-        # Apply zoom: zoom > 1 means crop tighter (zoom-in)
-        crop_w = int(w / zoom)
-        crop_h = int(h / zoom)
-        # Centre + offset
-        cx = w // 2 + dx
-        cy = h // 2 + dy
-        left = max(0, cx - crop_w // 2)
-        top = max(0, cy - crop_h // 2)
-        right = min(w, left + crop_w)
-        bottom = min(h, top + crop_h)
-        cropped = pil_img.crop((left, top, right, bottom))
-        resized = cropped.resize((448, 448), Image.LANCZOS)
-        tensor = torchvision.transforms.ToTensor()(resized) * 2.0 - 1.0
-        return tensor  # [3, 448, 448]
-
-    # Cache the model at module level to avoid re-loading on warm containers
-    global _ANYSPLAT_MODEL  # type: ignore
-    try:
-        model = _ANYSPLAT_MODEL  # type: ignore[name-defined]
-    except NameError:
-        device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-        model = AnySplat.from_pretrained("lhjiang/anysplat")
-        model = model.to(device)
+    lane: str = modal.parameter(default="preview")
+
+    @modal.enter(snap=True)
+    def load(self) -> None:
+        import os
+        import sys
+        import time
+
+        timings: dict[str, float] = {}
+        t = time.perf_counter()
+
+        # Route heavy downloads through the shared volume
+        os.environ["TORCH_HOME"] = "/cache/torch"
+        os.environ["HF_HOME"] = "/cache/huggingface"
+        os.environ["HF_DATASETS_CACHE"] = "/cache/huggingface/datasets"
+
+        # Add AnySplat to Python path
+        sys.path.insert(0, "/opt/anysplat")
+
+        import torch  # noqa: F401
+        from src.model.model.anysplat import AnySplat  # type: ignore
+        from src.model.ply_export import export_ply  # type: ignore
+
+        timings["imports"] = time.perf_counter() - t
+        t = time.perf_counter()
+
+        # ── Checkpoint on the volume (downloaded once) ──────────────
+        if not os.path.exists(os.path.join(ANYSPLAT_CHECKPOINT_DIR, "model.safetensors")):
+            from huggingface_hub import snapshot_download
+
+            print(f"📥 Downloading {ANYSPLAT_CHECKPOINT} (first run only)...")
+            snapshot_download(
+                ANYSPLAT_CHECKPOINT,
+                local_dir=ANYSPLAT_CHECKPOINT_DIR,
+                local_dir_use_symlinks=False,
+            )
+            volume.commit()
+        timings["download"] = time.perf_counter() - t
+        t = time.perf_counter()
+
+        # ── Deserialise on CPU ──────────────────────────────────────
+        # Loading from a local directory makes the hub mixin read
+        # model.safetensors through safetensors.torch.load_model, which
+        # memory-maps the file instead of copying it through a pickle
+        # (the mixin's default map_location is CPU).
+        model = AnySplat.from_pretrained(ANYSPLAT_CHECKPOINT_DIR)
         model.eval()
         for param in model.parameters():
             param.requires_grad = False
-        _ANYSPLAT_MODEL = model  # type: ignore
+        timings["deserialize"] = time.perf_counter() - t
+
+        self.model = model
+        self.export_ply = export_ply
+        self.startup_timings = timings
+        self.snapshot_wallclock = time.time()
 
-    device = next(model.parameters()).device  # type: ignore[attr-defined]
+    @modal.enter(snap=False)
+    def to_device(self) -> None:
+        import time
 
-    with tempfile.TemporaryDirectory() as tmpdir:
-        tmpdir_path = Path(tmpdir)
+        import torch
+
+        t = time.perf_counter()
+        device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        self.model = self.model.to(device)
+        self.startup_timings["to_device"] = time.perf_counter() - t
+
+        # A large age means the CPU phase was restored from a memory snapshot
+        # rather than executed in this container.
+        cpu_state_age = time.time() - self.snapshot_wallclock
+        breakdown = ", ".join(f"{k}={v:.1f}s" for k, v in self.startup_timings.items())
+        print(f"⏱️  AnySplat startup: {breakdown} (CPU state age {cpu_state_age:.0f}s)")
+
+    @modal.method()
+    def process_image(
+        self,
+        image_bytes_list: list[bytes],
+        filenames: list[str],
+        prompt: str = "",
+        elevation: int = 20,
+        cache_key: str | None = None,
+        raw_frames: dict | None = None,
+        output_format: str = "ply",
+        sh_codebook_size: int = 0,
+        prune: bool = True,
+        lod_budgets: list[int] | None = None,
+        upload_ids: list[str] | None = None,
+        job_id: str | None = None,
+        video_upload_id: str | None = None,
+        video_max_frames: int = VIDEO_MAX_KEYFRAMES,
+        input_size: int = ANYSPLAT_INPUT_SIZE,
+    ) -> dict:
+        """
+        Process one or more images with AnySplat and return the 3D Gaussians.
+
+        The finished file — a PLY (output_format="ply"), the compact quantized
+        format ("compact") or its progressive stream ("progressive") — is
+        written to the artifact store; returns {"format", "num_gaussians",
+        "artifact"} with the artifact's metadata (see _store_artifact).
+        `sh_codebook_size` > 0 (compact only) vector-quantizes the SH rest
+        into a codebook of that many entries; its compression ratio and
+        colour error are added to the result as "sh_codebook".
+
+        `prune` drops near-transparent and sub-pixel Gaussians on the GPU
+        (see _prune_gaussians).  Each of `lod_budgets` adds a voxel-merged
+        level of at most that many Gaussians to result["lods"] as
+        {"budget", "artifact"}, encoded like the full result.
+        When `cache_key` is given (computed by the router with _result_cache_key)
+        the result's manifest is also stored in the result cache.
+
+        Views are built at `input_size`×`input_size` (one of
+        ANYSPLAT_INPUT_SIZES); the size and the inference wall time are
+        reported as result["input_size"] and result["inference_seconds"].
+
+        More than ANYSPLAT_CHUNK_VIEWS views are reconstructed as overlapping
+        windows in parallel across containers and merged into one scene
+        (see _chunk_windows, _merge_windows); result["windows"] then lists
+        the views in each window.
+
+        Multiple user images are filtered for near-duplicates first (see
+        _dedupe_views); the kept and dropped filenames are reported in
+        result["input_views"] as {"kept", "dropped": [{"filename",
+        "duplicate_of"}]}.
+
+        `raw_frames` (see _pack_raw_frames) replaces `image_bytes_list` for
+        GEN3C's raw transport: the uint8 array goes straight to the GPU with
+        no JPEG decode, PIL or temp-file hop.  `upload_ids` replaces it for
+        images in the upload store (see _store_upload), read from the volume
+        here instead of being shipped in the call.  `video_upload_id` names a
+        video in the upload store instead: up to `video_max_frames` keyframes
+        are streamed out of it (see _video_keyframes) and used as user
+        images; the pick is reported in result["video"].
+
+        Progress is published under `job_id` (default: this call's id; see
+        _JobProgress).
+
+        Quality improvements over the basic single-duplicate approach:
+        1. Multi-view augmentation: generates 6 synthetic crops from a single image
+           to provide parallax cues for better depth estimation.
+        2. Full SH export: preserves all spherical harmonics (degree 4) for richer,
+           view-dependent colours.
+        3. Scene normalization: centers and scales the scene for better viewer compat.
+        4. Multi-image support: when users upload multiple images the quality is
+           dramatically better because the model gets real parallax.
+        """
+        import os
+        import tempfile
+        import time
+        from pathlib import Path
+
+        import torch
+
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError(f"output_format must be one of {list(OUTPUT_FORMATS)}, got {output_format!r}")
+        if sh_codebook_size and output_format != "compact":
+            raise ValueError("sh_codebook_size requires output_format='compact'")
+        if input_size not in ANYSPLAT_INPUT_SIZES:
+            raise ValueError(f"input_size must be one of {list(ANYSPLAT_INPUT_SIZES)}, got {input_size!r}")
 
-        # ------------------------------------------------------------------
-        # Detect source: GEN3C frames vs user-uploaded images
-        # GEN3C frames have filenames like "gen3c_000.jpg"
-        # ------------------------------------------------------------------
         is_gen3c_input = any(fn.startswith("gen3c_") for fn in filenames)
-        source_label = "GEN3C multi-view" if is_gen3c_input else "user upload"
-        print(f"🔍 DEBUG: source = {source_label}, num_images = {len(image_bytes_list)}")
-        print(f"🔍 DEBUG: filenames = {filenames}")
-
-        # ------------------------------------------------------------------
-        # Debug: save input frames for inspection
-        # ------------------------------------------------------------------
-        import uuid as _uuid
-        debug_run_id = _uuid.uuid4().hex[:8]
-        debug_dir = Path(f"/cache/debug/anysplat_run_{debug_run_id}")
-        debug_dir.mkdir(parents=True, exist_ok=True)
-        print(f"🔍 DEBUG: anysplat debug dir = {debug_dir}")
-
-        # ------------------------------------------------------------------
-        # Build views from all input images
-        # ------------------------------------------------------------------
-        views: list[torch.Tensor] = []
-
-        for idx, (img_bytes, fname) in enumerate(zip(image_bytes_list, filenames)):
-            img_path = tmpdir_path / f"input_{idx}_{fname}"
-            img_path.write_bytes(img_bytes)
-            pil_img = Image.open(str(img_path)).convert("RGB")
-            w, h = pil_img.size
-            print(f"🖼️  Image {idx}: {fname} — {w}×{h}")
-
-            # Save debug copy of every input frame
-            pil_img.save(str(debug_dir / f"input_{idx:03d}_{fname}"))
-
-            if len(image_bytes_list) == 1 and not is_gen3c_input:
-                # ── Single user image: create 6 augmented views for better 3D ──
-                # The shift amount is ~3-5% of image dimension.  Small enough
-                # to keep the subject in frame, large enough for parallax.
-                shift_x = max(12, int(w * 0.04))
-                shift_y = max(12, int(h * 0.04))
-                views.append(make_view(pil_img, dx=0, dy=0, zoom=1.0))      # centre
-                views.append(make_view(pil_img, dx=-shift_x, dy=0, zoom=1.0))  # left
-                views.append(make_view(pil_img, dx=shift_x, dy=0, zoom=1.0))   # right
-                views.append(make_view(pil_img, dx=0, dy=-shift_y, zoom=1.0))  # up
-                views.append(make_view(pil_img, dx=0, dy=shift_y, zoom=1.0))   # down
-                views.append(make_view(pil_img, dx=0, dy=0, zoom=1.08))     # zoom in
-                print(f"🔍 DEBUG: single-image augmentation → 6 views")
+        progress = _JobProgress(job_id or modal.current_function_call_id(), "gen3c" if is_gen3c_input else "anysplat")
+        progress.stage("anysplat_inference")
+
+        if upload_ids:
+            volume.reload()  # uploaded through the router since our last view
+            image_bytes_list = _read_uploads(UPLOAD_DIR, upload_ids)
+
+        video_frames, video_stats = [], None
+        if video_upload_id:
+            volume.reload()
+            if not (_is_upload_id(video_upload_id) and _touch_artifact(UPLOAD_DIR, video_upload_id)):
+                raise FileNotFoundError(f"Unknown upload id(s): {video_upload_id}")
+            progress.update(0, 1, "decoding video", force=True)
+            video_frames, video_stats = _video_keyframes(os.path.join(UPLOAD_DIR, video_upload_id), video_max_frames)
+            image_bytes_list = []
+            filenames = [f"video_{t:07.2f}s.jpg" for t in video_stats["times"]]
+            print(
+                f"🎞️  Video: {video_stats['keyframes']} keyframes of {video_stats['decoded_frames']} "
+                f"decoded frames at {video_frames[0].shape[1]}×{video_frames[0].shape[0]}"
+            )
+
+        device = next(self.model.parameters()).device
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            tmpdir_path = Path(tmpdir)
+
+            # ------------------------------------------------------------------
+            # Detect source: GEN3C frames vs user-uploaded images
+            # GEN3C frames have filenames like "gen3c_000.jpg"
+            # ------------------------------------------------------------------
+            source_label = "GEN3C multi-view" if is_gen3c_input else "user upload"
+            num_inputs = len(filenames) if raw_frames is None else raw_frames["shape"][0]
+            print(f"🔍 DEBUG: source = {source_label}, num_images = {num_inputs}")
+            print(f"🔍 DEBUG: filenames = {filenames}")
+
+            # ------------------------------------------------------------------
+            # Debug: save input frames for inspection
+            # ------------------------------------------------------------------
+            import uuid as _uuid
+            debug_run_id = _uuid.uuid4().hex[:8]
+            debug_dir = Path(f"/cache/debug/anysplat_run_{debug_run_id}")
+            debug_dir.mkdir(parents=True, exist_ok=True)
+            print(f"🔍 DEBUG: anysplat debug dir = {debug_dir}")
+
+            # ------------------------------------------------------------------
+            # Build views from all input images
+            # ------------------------------------------------------------------
+            input_views = None
+            if raw_frames is not None:
+                # ── Raw transport: one host → device copy, no decode ──
+                print(f"🖼️  Raw frames {tuple(raw_frames['shape'])} uint8")
+                views = _preprocess_views(
+                    _raw_frames_tensor(raw_frames), augment=False, device=device, size=input_size
+                )
+            else:
+                # Decode straight from memory; the debug copy is the original bytes.
+                # Video keyframes arrive decoded.
+                decoded = list(video_frames)
+                for idx, (img_bytes, fname) in enumerate(zip(image_bytes_list, filenames)):
+                    img = _decode_image(img_bytes)
+                    print(f"🖼️  Image {idx}: {fname} — {img.shape[1]}×{img.shape[0]}")
+                    (debug_dir / f"input_{idx:03d}_{fname}").write_bytes(img_bytes)
+                    decoded.append(img)
+
+                # Single user image → 6 augmented views for better 3D.  GEN3C
+                # frames or multiple user images already have real parallax, so
+                # each is used as a centre crop (augmentation would dilute it).
+                augment = len(decoded) == 1 and not is_gen3c_input
+                views = _preprocess_views(decoded, augment=augment, device=device, size=input_size)
+                if augment:
+                    print(f"🔍 DEBUG: single-image augmentation → {len(views)} views")
+
+                # Near-duplicate uploads (phone bursts) add cost, not parallax
+                if len(decoded) > 1 and not is_gen3c_input:
+                    duplicate_of = _dedupe_views(views)
+                    keep = [i for i, match in enumerate(duplicate_of) if match is None]
+                    input_views = {
+                        "kept": [filenames[i] for i in keep],
+                        "dropped": [
+                            {"filename": filenames[i], "duplicate_of": filenames[match]}
+                            for i, match in enumerate(duplicate_of)
+                            if match is not None
+                        ],
+                    }
+                    if len(keep) < len(decoded):
+                        print(
+                            f"🧹 Dropped {len(decoded) - len(keep)} near-duplicate image(s): "
+                            f"{[d['filename'] for d in input_views['dropped']]}"
+                        )
+                        if len(keep) == 1:
+                            # All one shot → treat it as a single image
+                            views = _preprocess_views(
+                                [decoded[keep[0]]], augment=True, device=device, size=input_size
+                            )
+                        else:
+                            views = views[keep]
+
+            # AnySplat needs ≥ 2 views
+            if len(views) < 2:
+                views = torch.cat([views, views[:1]], dim=0)
+                print(f"⚠️  Only {len(views)-1} view(s), duplicated to meet AnySplat minimum")
+
+            num_views = len(views)
+
+            # ── HARD ASSERTION: GEN3C path must supply ≥ 6 views ─────────
+            if is_gen3c_input:
+                assert num_views >= 6, (
+                    f"AnySplat expects ≥6 frames from GEN3C, but got {num_views}. "
+                    f"Check Gen3cService.generate_views num_frames parameter."
+                )
+                print(f"✅ GEN3C assertion passed: {num_views} views ≥ 6")
+
+            images = views.unsqueeze(0)  # [1, V, 3, input_size, input_size], already on device
+            b, v, _, h_t, w_t = images.shape
+
+            # ── Detailed shape logging ──────────────────────────────────
+            print(f"📐 AnySplat input: {num_views} views, tensor shape {images.shape}")
+            print(f"🔍 DEBUG: images.ndim={images.ndim}, images.shape[1]={images.shape[1]} (views)")
+            print(f"🔍 DEBUG: dtype={images.dtype}, device={images.device}")
+            print(f"🔍 DEBUG: value range = [{images.min().item():.2f}, {images.max().item():.2f}]")
+
+            # ── Assert correct dimensionality ──────────────────────────
+            # AnySplat expects [B, V, C, H, W] where B=1, V=num_views, C=3
+            assert images.ndim == 5, f"Expected 5D tensor [B,V,C,H,W], got {images.ndim}D: {images.shape}"
+            assert images.shape[1] >= 2, f"AnySplat needs ≥2 views, got {images.shape[1]}"
+            if is_gen3c_input:
+                assert images.shape[1] >= 6, (
+                    f"GEN3C path: AnySplat tensor has only {images.shape[1]} views, "
+                    f"expected ≥6. The GEN3C frames are NOT being used correctly!"
+                )
+
+            # Run inference — in one pass, or windowed for large view sets
+            t_infer = time.time()
+            windows = _chunk_windows(num_views)
+            if len(windows) == 1:
+                splat, _ = self._infer(views)
             else:
-                # GEN3C frames or multiple user images: use each as a centre crop.
-                # These already have real parallax; augmentation would dilute it.
-                views.append(make_view(pil_img, dx=0, dy=0, zoom=1.0))
-
-        # AnySplat needs ≥ 2 views
-        if len(views) < 2:
-            views.append(views[0])
-            print(f"⚠️  Only {len(views)-1} view(s), duplicated to meet AnySplat minimum")
-
-        num_views = len(views)
-
-        # ── HARD ASSERTION: GEN3C path must supply ≥ 6 views ─────────
-        if is_gen3c_input:
-            assert num_views >= 6, (
-                f"AnySplat expects ≥6 frames from GEN3C, but got {num_views}. "
-                f"Check gen3c_generate_views num_frames parameter."
+                splat = self._infer_chunked(views, windows, prune, progress)
+            if device.type == "cuda":
+                torch.cuda.synchronize(device)
+            inference_seconds = time.time() - t_infer
+
+            num_gaussians = splat["means"].shape[0]
+            print(
+                f"🔮 AnySplat produced {num_gaussians:,} Gaussians from {num_views} views at "
+                f"{input_size}×{input_size} in {inference_seconds:.2f}s"
             )
-            print(f"✅ GEN3C assertion passed: {num_views} views ≥ 6")
-
-        images = torch.stack(views, dim=0).unsqueeze(0).to(device)  # [1, V, 3, 448, 448]
-        b, v, _, h_t, w_t = images.shape
-
-        # ── Detailed shape logging ──────────────────────────────────
-        print(f"📐 AnySplat input: {num_views} views, tensor shape {images.shape}")
-        print(f"🔍 DEBUG: images.ndim={images.ndim}, images.shape[1]={images.shape[1]} (views)")
-        print(f"🔍 DEBUG: dtype={images.dtype}, device={images.device}")
-        print(f"🔍 DEBUG: value range = [{images.min().item():.2f}, {images.max().item():.2f}]")
-
-        # ── Assert correct dimensionality ──────────────────────────
-        # AnySplat expects [B, V, C, H, W] where B=1, V=num_views, C=3
-        assert images.ndim == 5, f"Expected 5D tensor [B,V,C,H,W], got {images.ndim}D: {images.shape}"
-        assert images.shape[1] >= 2, f"AnySplat needs ≥2 views, got {images.shape[1]}"
-        if is_gen3c_input:
-            assert images.shape[1] >= 6, (
-                f"GEN3C path: AnySplat tensor has only {images.shape[1]} views, "
-                f"expected ≥6. The GEN3C frames are NOT being used correctly!"
+
+            # ------------------------------------------------------------------
+            # Reduce on the GPU before anything is copied to the host
+            # ------------------------------------------------------------------
+            if prune:
+                splat = _prune_gaussians(splat)
+                pruned = num_gaussians - splat["means"].shape[0]
+                num_gaussians = splat["means"].shape[0]
+                print(f"✂️  Pruned {pruned:,} near-transparent / sub-pixel Gaussians → {num_gaussians:,}")
+
+            # ------------------------------------------------------------------
+            # Export in the requested format (see OUTPUT_FORMATS)
+            # ------------------------------------------------------------------
+            progress.stage("export", output_format)
+            data, detail, sh_codebook = self._export(
+                splat, output_format, sh_codebook_size, tmpdir_path / "gaussians.ply"
             )
 
-        # Run inference
+            size_mb = len(data) / (1024 * 1024)
+            print(f"✅ AnySplat {output_format}: {len(data):,} bytes ({size_mb:.1f} MB), "
+                  f"{num_gaussians:,} gaussians, {detail}, shift+scale normalised")
+            print(f"🔍 DEBUG: source={source_label}, views={num_views}, "
+                  f"gaussians={num_gaussians:,}, {output_format}_mb={size_mb:.1f}")
+            print(f"🔍 DEBUG: debug frames saved to {debug_dir}")
+
+            artifact = _store_artifact(ARTIFACT_DIR, data, output_format)
+            result = {
+                "format": output_format,
+                "num_gaussians": int(num_gaussians),
+                "artifact": artifact,
+                "input_size": input_size,
+                "inference_seconds": round(inference_seconds, 2),
+            }
+            if len(windows) > 1:
+                result["windows"] = [len(window) for window in windows]
+            if sh_codebook is not None:
+                result["sh_codebook"] = sh_codebook["stats"]
+            if input_views is not None:
+                result["input_views"] = input_views
+            if video_stats is not None:
+                result["video"] = video_stats
+
+            # Coarser levels from the same inference (budgets ≥ the full count reuse it)
+            if lod_budgets:
+                result["lods"] = []
+                for level, budget in enumerate(lod_budgets):
+                    progress.update(level + 1, len(lod_budgets) + 1, f"LOD {budget:,}")
+                    lod_artifact = artifact
+                    if budget < num_gaussians:
+                        lod = _voxel_merge(splat, budget)
+                        lod_data, _, _ = self._export(
+                            lod, output_format, sh_codebook_size, tmpdir_path / f"lod_{budget}.ply"
+                        )
+                        lod_artifact = _store_artifact(ARTIFACT_DIR, lod_data, output_format)
+                        print(f"🧱 LOD {budget:,}: {lod['means'].shape[0]:,} gaussians, {len(lod_data):,} bytes")
+                    result["lods"].append({"budget": budget, "artifact": lod_artifact})
+
+            if cache_key:
+                _cache_result(cache_key, result)
+                print(f"💾 Cached result {cache_key[:12]}…")
+            volume.commit()
+            print(f"📦 Stored artifact {artifact['name']}")
+            return result
+
+    @modal.method()
+    def reconstruct_window(self, raw_frames: dict, prune: bool = True) -> dict:
+        """
+        One window of a chunked reconstruction (see _chunk_windows).
+
+        Runs AnySplat on the views in `raw_frames` (see _views_to_raw_frames)
+        and returns {"splat": float16 Gaussian arrays with SH cut to
+        CHUNK_SH_COEFFS, "poses": float32 camera-to-world [V, 4, 4]}.
+        """
+        device = next(self.model.parameters()).device
+        size = raw_frames["shape"][1]  # already at the job's input_size
+        views = _preprocess_views(_raw_frames_tensor(raw_frames), augment=False, device=device, size=size)
+        splat, poses = self._infer(views)
+        splat["harmonics"] = splat["harmonics"][..., :CHUNK_SH_COEFFS]
+        if prune:
+            splat = _prune_gaussians(splat)
+        print(f"🧩 Window of {len(views)} views → {splat['means'].shape[0]:,} Gaussians")
+        return {
+            "splat": {name: t.half().cpu().numpy() for name, t in splat.items()},
+            "poses": poses.cpu().numpy(),
+        }
+
+    def _infer(self, views) -> tuple[dict, object]:
+        """AnySplat on views [V, 3, H, W] in [-1, 1] → (Gaussian tensors, camera-to-world poses [V, 4, 4])."""
+        import torch
+
         with torch.no_grad():
-            gaussians, pred_context_pose = model.inference((images + 1) * 0.5)  # type: ignore[attr-defined]
-
-        num_gaussians = gaussians.means[0].shape[0]
-        print(f"🔮 AnySplat produced {num_gaussians:,} Gaussians")
-
-        # ------------------------------------------------------------------
-        # Export to PLY with quality flags:
-        #   • save_sh_dc_only=True  → DC-band only; full SH (degree 4) makes
-        #     the file ~16× larger per Gaussian and exceeds Vercel's 4.5 MB
-        #     response limit when transferred as base64.
-        #   • shift_and_scale=True  → normalise the scene to [-1, 1]
-        # ------------------------------------------------------------------
-        ply_path = tmpdir_path / "gaussians.ply"
-        export_ply(
-            gaussians.means[0],
-            gaussians.scales[0],
-            gaussians.rotations[0],
-            gaussians.harmonics[0],
-            gaussians.opacities[0],
+            gaussians, pred_context_pose = self.model.inference((views.unsqueeze(0) + 1) * 0.5)
+        return _gaussian_tensors(gaussians), pred_context_pose["extrinsic"][0].float()
+
+    def _infer_chunked(self, views, windows: list[list[int]], prune: bool, progress: "_JobProgress") -> dict:
+        """
+        Reconstruct overlapping `windows` of `views` in parallel — window 0
+        here, the rest on other containers of this lane — and merge them
+        (see _merge_windows).
+        """
+        import torch
+
+        print(f"🧩 Chunked reconstruction: {len(views)} views in {len(windows)} windows {[len(w) for w in windows]}")
+        service = AnySplatService(lane=self.lane)
+        calls = [
+            service.reconstruct_window.spawn(_views_to_raw_frames(views[window]), prune=prune)
+            for window in windows[1:]
+        ]
+        splat, poses = self._infer(views[windows[0]])
+        splat["harmonics"] = splat["harmonics"][..., :CHUNK_SH_COEFFS]
+        if prune:
+            splat = _prune_gaussians(splat)
+        results = [(splat, poses)]
+        for k, call in enumerate(calls, start=1):
+            progress.update(k, len(windows), f"window {k + 1}/{len(windows)}")
+            window = call.get()
+            splat = {name: torch.from_numpy(a).to(views.device).float() for name, a in window["splat"].items()}
+            results.append((splat, torch.from_numpy(window["poses"]).to(views.device)))
+        return _merge_windows(results, windows)
+
+    def _export(self, splat: dict, output_format: str, sh_codebook_size: int, ply_path):
+        """Encode Gaussian tensors as (data, log detail, SH codebook or None)."""
+        if output_format == "compact":
+            arrays = _gaussians_to_arrays(splat, ANYSPLAT_EXPORT_FLAGS["shift_and_scale"])
+            detail = f"quantized SH up to degree {COMPACT_SH_DEGREE}"
+            sh_codebook = None
+            if sh_codebook_size:
+                num_rest = min((COMPACT_SH_DEGREE + 1) ** 2 - 1, arrays["sh_rest"].shape[-1])
+                sh_codebook = _build_sh_codebook(arrays["sh_rest"][..., :num_rest], sh_codebook_size)
+                stats = sh_codebook["stats"]
+                print(
+                    f"🎨 SH codebook: {stats['codebook_size']} entries in {stats['seconds']:.1f}s, "
+                    f"{stats['compression_ratio']:.1f}× smaller than float32, "
+                    f"colour RMSE {stats['colour_rmse'] * 255:.2f}/255"
+                )
+                detail += f", {stats['codebook_size']}-entry codebook"
+            return _encode_compact_splat(arrays, sh_codebook=sh_codebook), detail, sh_codebook
+
+        if output_format == "progressive":
+            arrays = _gaussians_to_arrays(splat, ANYSPLAT_EXPORT_FLAGS["shift_and_scale"])
+            return _encode_progressive_splat(arrays), "Morton-ordered coarse-to-fine chunks", None
+
+        # PLY with quality flags (see ANYSPLAT_EXPORT_FLAGS)
+        self.export_ply(
+            splat["means"],
+            splat["scales"],
+            splat["rotations"],
+            splat["harmonics"],
+            splat["opacities"],
             ply_path,
-            shift_and_scale=True,
-            save_sh_dc_only=True,
+            **ANYSPLAT_EXPORT_FLAGS,
         )
-
         if not ply_path.exists():
             raise RuntimeError(f"AnySplat did not produce a PLY file at {ply_path}")
-
-        ply_size_mb = ply_path.stat().st_size / (1024 * 1024)
-        print(f"✅ AnySplat PLY: {ply_path.stat().st_size:,} bytes ({ply_size_mb:.1f} MB), "
-              f"{num_gaussians:,} gaussians, DC-only SH, shift+scale normalised")
-        print(f"🔍 DEBUG: source={source_label}, views={num_views}, "
-              f"gaussians={num_gaussians:,}, ply_mb={ply_size_mb:.1f}")
-        print(f"🔍 DEBUG: debug frames saved to {debug_dir}")
-        return ply_path.read_bytes()
+        return ply_path.read_bytes(), "DC-only SH", None
 
 
 # ═════════════════════════════════════════════════════════════════════
-# FUNCTION: gen3c_generate_views  (GEN3C orbit video → frames)
+# SERVICE: Gen3cService  (GEN3C orbit video → frames)
+#   MoGe and Gen3cPipeline (7B network + tokenizer) are loaded once per
+#   container in @modal.enter and reused by every generate_views call.
+#   Per-request state (seed, Cache3D_Buffer, trajectory, temp files) is
+#   rebuilt inside each call; calls run one at a time per container.
 # ═════════════════════════════════════════════════════════════════════
-@app.function(
+GEN3C_CHECKPOINT_DIR = "/cache/gen3c_checkpoints"
+
+# Memory modes (selectable per request via gen3c_memory_mode):
+#   • "offload"  — every component is shuttled host ↔ device (~43 GB peak)
+#   • "resident" — diffusion network + tokenizer stay on the GPU
+#   • "auto"     — keep as much resident as the free VRAM budget allows
+GEN3C_MEMORY_MODES = ("auto", "resident", "offload")
+GEN3C_OFFLOAD_PEAK_GB = 43.0  # measured peak with full offloading
+GEN3C_NETWORK_GB = 15.0  # 7B diffusion network weights (bf16)
+GEN3C_TOKENIZER_GB = 4.0  # CV8x8x8 tokenizer weights + decode workspace
+GEN3C_VRAM_HEADROOM_GB = 4.0
+# A100-80GB containers per memory-mode pool.  Beyond this, generate_views
+# inputs queue, and that backlog is what the "full" admission lane measures.
+GEN3C_MAX_CONTAINERS = 4
+# Progress reporting counts denoiser calls: classifier-free guidance runs a
+# conditional and an unconditional pass per diffusion step.
+GEN3C_DENOISE_CALLS_PER_STEP = 2
+
+# Camera trajectories (cosmos camera_utils types): the two orbits and the
+# elevated pass ("up", rising over the object, facing its centre).
+# gen3c_pipeline renders each one on its own Gen3cService container, all
+# from the same seeded MoGe depth and Cache3D_Buffer inputs, and merges
+# their keyframes.
+GEN3C_TRAJECTORIES = ("clockwise", "counterclockwise", "up")
+# The default is one orbit: each extra trajectory holds another A100 for the
+# whole job (and takes another place in the full lane's queue) and past
+# ANYSPLAT_CHUNK_VIEWS keyframes AnySplat runs windowed, so fan-out is opt-in.
+GEN3C_DEFAULT_TRAJECTORIES = ("clockwise",)
+
+# Keyframe selection (see _select_keyframes): num_frames is a budget, not
+# a count — redundant stretches of a video yield fewer, sharper views.
+GEN3C_KEYFRAME_COVERAGE = 0.95  # fraction of usable frames a keyframe must cover
+GEN3C_MIN_KEYFRAMES = 6  # per video; AnySplat needs ≥6 GEN3C views
+GEN3C_KEYFRAME_SCORE_SIZE = 128  # frames are scored at ~this many px on the short side
+
+
+def _select_keyframes(
+    video,
+    max_frames: int,
+    margin: int = 0,
+    coverage: float = GEN3C_KEYFRAME_COVERAGE,
+    min_frames: int = GEN3C_MIN_KEYFRAMES,
+):
+    """
+    Pick the smallest set of sharp keyframes covering a video's parallax.
+
+    Every frame of `video` (uint8 [T, H, W, 3]) outside the first/last
+    `margin` is scored at once on a downsampled grayscale copy: parallax
+    between two frames is their RMS difference (all pairs from one Gram
+    matrix), sharpness the variance of the Laplacian.  A keyframe covers
+    the frames within the radius evenly spaced `max_frames` would need to
+    cover `coverage` of them (that quantile of the distances at half their
+    spacing).  Keyframes are picked greedily — most newly covered frames,
+    weighted by sharpness — until `coverage` of the frames is covered or
+    the budget is spent, then topped up to `min_frames` with the frames
+    least like any keyframe.
+
+    Returns (sorted frame indices, stats) where stats reports the budget,
+    the views selected and saved, coverage, radius and parallax spread.
+    """
+    import numpy as np
+
+    total = video.shape[0]
+    stride = max(1, min(video.shape[1:3]) // GEN3C_KEYFRAME_SCORE_SIZE)
+    luma = np.array([0.299, 0.587, 0.114], dtype=np.float32)
+    gray = video[margin : total - margin, ::stride, ::stride].astype(np.float32) @ luma
+    n = gray.shape[0]
+
+    laplacian = (
+        4 * gray[:, 1:-1, 1:-1] - gray[:, :-2, 1:-1] - gray[:, 2:, 1:-1] - gray[:, 1:-1, :-2] - gray[:, 1:-1, 2:]
+    )
+    sharpness = laplacian.reshape(n, -1).var(axis=1)
+
+    flat = gray.reshape(n, -1).astype(np.float64)
+    sq = (flat**2).sum(axis=1)
+    dist = np.sqrt(np.maximum(sq[:, None] + sq[None, :] - 2 * flat @ flat.T, 0.0) / flat.shape[1])
+
+    half = max(1, round((n - 1) / max(max_frames - 1, 1) / 2))
+    reach = dist[np.arange(n - half), np.arange(half, n)]
+    radius = float(np.quantile(reach, coverage)) if reach.size else 0.0
+    covers = dist <= radius  # covers[i, j]: keyframe i covers frame j
+    weight = 0.5 + 0.5 * sharpness / max(float(sharpness.max()), 1e-6)
+
+    selected: list[int] = []
+    covered = np.zeros(n, dtype=bool)
+    while len(selected) < min(max_frames, n) and covered.mean() < coverage:
+        gain = covers[:, ~covered].sum(axis=1) * weight
+        gain[selected] = -1.0
+        best = int(gain.argmax())
+        selected.append(best)
+        covered |= covers[best]
+    while len(selected) < min(min_frames, max_frames, n):
+        nearest = dist[selected].min(axis=0)
+        nearest[selected] = -1.0
+        selected.append(int(nearest.argmax()))
+
+    selected.sort()
+    stats = {
+        "budget": max_frames,
+        "selected": len(selected),
+        "saved": max_frames - len(selected),
+        "coverage": round(float(covers[selected].any(axis=0).mean()), 3),
+        "radius": round(radius, 2),
+        "spread": round(float(dist[np.ix_(selected, selected)].max()), 2),
+        "sharpness": [round(float(sharpness[i]), 1) for i in selected],
+    }
+    return np.array(selected, dtype=int) + margin, stats
+
+
+def _gen3c_offload_plan(memory_mode: str, free_gb: float) -> dict[str, bool]:
+    """
+    Decide which GEN3C components to offload for a given free-VRAM budget.
+
+    "auto" keeps the tokenizer resident first (it is touched on every
+    encode/decode) and the diffusion network second.
+    """
+    if memory_mode not in GEN3C_MEMORY_MODES:
+        raise ValueError(f"Unknown GEN3C memory mode {memory_mode!r}, expected one of {GEN3C_MEMORY_MODES}")
+    if memory_mode == "offload":
+        return {"offload_network": True, "offload_tokenizer": True}
+    if memory_mode == "resident":
+        return {"offload_network": False, "offload_tokenizer": False}
+
+    budget = free_gb - GEN3C_OFFLOAD_PEAK_GB - GEN3C_VRAM_HEADROOM_GB
+    keep_tokenizer = budget >= GEN3C_TOKENIZER_GB
+    keep_network = budget >= GEN3C_TOKENIZER_GB + GEN3C_NETWORK_GB
+    return {"offload_network": not keep_network, "offload_tokenizer": not keep_tokenizer}
+
+
+@app.cls(
     image=gen3c_image,
     gpu="A100-80GB",  # GEN3C needs ~43 GB VRAM with full offloading
     timeout=900,
     volumes={"/cache": gen3c_volume},
+    max_containers=GEN3C_MAX_CONTAINERS,
 )
-def gen3c_generate_views(
-    image_bytes: bytes,
-    diffusion_steps: int = 22,
-    movement_distance: float = 0.3,
-    num_frames: int = 12,
-) -> list[bytes]:
+class Gen3cService:
     """
-    Generate multi-view frames from a single image using NVIDIA GEN3C-Cosmos-7B.
-
-    Steps:
-      1. Download checkpoints (cached in volume after first run).
-      2. Predict depth with MoGe.
-      3. Create 3D cache and camera trajectory (clockwise orbit).
-      4. Generate 121-frame video with Gen3cPipeline at 704×1280.
-      5. Sample `num_frames` evenly-spaced keyframes.
-      6. Save debug frames to /cache/debug/gen3c_run_<uuid>/.
+    NVIDIA GEN3C-Cosmos-7B + MoGe depth, resident for the container's lifetime.
 
-    Returns a list of JPEG byte buffers (12 keyframes by default).
+    `memory_mode` is a class parameter, so each mode gets its own pool of
+    containers and the offload plan is fixed when the pipeline is built.
     """
-    import io
-    import os
-    import sys
-    import tempfile
-    import time
-    import uuid
-
-    import numpy as np
-    import torch
-    from PIL import Image
-
-    os.environ["TORCH_HOME"] = "/cache/torch"
-    os.environ["HF_HOME"] = "/cache/huggingface"
 
-    device = "cuda"
-    torch.enable_grad(False)
+    memory_mode: str = modal.parameter(default="auto")
 
-    # ── Debug directory for this run ────────────────────────────────
-    run_id = uuid.uuid4().hex[:8]
-    debug_dir = f"/cache/debug/gen3c_run_{run_id}"
-    os.makedirs(debug_dir, exist_ok=True)
-    print(f"🔍 DEBUG: gen3c debug dir = {debug_dir}")
+    @modal.enter()
+    def load(self) -> None:
+        import os
+        import sys
+        import time
 
-    # GEN3C repo on the Python path
-    sys.path.insert(0, "/opt/gen3c")
-    os.chdir("/opt/gen3c")
+        import torch
 
-    from cosmos_predict1.utils import misc
+        os.environ["TORCH_HOME"] = "/cache/torch"
+        os.environ["HF_HOME"] = "/cache/huggingface"
 
-    misc.set_random_seed(42)
+        self.device = "cuda"
+        torch.enable_grad(False)
 
-    # ── Download checkpoints (cached in volume) ─────────────────────
-    ckpt_dir = "/cache/gen3c_checkpoints"
-    os.makedirs(ckpt_dir, exist_ok=True)
+        # GEN3C repo on the Python path
+        sys.path.insert(0, "/opt/gen3c")
+        os.chdir("/opt/gen3c")
 
-    gen3c_dir = os.path.join(ckpt_dir, "Gen3C-Cosmos-7B")
-    tokenizer_dir = os.path.join(ckpt_dir, "Cosmos-Tokenize1-CV8x8x8-720p")
+        # ── Download checkpoints (cached in volume) ─────────────────
+        ckpt_dir = GEN3C_CHECKPOINT_DIR
+        os.makedirs(ckpt_dir, exist_ok=True)
 
-    from huggingface_hub import snapshot_download
-
-    if not os.path.exists(os.path.join(gen3c_dir, "model.pt")):
-        print("📥 Downloading Gen3C-Cosmos-7B (~14 GB, first run only)...")
-        snapshot_download(
-            "nvidia/GEN3C-Cosmos-7B",
-            local_dir=gen3c_dir,
-            local_dir_use_symlinks=False,
-        )
-        print("✅ Gen3C-Cosmos-7B downloaded")
-
-    if not os.path.exists(os.path.join(tokenizer_dir, "mean_std.pt")):
-        print("📥 Downloading Cosmos tokenizer (~2 GB, first run only)...")
-        snapshot_download(
-            "nvidia/Cosmos-Tokenize1-CV8x8x8-720p",
-            local_dir=tokenizer_dir,
-            local_dir_use_symlinks=False,
-        )
-        print("✅ Cosmos tokenizer downloaded")
+        gen3c_dir = os.path.join(ckpt_dir, "Gen3C-Cosmos-7B")
+        tokenizer_dir = os.path.join(ckpt_dir, "Cosmos-Tokenize1-CV8x8x8-720p")
 
-    t0 = time.time()
-    print(f"🎬 GEN3C: steps={diffusion_steps}, dist={movement_distance}, out_frames={num_frames}")
-
-    # ── Load MoGe depth model ───────────────────────────────────────
-    from moge.model.v1 import MoGeModel
-
-    moge_model = MoGeModel.from_pretrained("Ruicheng/moge-vitl").to(device)
-
-    # ── Initialise Gen3cPipeline ────────────────────────────────────
-    from cosmos_predict1.diffusion.inference.gen3c_pipeline import Gen3cPipeline
-
-    pipeline = Gen3cPipeline(
-        inference_type="video2world",
-        checkpoint_dir=ckpt_dir,
-        checkpoint_name="Gen3C-Cosmos-7B",
-        enable_prompt_upsampler=False,
-        offload_network=True,
-        offload_tokenizer=True,
-        offload_text_encoder_model=True,
-        offload_prompt_upsampler=True,
-        offload_guardrail_models=True,
-        disable_guardrail=True,
-        disable_prompt_encoder=True,
-        guidance=1,
-        num_steps=diffusion_steps,
-        height=704,
-        width=1280,
-        fps=24,
-        num_video_frames=121,
-        seed=42,
-    )
+        from huggingface_hub import snapshot_download
 
-    t1 = time.time()
-    print(f"🎬 Pipeline loaded in {t1 - t0:.1f}s")
+        if not os.path.exists(os.path.join(gen3c_dir, "model.pt")):
+            print("📥 Downloading Gen3C-Cosmos-7B (~14 GB, first run only)...")
+            snapshot_download(
+                GEN3C_CHECKPOINT,
+                local_dir=gen3c_dir,
+                local_dir_use_symlinks=False,
+            )
+            print("✅ Gen3C-Cosmos-7B downloaded")
+
+        if not os.path.exists(os.path.join(tokenizer_dir, "mean_std.pt")):
+            print("📥 Downloading Cosmos tokenizer (~2 GB, first run only)...")
+            snapshot_download(
+                "nvidia/Cosmos-Tokenize1-CV8x8x8-720p",
+                local_dir=tokenizer_dir,
+                local_dir_use_symlinks=False,
+            )
+            print("✅ Cosmos tokenizer downloaded")
 
-    # ── Save input image to temp file ───────────────────────────────
-    with tempfile.NamedTemporaryFile(suffix=".png", delete=False) as f:
-        f.write(image_bytes)
-        input_path = f.name
+        t0 = time.time()
 
-    # ── Depth prediction (MoGe) ─────────────────────────────────────
-    from cosmos_predict1.diffusion.inference.depth_prediction import predict_moge_depth
-    from cosmos_predict1.utils.io import read_image
+        # ── Offload plan from the free VRAM budget ──────────────────
+        free_bytes, total_bytes = torch.cuda.mem_get_info()
+        offload = self.offload = _gen3c_offload_plan(self.memory_mode, free_bytes / 1024**3)
+        print(
+            f"🧠 GEN3C memory mode={self.memory_mode}: "
+            f"free={free_bytes / 1024**3:.0f}/{total_bytes / 1024**3:.0f} GB → "
+            f"network {'offloaded' if offload['offload_network'] else 'resident'}, "
+            f"tokenizer {'offloaded' if offload['offload_tokenizer'] else 'resident'}"
+        )
 
-    raw_image = read_image(input_path, use_imageio=True)
-    _, moge_image, moge_depth, moge_mask, moge_w2c, moge_intrinsics = (
-        predict_moge_depth(raw_image, 704, 1280, device, moge_model)
-    )
+        # ── Load MoGe depth model ───────────────────────────────────
+        from moge.model.v1 import MoGeModel
+
+        self.moge_model = MoGeModel.from_pretrained(GEN3C_MOGE_MODEL).to(self.device)
+
+        # ── Initialise Gen3cPipeline ────────────────────────────────
+        from cosmos_predict1.diffusion.inference.gen3c_pipeline import Gen3cPipeline
+
+        self.pipeline = Gen3cPipeline(
+            inference_type="video2world",
+            checkpoint_dir=ckpt_dir,
+            checkpoint_name="Gen3C-Cosmos-7B",
+            enable_prompt_upsampler=False,
+            offload_network=offload["offload_network"],
+            offload_tokenizer=offload["offload_tokenizer"],
+            offload_text_encoder_model=True,
+            offload_prompt_upsampler=True,
+            offload_guardrail_models=True,
+            disable_guardrail=True,
+            disable_prompt_encoder=True,
+            guidance=1,
+            num_steps=22,  # overridden per call in generate_views
+            height=704,
+            width=1280,
+            fps=24,
+            num_video_frames=121,
+            seed=GEN3C_SEED,
+        )
 
-    # ── 3D cache ────────────────────────────────────────────────────
-    from cosmos_predict1.diffusion.inference.cache_3d import Cache3D_Buffer
+        print(f"🎬 Pipeline loaded in {time.time() - t0:.1f}s (once per container)")
+
+    @modal.method()
+    def generate_views(
+        self,
+        image_bytes: bytes,
+        diffusion_steps: int = 22,
+        movement_distance: float = 0.3,
+        num_frames: int = 12,
+        transport: str = "jpeg",
+        raw_size: int = ANYSPLAT_INPUT_SIZE,
+        job_id: str | None = None,
+        trajectory: str = "clockwise",
+    ) -> dict:
+        """
+        Generate multi-view frames from a single image using NVIDIA GEN3C-Cosmos-7B.
+
+        Steps:
+          1. Predict depth with MoGe (model already resident), or load it
+             from the MoGe depth cache when this image was seen before.
+          2. Create 3D cache and camera `trajectory` (see GEN3C_TRAJECTORIES).
+          3. Generate 121-frame video with Gen3cPipeline at 704×1280.
+          4. Select up to `num_frames` keyframes by parallax coverage and
+             sharpness (_select_keyframes).
+          5. Save debug frames to /cache/debug/gen3c_run_<uuid>/.
+          6. Store the keyframes and full video in the GEN3C stage cache.
+
+        Returns {"frames", "gpu"}.  transport="jpeg" frames are a list of
+        JPEG byte buffers (at most 12 keyframes by default).  transport="raw"
+        frames are one raw uint8 frame payload (see _pack_raw_frames),
+        resized on the GPU to raw_size×raw_size; the stage cache keeps
+        them at every ANYSPLAT_INPUT_SIZES size, so a cache hit hands
+        AnySplat the same bytes (_keyframe_cache_read).  "gpu" reports
+        this run's memory: {"peak_gb", "memory_mode", "offload_network",
+        "offload_tokenizer"}.
+
+        Progress (MoGe, diffusion step k/N, keyframe sampling) is published
+        under `job_id` — see _JobProgress.
+        """
+        import io
+        import itertools
+        import os
+        import tempfile
+        import time
+        import uuid
+
+        import torch
+        from PIL import Image
+
+        from cosmos_predict1.utils import misc
+
+        device = self.device
+        pipeline = self.pipeline
+        progress = _JobProgress(job_id, "gen3c")
+
+        # ── Debug directory for this run ────────────────────────────
+        run_id = uuid.uuid4().hex[:8]
+        debug_dir = f"/cache/debug/gen3c_run_{run_id}"
+        os.makedirs(debug_dir, exist_ok=True)
+        print(f"🔍 DEBUG: gen3c debug dir = {debug_dir}")
+
+        # Reseed every call so results don't depend on previous requests
+        misc.set_random_seed(GEN3C_SEED)
+        # Gen3cPipeline reads num_steps at generate() time
+        pipeline.num_steps = diffusion_steps
+
+        t0 = time.time()
+        torch.cuda.reset_peak_memory_stats()
+        print(
+            f"🎬 GEN3C: trajectory={trajectory}, steps={diffusion_steps}, "
+            f"dist={movement_distance}, out_frames={num_frames}"
+        )
 
-    chunk = pipeline.model.chunk_size  # typically 121 for the 7B model
+        # ── Save input image to temp file ───────────────────────────
+        with tempfile.NamedTemporaryFile(suffix=".png", delete=False) as f:
+            f.write(image_bytes)
+            input_path = f.name
 
-    cache = Cache3D_Buffer(
-        frame_buffer_max=pipeline.model.frame_buffer_max,
-        generator=torch.Generator(device=device).manual_seed(42),
-        noise_aug_strength=0.0,
-        input_image=moge_image[:, 0].clone(),
-        input_depth=moge_depth[:, 0],
-        input_w2c=moge_w2c[:, 0],
-        input_intrinsics=moge_intrinsics[:, 0],
-        filter_points_threshold=0.05,
-        foreground_masking=True,
-    )
+        try:
+            # ── Depth prediction (MoGe, cached per image) ───────────
+            progress.stage("moge_depth")
+            moge_root = f"/cache/{GEN3C_MOGE_SUBDIR}"
+            moge_key = _moge_cache_key(_sha256(image_bytes))
+            try:
+                gen3c_volume.reload()  # pick up entries written by other containers
+            except Exception as e:
+                print(f"⚠️  gen3c-cache reload failed, using this container's view: {e}")
+            moge = _moge_cache_read(moge_root, moge_key)
+            if moge is not None:
+                print(f"⚡ MoGe cache hit {moge_key[:12]}… — skipping depth prediction")
+                moge = {name: tensor.to(device) for name, tensor in moge.items()}
+            else:
+                from cosmos_predict1.diffusion.inference.depth_prediction import predict_moge_depth
+                from cosmos_predict1.utils.io import read_image
 
-    # ── Camera trajectory (clockwise orbit) ─────────────────────────
-    from cosmos_predict1.diffusion.inference.camera_utils import generate_camera_trajectory
+                raw_image = read_image(input_path, use_imageio=True)
+                moge = dict(
+                    zip(MOGE_OUTPUTS, predict_moge_depth(raw_image, 704, 1280, device, self.moge_model)[1:])
+                )
+                _moge_cache_write(moge_root, moge_key, moge)
+                gen3c_volume.commit()
+                print(f"💾 Cached MoGe outputs {moge_key[:12]}…")
+            moge_image, moge_depth, moge_w2c, moge_intrinsics = (
+                moge[name] for name in ("moge_image", "moge_depth", "moge_w2c", "moge_intrinsics")
+            )
 
-    gen_w2cs, gen_K = generate_camera_trajectory(
-        trajectory_type="clockwise",
-        initial_w2c=moge_w2c[0, 0],
-        initial_intrinsics=moge_intrinsics[0, 0],
-        num_frames=121,
-        movement_distance=movement_distance,
-        camera_rotation="center_facing",
-        center_depth=1.0,
-        device=device,
-    )
+            # ── 3D cache (fresh per request) ────────────────────────
+            from cosmos_predict1.diffusion.inference.cache_3d import Cache3D_Buffer
+
+            chunk = pipeline.model.chunk_size  # typically 121 for the 7B model
+
+            cache = Cache3D_Buffer(
+                frame_buffer_max=pipeline.model.frame_buffer_max,
+                generator=torch.Generator(device=device).manual_seed(GEN3C_SEED),
+                noise_aug_strength=0.0,
+                input_image=moge_image[:, 0].clone(),
+                input_depth=moge_depth[:, 0],
+                input_w2c=moge_w2c[:, 0],
+                input_intrinsics=moge_intrinsics[:, 0],
+                filter_points_threshold=0.05,
+                foreground_masking=True,
+            )
 
-    # ── Render warp images & generate first video chunk ─────────────
-    warp_imgs, warp_masks = cache.render_cache(
-        gen_w2cs[:, :chunk], gen_K[:, :chunk]
-    )
+            # ── Camera trajectory ───────────────────────────────────
+            from cosmos_predict1.diffusion.inference.camera_utils import generate_camera_trajectory
+
+            gen_w2cs, gen_K = generate_camera_trajectory(
+                trajectory_type=trajectory,
+                initial_w2c=moge_w2c[0, 0],
+                initial_intrinsics=moge_intrinsics[0, 0],
+                num_frames=121,
+                movement_distance=movement_distance,
+                camera_rotation="center_facing",
+                center_depth=1.0,
+                device=device,
+            )
 
-    output = pipeline.generate(
-        prompt="",
-        image_path=input_path,
-        negative_prompt="",
-        rendered_warp_images=warp_imgs,
-        rendered_warp_masks=warp_masks,
-    )
+            # ── Render warp images & generate first video chunk ─────
+            warp_imgs, warp_masks = cache.render_cache(
+                gen_w2cs[:, :chunk], gen_K[:, :chunk]
+            )
 
-    if output is None:
-        raise RuntimeError("GEN3C generation failed (possible guardrail rejection)")
+            # Count denoiser calls to report diffusion step k/N
+            progress.stage("diffusion", f"step 1/{diffusion_steps}")
+            denoise = pipeline.model.denoise
+            calls = itertools.count()
 
-    video = output[0]  # (T, H, W, 3) numpy uint8
+            def counting_denoise(*args, **kwargs):
+                step = min(next(calls) // GEN3C_DENOISE_CALLS_PER_STEP, diffusion_steps - 1)
+                progress.update(step, diffusion_steps, f"step {step + 1}/{diffusion_steps}")
+                return denoise(*args, **kwargs)
 
-    t2 = time.time()
-    total_video_frames = video.shape[0]
-    vid_h, vid_w = video.shape[1], video.shape[2]
-    print(f"🎬 GEN3C produced {total_video_frames} frames ({vid_h}×{vid_w}) in {t2 - t0:.1f}s")
-
-    # ── Save ALL video frames for debugging (first & last + every 10th) ──
-    for fi in range(total_video_frames):
-        if fi == 0 or fi == total_video_frames - 1 or fi % 10 == 0:
-            dbg_path = os.path.join(debug_dir, f"video_frame_{fi:03d}.png")
-            Image.fromarray(video[fi]).save(dbg_path)
-    print(f"🔍 DEBUG: saved video frame samples to {debug_dir}/video_frame_*.png")
-
-    # ── Sample evenly-spaced keyframes ──────────────────────────────
-    # sample_keyframes: pick `num_frames` indices equally spaced across
-    # the 121-frame orbit video.  Skip first/last 5% to avoid near-
-    # duplicate start/end frames.
-    margin = max(1, int(total_video_frames * 0.05))  # ~6 frames margin
-    usable_start = margin
-    usable_end = total_video_frames - 1 - margin
-    indices = np.linspace(usable_start, usable_end, num_frames, dtype=int)
-    print(f"🔍 DEBUG: sampling {num_frames} keyframes at indices: {indices.tolist()}")
-    print(f"🔍 DEBUG: usable range [{usable_start}, {usable_end}] from {total_video_frames} total")
-
-    # ── Save sampled keyframes (debug) + encode as JPEG bytes ───────
-    sampled_debug_dir = os.path.join(debug_dir, "anysplat_input")
-    os.makedirs(sampled_debug_dir, exist_ok=True)
-
-    frames: list[bytes] = []
-    for i, idx in enumerate(indices):
-        frame_img = Image.fromarray(video[idx])
-        frame_w, frame_h = frame_img.size
-
-        # Save debug copy
-        dbg_path = os.path.join(sampled_debug_dir, f"frame_{i:03d}_vidx{idx}.png")
-        frame_img.save(dbg_path)
-
-        # Encode as JPEG
-        buf = io.BytesIO()
-        frame_img.save(buf, format="JPEG", quality=95)
-        frames.append(buf.getvalue())
-
-    os.unlink(input_path)
-    total_kb = sum(len(f) for f in frames) / 1024
-    print(f"🎬 Extracted {len(frames)} keyframes ({total_kb:.0f} KB total)")
-    print(f"🔍 DEBUG: keyframe resolution = {vid_h}×{vid_w}")
-    print(f"🔍 DEBUG: saved sampled keyframes to {sampled_debug_dir}/")
-
-    # ── Sanity check: frames must be visually distinct ──────────────
-    # Compare first and last sampled frame pixel-wise
-    first_arr = np.array(Image.open(io.BytesIO(frames[0])).convert("RGB"))
-    last_arr = np.array(Image.open(io.BytesIO(frames[-1])).convert("RGB"))
-    mean_diff = np.abs(first_arr.astype(float) - last_arr.astype(float)).mean()
-    print(f"🔍 DEBUG: mean pixel diff between first/last sampled frame = {mean_diff:.1f} "
-          f"(should be >5.0 for meaningful parallax)")
-    if mean_diff < 2.0:
-        print("⚠️  WARNING: GEN3C frames look almost identical! "
-              "Try increasing movement_distance or diffusion_steps.")
+            pipeline.model.denoise = counting_denoise
+            try:
+                output = pipeline.generate(
+                    prompt="",
+                    image_path=input_path,
+                    negative_prompt="",
+                    rendered_warp_images=warp_imgs,
+                    rendered_warp_masks=warp_masks,
+                )
+            finally:
+                pipeline.model.denoise = denoise
+        finally:
+            os.unlink(input_path)
+
+        if output is None:
+            raise RuntimeError("GEN3C generation failed (possible guardrail rejection)")
+
+        video = output[0]  # (T, H, W, 3) numpy uint8
+
+        t2 = time.time()
+        total_video_frames = video.shape[0]
+        vid_h, vid_w = video.shape[1], video.shape[2]
+        peak_gb = torch.cuda.max_memory_allocated() / 1024**3
+        print(f"🎬 GEN3C produced {total_video_frames} frames ({vid_h}×{vid_w}) in {t2 - t0:.1f}s")
+        print(f"🧠 GEN3C peak GPU memory: {peak_gb:.1f} GB (memory mode={self.memory_mode})")
+
+        progress.stage("keyframe_sampling")
+
+        # ── Save ALL video frames for debugging (first & last + every 10th) ──
+        for fi in range(total_video_frames):
+            if fi == 0 or fi == total_video_frames - 1 or fi % 10 == 0:
+                dbg_path = os.path.join(debug_dir, f"video_frame_{fi:03d}.png")
+                Image.fromarray(video[fi]).save(dbg_path)
+        print(f"🔍 DEBUG: saved video frame samples to {debug_dir}/video_frame_*.png")
+
+        # ── Select keyframes (parallax coverage + sharpness) ────────
+        # Skip first/last 5% to avoid near-duplicate start/end frames.
+        margin = max(1, int(total_video_frames * 0.05))  # ~6 frames margin
+        indices, selection = _select_keyframes(video, num_frames, margin=margin)
+        print(
+            f"🎯 Selected {selection['selected']}/{num_frames} keyframes "
+            f"({selection['saved']} views saved, coverage {selection['coverage']:.0%}, "
+            f"radius {selection['radius']}) at indices: {indices.tolist()}"
+        )
+        progress.update(1, 1, f"{selection['selected']} views ({selection['saved']} saved)", force=True)
+
+        # ── Save sampled keyframes (debug) + encode as JPEG bytes ───
+        sampled_debug_dir = os.path.join(debug_dir, "anysplat_input")
+        os.makedirs(sampled_debug_dir, exist_ok=True)
+
+        frames: list[bytes] = []
+        for i, idx in enumerate(indices):
+            frame_img = Image.fromarray(video[idx])
+
+            # Save debug copy
+            dbg_path = os.path.join(sampled_debug_dir, f"frame_{i:03d}_vidx{idx}.png")
+            frame_img.save(dbg_path)
+
+            # Encode as JPEG
+            buf = io.BytesIO()
+            frame_img.save(buf, format="JPEG", quality=95)
+            frames.append(buf.getvalue())
+
+        total_kb = sum(len(f) for f in frames) / 1024
+        print(f"🎬 Extracted {len(frames)} keyframes ({total_kb:.0f} KB total)")
+        print(f"🔍 DEBUG: keyframe resolution = {vid_h}×{vid_w}")
+        print(f"🔍 DEBUG: saved sampled keyframes to {sampled_debug_dir}/")
+
+        # ── Sanity check: frames must be visually distinct ──────────
+        # Largest RMS difference between two keyframes, from the selection scores
+        print(f"🔍 DEBUG: keyframe parallax spread = {selection['spread']:.1f} "
+              f"(should be >5.0 for meaningful parallax)")
+        if selection["spread"] < 2.0:
+            print("⚠️  WARNING: GEN3C frames look almost identical! "
+                  "Try increasing movement_distance or diffusion_steps.")
+
+        # Raw keyframes at every AnySplat input size (about 7 MB at 448 for
+        # 12 frames, vs 32 MB at 704×1280): stored in the stage cache so a
+        # hit moves no more data than this run; raw_size is returned below.
+        import torch.nn.functional as F
+
+        keyframes = torch.from_numpy(video[indices]).to(device).permute(0, 3, 1, 2).float()
+        raw_frames = {}
+        for size in sorted({*ANYSPLAT_INPUT_SIZES, raw_size}):
+            resized = F.interpolate(
+                keyframes, size=(size, size), mode="bicubic", antialias=True, align_corners=False
+            )
+            resized = resized.round().clamp(0, 255).to(torch.uint8).permute(0, 2, 3, 1).cpu()
+            raw_frames[size] = _pack_raw_frames(resized.numpy())
+        del keyframes
+
+        # ── Persist to the GEN3C stage cache ────────────────────────
+        cache_key = _gen3c_cache_key(_sha256(image_bytes), diffusion_steps, movement_distance, trajectory)
+        video_path: str | None = os.path.join(tempfile.gettempdir(), f"gen3c_{run_id}.mp4")
+        try:
+            import imageio
+
+            imageio.mimwrite(video_path, list(video), fps=24, quality=8)
+        except Exception as e:
+            print(f"⚠️  Could not encode orbit video for the stage cache: {e}")
+            video_path = None
+        _keyframe_cache_write(
+            f"/cache/{GEN3C_CACHE_SUBDIR}",
+            cache_key,
+            num_frames,
+            frames,
+            meta={
+                "trajectory": trajectory,
+                "diffusion_steps": diffusion_steps,
+                "movement_distance": movement_distance,
+                "num_video_frames": total_video_frames,
+                "resolution": [vid_h, vid_w],
+                "keyframe_indices": indices.tolist(),
+                "keyframe_selection": selection,
+                "memory_mode": self.memory_mode,
+                "peak_gpu_gb": round(peak_gb, 2),
+                "generation_seconds": round(t2 - t0, 1),
+            },
+            raw_frames=raw_frames,
+            video_path=video_path,
+        )
+        gen3c_volume.commit()
+        print(f"💾 Cached GEN3C keyframes {cache_key[:12]}…")
 
-    return frames
+        gpu = {"peak_gb": round(peak_gb, 2), "memory_mode": self.memory_mode, **self.offload}
+        if transport != "raw":
+            return {"frames": frames, "gpu": gpu}
+        raw = raw_frames[raw_size]
+        print(f"🎬 Raw transport: {raw['shape']} uint8, {len(raw['data']) / 1024**2:.1f} MB")
+        return {"frames": raw, "gpu": gpu}
 
 
 # ═════════════════════════════════════════════════════════════════════
 # FUNCTION: gen3c_pipeline  (orchestrator: GEN3C → AnySplat)
 #   Runs on a lightweight container — no GPU needed.
-#   Calls gen3c_generate_views.remote() then process_image.remote().
+#   Spawns one Gen3cService.generate_views call per camera trajectory
+#   (unless the GEN3C stage cache already holds its keyframes), gathers
+#   them, then calls AnySplatService.process_image.remote() on the merge.
 # ═════════════════════════════════════════════════════════════════════
 @app.function(
     image=modal.Image.debian_slim(python_version="3.10"),
     timeout=1200,  # 20 min: GEN3C ~5 min + AnySplat ~2 min + headroom
+    volumes={"/cache": volume, "/gen3c_cache": gen3c_volume},
 )
 def gen3c_pipeline(
     image_bytes_list: list[bytes],
@@ -656,99 +3113,609 @@ def gen3c_pipeline(
     movement_distance: float = 0.3,
     prompt: str = "",
     elevation: int = 20,
-) -> bytes:
+    num_frames: int = 12,
+    cache_key: str | None = None,
+    refresh_gen3c: bool = False,
+    memory_mode: str = "auto",
+    frame_transport: str = "raw",
+    output_format: str = "ply",
+    sh_codebook_size: int = 0,
+    prune: bool = True,
+    lod_budgets: list[int] | None = None,
+    upload_ids: list[str] | None = None,
+    job_id: str | None = None,
+    trajectories: list[str] | None = None,
+    input_size: int = ANYSPLAT_INPUT_SIZE,
+) -> dict:
     """
     Orchestrate: GEN3C multi-view video → AnySplat 3DGS reconstruction.
 
-    1. Send the first image to GEN3C to generate 121-frame orbit video.
-    2. GEN3C samples 12 evenly-spaced keyframes from that video.
-    3. Feed those 12 frames into AnySplat for dense 3DGS reconstruction.
-    4. Return the PLY bytes.
+    1. Send the first image to GEN3C to generate one 121-frame video per
+       camera trajectory (default: a single clockwise orbit), all in
+       parallel on separate containers.  Trajectories whose keyframes are
+       in the GEN3C stage cache are skipped, unless `refresh_gen3c` forces
+       regeneration.  `memory_mode` selects the Gen3cService container
+       pool (see GEN3C_MEMORY_MODES).
+    2. GEN3C selects up to `num_frames` keyframes from each video;
+       they are merged in trajectory order.
+    3. Feed those frames into AnySplat for dense 3DGS reconstruction.
+       frame_transport="raw" hands them over as one uint8 array already
+       resized to `input_size`² on the GEN3C GPU; "jpeg" keeps the old q95
+       JPEGs.
+    4. Return AnySplat's result dict in `output_format` (and store it in
+       the result cache when `cache_key` is given).  The export options
+       (`output_format` … `lod_budgets`) and `input_size` are passed to
+       process_image as is.  When GEN3C ran, result["gen3c_gpu"] reports
+       its peak GPU memory: {"peak_gb" (largest over trajectories),
+       "trajectories": {name: Gen3cService.generate_views "gpu"}}.
+
+    `upload_ids` replaces `image_bytes_list` for images in the upload store.
+    Stage progress from every step is published under `job_id` (default:
+    this call's id, which is the router's call_id) — see _JobProgress; with
+    several trajectories to generate, the slowest one's GEN3C stage is
+    reported along with how many have finished (_JobProgress.combine).
 
     Quality defaults: steps=22, distance=0.3, 12 sampled frames.
     """
     import time
 
     t0 = time.time()
+    job_id = job_id or modal.current_function_call_id()
+    trajectories = list(trajectories or GEN3C_DEFAULT_TRAJECTORIES)
+    progress = _JobProgress(job_id, "gen3c")
+    progress.stage("startup", "waiting for a GEN3C GPU")
+    if upload_ids:
+        volume.reload()
+        image_bytes_list = _read_uploads(UPLOAD_DIR, upload_ids[:1])  # GEN3C only uses the first image
     print(
         f"🎬 GEN3C Pipeline started: "
         f"steps={diffusion_steps}, dist={movement_distance}, "
-        f"images={len(image_bytes_list)}, "
-        f"will sample 12 keyframes from 121-frame orbit video"
+        f"images={len(image_bytes_list)}, trajectories={trajectories}, "
+        f"will select up to {num_frames} keyframes from each 121-frame video"
     )
 
     # Step 1 — GEN3C: generate multi-view frames (uses first image)
-    frames = gen3c_generate_views.remote(
-        image_bytes_list[0],
-        diffusion_steps=diffusion_steps,
-        movement_distance=movement_distance,
-        num_frames=12,   # ← 12 keyframes for rich multi-view input
-    )
+    image_digest = _sha256(image_bytes_list[0])
+    parts: dict[str, list[bytes] | dict] = {}
+    if not refresh_gen3c:
+        gen3c_volume.reload()
+        for trajectory in trajectories:
+            gen3c_key = _gen3c_cache_key(image_digest, diffusion_steps, movement_distance, trajectory)
+            cached = _keyframe_cache_read(
+                f"/gen3c_cache/{GEN3C_CACHE_SUBDIR}", gen3c_key, num_frames, frame_transport, raw_size=input_size
+            )
+            if cached is not None:
+                parts[trajectory] = cached
+                print(f"⚡ GEN3C stage cache hit {gen3c_key[:12]}… ({trajectory}) — skipping generation")
+        if parts:
+            gen3c_volume.commit()  # persist the LRU recency bumps
+    missing = [trajectory for trajectory in trajectories if trajectory not in parts]
+    gpu: dict[str, dict] = {}  # per generated trajectory (cache hits used no GEN3C GPU)
+    if not missing:
+        progress.stage("keyframe_sampling", "GEN3C stage cache hit")
+    else:
+        # One container per trajectory, so wall-clock time stays close to a
+        # single video.  Fresh raw keyframes come resized to input_size like
+        # cached ones, so the two merge.  A lone trajectory reports the GEN3C stages under job_id; a fan-out
+        # reports each under its own part id and they are combined here.
+        service = Gen3cService(memory_mode=memory_mode)
+        fan_out = len(missing) > 1
+        calls = {
+            trajectory: service.generate_views.spawn(
+                image_bytes_list[0],
+                diffusion_steps=diffusion_steps,
+                movement_distance=movement_distance,
+                num_frames=num_frames,  # budget of 12 keyframes by default for rich multi-view input
+                transport=frame_transport,
+                raw_size=input_size,
+                job_id=progress.part(trajectory) if fan_out else job_id,
+                trajectory=trajectory,
+            )
+            for trajectory in missing
+        }
+        while calls:
+            for trajectory, call in list(calls.items()):
+                try:
+                    generated = call.get(timeout=0)
+                except TimeoutError:
+                    continue
+                del calls[trajectory]
+                parts[trajectory] = generated["frames"]
+                gpu[trajectory] = generated["gpu"]
+            if calls:
+                if fan_out:
+                    progress.combine(missing, done=len(missing) - len(calls))
+                time.sleep(JOB_PROGRESS_MIN_INTERVAL)
+    frames = _merge_keyframes([parts[trajectory] for trajectory in trajectories])
     t1 = time.time()
-    print(f"🎬 GEN3C produced {len(frames)} keyframes in {t1 - t0:.1f}s")
-    print(f"🔍 DEBUG: frame sizes (bytes): {[len(f) for f in frames]}")
+    if isinstance(frames, dict):
+        num_views = frames["shape"][0]
+        print(f"🎬 GEN3C produced {num_views} raw keyframes {frames['shape']} in {t1 - t0:.1f}s")
+    else:
+        num_views = len(frames)
+        print(f"🎬 GEN3C produced {num_views} keyframes in {t1 - t0:.1f}s")
+        print(f"🔍 DEBUG: frame sizes (bytes): {[len(f) for f in frames]}")
+
+    if num_views > ANYSPLAT_CHUNK_VIEWS:
+        print(
+            f"🧩 {num_views} keyframes from {len(trajectories)} trajectories exceed "
+            f"ANYSPLAT_CHUNK_VIEWS={ANYSPLAT_CHUNK_VIEWS}: AnySplat reconstructs them in windows"
+        )
 
     # Verify we got enough frames
-    assert len(frames) >= 6, (
-        f"GEN3C returned only {len(frames)} frames, need ≥6 for quality. "
-        f"Check gen3c_generate_views."
+    assert num_views >= 6, (
+        f"GEN3C returned only {num_views} frames, need ≥6 for quality. "
+        f"Check Gen3cService.generate_views."
     )
 
     # Step 2 — AnySplat: reconstruct 3DGS from those frames
     #   Filenames start with "gen3c_" so process_image can detect the source.
-    frame_names = [f"gen3c_{i:03d}.jpg" for i in range(len(frames))]
-    print(f"🔍 DEBUG: sending {len(frames)} frames to AnySplat: {frame_names}")
-    ply_bytes = process_image.remote(frames, frame_names, prompt, elevation)
+    frame_names = [f"gen3c_{i:03d}.jpg" for i in range(num_views)]
+    print(f"🔍 DEBUG: sending {num_views} frames to AnySplat ({frame_transport}): {frame_names}")
+    export_options = dict(
+        output_format=output_format,
+        sh_codebook_size=sh_codebook_size,
+        prune=prune,
+        lod_budgets=lod_budgets,
+        input_size=input_size,
+    )
+    if isinstance(frames, dict):
+        result = AnySplatService(lane="full").process_image.remote(
+            [], frame_names, prompt, elevation, raw_frames=frames, job_id=job_id, **export_options
+        )
+    else:
+        result = AnySplatService(lane="full").process_image.remote(
+            frames, frame_names, prompt, elevation, job_id=job_id, **export_options
+        )
     t2 = time.time()
-    ply_size_mb = len(ply_bytes) / (1024 * 1024)
+    size_mb = result["artifact"]["size"] / (1024 * 1024)
     print(
-        f"🔮 AnySplat processed {len(frames)} GEN3C views in {t2 - t1:.1f}s. "
-        f"PLY size: {ply_size_mb:.1f} MB. "
+        f"🔮 AnySplat processed {num_views} GEN3C views in {t2 - t1:.1f}s. "
+        f"{output_format} size: {size_mb:.1f} MB. "
         f"Total pipeline: {t2 - t0:.1f}s"
     )
+    if gpu:
+        result["gen3c_gpu"] = {"peak_gb": max(g["peak_gb"] for g in gpu.values()), "trajectories": gpu}
+        print(f"🧠 GEN3C peak GPU memory: {result['gen3c_gpu']['peak_gb']:.1f} GB")
 
-    return ply_bytes
+    if cache_key:
+        _cache_result(cache_key, result)
+        volume.commit()
+        print(f"💾 Cached result {cache_key[:12]}…")
+    return result
 
 
 # ═════════════════════════════════════════════════════════════════════
-# ROUTER — single FastAPI endpoint (process / status / health)
+# ROUTER — CPU-only control plane (process / status / health, uploads,
+#   artifacts) on web_image: no torch, no CUDA, no GPU.  Only the
+#   inference functions it dispatches to hold GPUs, so status polls and
+#   downloads never wake an A100.
+#
+#   POST /                  JSON ops (see _route_request)
+#   POST /uploads           binary image / video uploads (see _store_upload)
+#   GET  /artifacts/<name>  finished splat files (see _serve_artifact)
+#
+#   All Modal calls go through a backend object (_ModalBackend when
+#   deployed), so the app can be load-tested locally with a fake one —
+#   see test_router.py.
 # ═════════════════════════════════════════════════════════════════════
-@app.function(image=anysplat_image, gpu="A100", timeout=900, volumes={"/cache": volume})
-@modal.fastapi_endpoint(method="POST")
-async def anysplat_router(request: dict) -> dict:
+def _result_response(result: dict, artifact_url: str) -> dict:
+    """JSON fields for a process_image result: artifact URL + metadata, never the bytes."""
+
+    def describe(artifact: dict) -> dict:
+        return {"url": f"{artifact_url}/{artifact['name']}", "size": artifact["size"], "sha256": artifact["sha256"]}
+
+    response = {"format": result["format"], "num_gaussians": result["num_gaussians"], **describe(result["artifact"])}
+    for key in ("input_size", "inference_seconds", "gen3c_gpu", "windows"):
+        if key in result:
+            response[key] = result[key]
+    if "sh_codebook" in result:
+        response["sh_codebook"] = result["sh_codebook"]
+    if "input_views" in result:
+        response["input_views"] = result["input_views"]
+    if "video" in result:
+        response["video"] = result["video"]
+    if "lods" in result:
+        response["lods"] = [{"budget": lod["budget"], **describe(lod["artifact"])} for lod in result["lods"]]
+    return response
+
+
+# ── In-flight coalescing ─────────────────────────────────────────────
+#   A process request whose fingerprint (its result cache key) matches a
+#   job that is still running attaches to that call instead of spawning a
+#   second one.  Records live in a modal.Dict shared by all router
+#   containers: "fingerprint:<key>" → {"call_id", "started"} plus the
+#   reverse "call:<call_id>" → key, dropped once the call settles.
+job_inflight = modal.Dict.from_name("anysplat-inflight", create_if_missing=True)
+
+INFLIGHT_MAX_AGE = 1500  # seconds; longer than any call (gen3c_pipeline timeout=1200)
+INFLIGHT_PENDING_MAX_AGE = 30  # a claim whose spawn never registered is abandoned
+INFLIGHT_CLAIM_ATTEMPTS = 25
+INFLIGHT_CLAIM_RETRY = 0.2  # seconds between attempts while another router spawns
+INFLIGHT_BUSY = "busy"  # _claim_inflight: still contended after every attempt
+
+
+async def _claim_inflight(backend, fingerprint: str, reuse_finished: bool = True) -> str | None:
+    """
+    Claim `fingerprint` for a new call, or return the id of the call that
+    already serves it (still running, or — unless `reuse_finished` is
+    false — finished successfully).  Returns INFLIGHT_BUSY if another
+    router still holds a pending claim after INFLIGHT_CLAIM_ATTEMPTS.
+
+    After a successful claim (None) the caller spawns and then calls
+    _register_inflight, or _release_inflight if the spawn fails.
+    """
+    import asyncio
+    import time
+
+    key = f"fingerprint:{fingerprint}"
+    for _ in range(INFLIGHT_CLAIM_ATTEMPTS):
+        if await backend.inflight_put(key, {"call_id": None, "started": time.time()}, skip_if_exists=True):
+            return None
+        record = await backend.inflight_get(key)
+        if record is None:
+            continue  # settled in between
+        age = time.time() - record["started"]
+        if record["call_id"] is None:
+            if age > INFLIGHT_PENDING_MAX_AGE:
+                await backend.inflight_pop(key)
+            else:
+                await asyncio.sleep(INFLIGHT_CLAIM_RETRY)  # another router is spawning it right now
+            continue
+        if age > INFLIGHT_MAX_AGE:
+            await _settle_inflight(backend, record["call_id"])
+            continue
+        try:
+            await backend.poll(record["call_id"], timeout=0)
+        except TimeoutError:
+            return record["call_id"]  # still running
+        except Exception:
+            await _settle_inflight(backend, record["call_id"])  # failed: retry with a new call
+            continue
+        if not reuse_finished:
+            await _settle_inflight(backend, record["call_id"])  # caller wants a fresh result
+            continue
+        return record["call_id"]
+    return INFLIGHT_BUSY
+
+
+async def _register_inflight(backend, fingerprint: str, call_id: str) -> None:
+    import time
+
+    await backend.inflight_put(f"call:{call_id}", fingerprint)
+    await backend.inflight_put(f"fingerprint:{fingerprint}", {"call_id": call_id, "started": time.time()})
+
+
+async def _release_inflight(backend, fingerprint: str) -> None:
+    await backend.inflight_pop(f"fingerprint:{fingerprint}")
+
+
+async def _settle_inflight(backend, call_id: str) -> None:
+    """Drop the records of a call that has completed or failed."""
+    fingerprint = await backend.inflight_pop(f"call:{call_id}")
+    if fingerprint is None:
+        return
+    record = await backend.inflight_get(f"fingerprint:{fingerprint}")
+    if record is not None and record["call_id"] == call_id:
+        await backend.inflight_pop(f"fingerprint:{fingerprint}")
+
+
+# ── Admission control ────────────────────────────────────────────────
+#   Every process request runs in a lane: "preview" (AnySplat only) or
+#   "full" (GEN3C → AnySplat).  Lanes have their own GPU pools and queue
+#   limits; under a burst the full lane saturates and is rejected (429)
+#   long before previews are, so fast previews keep flowing.
+#   A lane is measured on its GPU function: gen3c_pipeline is an uncapped
+#   CPU orchestrator that never builds a backlog, so the full lane counts
+#   Gen3cService.generate_views inputs (one per trajectory) instead.
+ADMISSION_LANES = {
+    "preview": {"function": "process_image", "max_queued": 32, "mode": "anysplat"},
+    "full": {"function": "generate_views", "max_queued": 6, "mode": "gen3c"},
+}
+ADMISSION_RETRY_AFTER = (10, 600)  # clamp for the Retry-After hint, seconds
+
+
+async def _lane_state(backend, lane: str) -> dict:
+    """
+    Queue depth, running jobs and estimated wait of one admission lane.
+
+    The wait assumes queued jobs drain in waves of the currently running
+    count, each taking the lane's typical duration (JOB_STAGE_SECONDS).
+    If the stats are unavailable the lane is reported open.
+    """
+    import math
+
+    config = ADMISSION_LANES[lane]
+    try:
+        stats = await backend.queue_stats(config["function"])
+    except Exception as e:
+        print(f"⚠️  Queue stats unavailable for lane {lane}: {e}")
+        return {"lane": lane, "queued": None, "running": None, "estimated_wait_seconds": None, "saturated": False}
+    job_seconds = sum(seconds for _, seconds in JOB_STAGE_SECONDS[config["mode"]])
+    waves = math.ceil(stats["queued"] / max(stats["running"], 1))
+    return {
+        "lane": lane,
+        **stats,
+        "max_queued": config["max_queued"],
+        "estimated_wait_seconds": waves * job_seconds,
+        "saturated": stats["queued"] >= config["max_queued"],
+    }
+
+
+async def _dispatch(
+    backend, lane: str, fingerprint: str, name: str, args: tuple, kwargs: dict, reuse_finished: bool = True
+) -> dict:
+    """
+    Attach to the in-flight call for `fingerprint`, or admit and spawn a new one.
+
+    Returns {"call_id", "coalesced", "queue"}, or a rejection ({"status":
+    "rejected", "retry_after", "queue", "error"}) when `lane` is saturated
+    or another router's claim on `fingerprint` outlasts the claim attempts.
+    `reuse_finished` (false for use_cache=false) only attaches to running calls.
+    """
+    call_id = await _claim_inflight(backend, fingerprint, reuse_finished)
+    if call_id == INFLIGHT_BUSY:
+        retry_after = ADMISSION_RETRY_AFTER[0]
+        print(f"🚦 Busy: another router is still spawning {fingerprint[:12]}…")
+        return {
+            "error": f"An identical job is being started; retry in {retry_after}s",
+            "status": "rejected",
+            "retry_after": retry_after,
+            "queue": {},
+        }
+    if call_id is not None:
+        print(f"🔗 Attached to in-flight call {call_id} for {fingerprint[:12]}…")
+        return {"call_id": call_id, "coalesced": True, "queue": {}}
+
+    # Admission control: only new calls take a place in the lane's queue
+    queue = await _lane_state(backend, lane)
+    if queue["saturated"]:
+        await _release_inflight(backend, fingerprint)
+        low, high = ADMISSION_RETRY_AFTER
+        retry_after = min(max(queue["estimated_wait_seconds"], low), high)
+        print(f"🚦 Rejected {lane} request: {queue['queued']} queued, {queue['running']} running")
+        return {
+            "error": f"The {lane} queue is full ({queue['queued']} jobs waiting); retry in {retry_after}s",
+            "status": "rejected",
+            "retry_after": retry_after,
+            "queue": queue,
+        }
+    try:
+        call_id = await backend.spawn(name, *args, **kwargs)
+    except Exception:
+        await _release_inflight(backend, fingerprint)
+        raise
+    await _register_inflight(backend, fingerprint, call_id)
+    return {"call_id": call_id, "coalesced": False, "queue": queue}
+
+
+# ── Preview + refine ─────────────────────────────────────────────────
+#   A preview_refine job is its GEN3C call; the AnySplat-only preview
+#   runs next to it in the preview lane, linked by "preview:<call_id>" in
+#   job_inflight → {"call_id"} while it runs, {"result", "updated"} once
+#   it is ready.  The status op serves the preview until the refined
+#   result replaces it.
+async def _poll_preview(backend, call_id: str) -> dict | None:
+    """The preview linked to job `call_id` once it is ready ({"result", "updated"}), else None."""
+    import time
+
+    key = f"preview:{call_id}"
+    link = await backend.inflight_get(key)
+    if link is None or "result" in link:
+        return link
+    try:
+        result = await backend.poll(link["call_id"], timeout=0)
+    except TimeoutError:
+        return None
+    except Exception as e:
+        print(f"⚠️  Preview {link['call_id']} for {call_id} failed: {e}")
+        await _settle_inflight(backend, link["call_id"])
+        await backend.inflight_pop(key)
+        return None
+    await _settle_inflight(backend, link["call_id"])
+    link = {"result": result, "updated": time.time()}
+    await backend.inflight_put(key, link)
+    return link
+
+
+class _ModalBackend:
+    """Router backend: the deployed inference functions and the anysplat-cache volume."""
+
+    def _function(self, name: str):
+        return {"process_image": AnySplatService(lane="preview").process_image, "gen3c_pipeline": gen3c_pipeline}[name]
+
+    async def spawn(self, name: str, *args, **kwargs) -> str:
+        """Start `name` in the background and return its call id."""
+        call = await self._function(name).spawn.aio(*args, **kwargs)
+        return call.object_id
+
+    async def poll(self, call_id: str, timeout: float | None = 0) -> dict:
+        """A finished call's result; raises TimeoutError while it is still running."""
+        from modal.functions import FunctionCall
+
+        return await FunctionCall.from_id(call_id).get.aio(timeout=timeout)
+
+    async def progress(self, call_id: str) -> dict | None:
+        """The latest record published by _JobProgress for a job, if any."""
+        return await job_progress.get.aio(call_id)
+
+    async def queue_stats(self, name: str) -> dict:
+        """Live {"queued", "running", "containers"} counts of a lane's GPU function, summed over its pools."""
+        import asyncio
+
+        pools = {
+            "process_image": [AnySplatService(lane="preview").process_image],
+            "generate_views": [Gen3cService(memory_mode=mode).generate_views for mode in GEN3C_MEMORY_MODES],
+        }[name]
+        stats = await asyncio.gather(*(pool.get_current_stats.aio() for pool in pools))
+        return {
+            "queued": sum(s.backlog for s in stats),
+            "running": sum(s.num_running_inputs for s in stats),
+            "containers": sum(s.num_total_runners for s in stats),
+        }
+
+    async def inflight_get(self, key: str):
+        return await job_inflight.get.aio(key)
+
+    async def inflight_put(self, key: str, value, skip_if_exists: bool = False) -> bool:
+        return await job_inflight.put.aio(key, value, skip_if_exists=skip_if_exists)
+
+    async def inflight_pop(self, key: str):
+        return await job_inflight.pop.aio(key, None)
+
+    def artifact_url(self) -> str:
+        return f"{anysplat_router.get_web_url()}/artifacts"
+
+    async def reload(self) -> None:
+        await volume.reload.aio()
+
+    async def commit(self) -> None:
+        await volume.commit.aio()
+
+
+async def _route_request(request: dict, backend) -> dict:
     """
-    Single web endpoint that multiplexes:
+    Handle one JSON request to the router:
     - op = \"process\" (default): start AnySplat job (sync or async)
-    - op = \"status\": get status for an async job
+    - op = \"status\": get status for an async job (when completed: the
+      artifact "url" under /artifacts plus its metadata; while running:
+      "progress" = {stage, stage_pct, pct, eta_seconds, detail, updated})
     - op = \"health\": simple health check
 
+    Long-poll (when op=status):
+    - wait = seconds (≤ JOB_STATUS_MAX_WAIT) to hold the request until the
+      job settles or its progress changes
+    - since = the "updated" of the last progress seen; without it, the
+      request waits for the next change after it arrives
+
     GEN3C toggle (when op=process):
     - gen3c_enabled = true  → runs gen3c_pipeline (GEN3C → AnySplat)
-    - gen3c_enabled = false → runs process_image directly (AnySplat only)
+    - gen3c_enabled = false → runs AnySplatService.process_image directly (AnySplat only)
+
+    Result cache (when op=process):
+    - identical images + output-affecting parameters are served from the
+      result cache on the volume without spawning a GPU function
+    - use_cache = false → bypass the lookup (the result is still stored)
+    - gen3c_refresh = true → regenerate GEN3C keyframes instead of using
+      the GEN3C stage cache (implies use_cache = false)
+    - gen3c_memory_mode = "auto" | "resident" | "offload" (default "auto");
+      results report the run's peak GPU memory as "gen3c_gpu" (see
+      gen3c_pipeline)
+    - gen3c_frame_transport = "raw" | "jpeg" (default "raw") — how GEN3C
+      keyframes are handed to AnySplat
+    - gen3c_trajectories = list of GEN3C_TRAJECTORIES (default clockwise
+      only) — rendered in parallel, one GPU each, keyframes merged;
+      e.g. ["clockwise", "counterclockwise", "up"] for all-round coverage
+
+    Preview + refine (when op=process with gen3c_enabled and async):
+    - preview_refine = true → also run AnySplat alone on the same inputs
+      in the preview lane; op=status returns its artifact as "preview"
+      while the GEN3C job runs, then the refined result as usual
+
+    In-flight coalescing (when op=process):
+    - a request identical to a job that is still running (same result cache
+      key) attaches to it: the same call_id comes back with "coalesced": true
+      (with use_cache = false, only to a job that has not finished yet)
+    - if another router is still spawning that job after the claim attempts,
+      the request is rejected (status "rejected", HTTP 429) — retry
+
+    Admission control (when op=process):
+    - GEN3C jobs run in the "full" lane, AnySplat-only jobs in "preview"
+      (see ADMISSION_LANES); new calls get the lane's "queue" state
+      {queued, running, estimated_wait_seconds, ...} in the response
+    - a saturated lane answers status "rejected" with "retry_after" (HTTP
+      429 + Retry-After from the router app); op=health lists every lane
+
+    Output format (when op=process):
+    - output_format = "ply" (default, DC-only SH) | "compact" (quantized,
+      SH up to degree 2 — see _encode_compact_splat) | "progressive"
+      (compact chunks, coarse-to-fine — see _encode_progressive_splat).
+      Responses carry the artifact "url", "size", "sha256" and "format";
+      the file itself is downloaded from /artifacts.
+    - sh_codebook_size = 0 (default, off) | 1-1024 (SH_CODEBOOK_MAX_SIZE) — compact only:
+      vector-quantize the SH rest into a codebook (see _build_sh_codebook)
+    - prune = true (default) — drop near-transparent / sub-pixel Gaussians
+    - lod_budgets = [100000, 300000] — also return voxel-merged levels of
+      at most that many Gaussians as "lods": [{budget, url, size, sha256}, ...]
+
+    Input resolution (when op=process):
+    - input_size = 224 | 336 | 448 (default) — AnySplat view size (see
+      ANYSPLAT_INPUT_SIZES); 224 is the cheap draft tier.  Responses
+      report "input_size" and "inference_seconds" with "num_gaussians"
+
+    Inputs (when op=process), one of:
+    - uploads = [{upload_id, filename}, ...] — images already streamed to
+      /uploads; only the ids travel to the GPU functions
+    - video = {upload_id, filename} — a walk-around video streamed to
+      /uploads; its keyframes become the images (see _video_keyframes).
+      video_max_frames = keyframe budget (default VIDEO_MAX_KEYFRAMES).
+      AnySplat only: not combinable with gen3c_enabled
+    - images = [{image: base64, filename}, ...] or image + filename (legacy)
     """
+    import asyncio
     import base64
-    from modal.functions import FunctionCall
+    import time
 
     try:
         op = request.get("op") or "process"
 
         if op == "health":
-            return {"status": "ok", "service": "anysplat", "endpoint": "router"}
+            lanes = await asyncio.gather(*(_lane_state(backend, lane) for lane in ADMISSION_LANES))
+            return {
+                "status": "ok",
+                "service": "anysplat",
+                "endpoint": "router",
+                "lanes": {state["lane"]: state for state in lanes},
+            }
 
         if op == "status":
             call_id = request.get("call_id")
             if not call_id:
                 return {"error": "call_id required"}
 
-            call = FunctionCall.from_id(call_id)
-            try:
-                ply_bytes = call.get(timeout=0)
-                ply_b64 = base64.b64encode(ply_bytes).decode("utf-8")
-                return {"status": "completed", "ply": ply_b64}
-            except TimeoutError:
-                return {"status": "processing"}
-            except Exception as e:
-                return {"status": "failed", "error": str(e)}
+            wait = min(max(float(request.get("wait", 0)), 0.0), JOB_STATUS_MAX_WAIT)
+            since = request.get("since")
+            deadline = time.monotonic() + wait
+            timeout = 0.0
+            while True:
+                try:
+                    result = await backend.poll(call_id, timeout=timeout)
+                    await _settle_inflight(backend, call_id)
+                    await backend.inflight_pop(f"preview:{call_id}")  # replaced by the refined result
+                    return {
+                        "status": "completed",
+                        "progress": {"stage": "completed", "pct": 100.0, "eta_seconds": 0},
+                        **_result_response(result, backend.artifact_url()),
+                    }
+                except TimeoutError:
+                    pass
+                except Exception as e:
+                    await _settle_inflight(backend, call_id)
+                    failed = {"status": "failed", "error": str(e)}
+                    preview = await _poll_preview(backend, call_id)
+                    if preview is not None:
+                        failed["preview"] = _result_response(preview["result"], backend.artifact_url())
+                    return failed
+                progress = await backend.progress(call_id) or {
+                    "stage": "queued",
+                    "pct": 0.0,
+                    "eta_seconds": None,
+                    "updated": 0.0,
+                }
+                preview = await _poll_preview(backend, call_id)
+                if preview is not None:
+                    # A newly arrived preview counts as a change for the long-poll
+                    progress = {**progress, "updated": max(progress["updated"], preview["updated"])}
+                if since is None:
+                    since = progress["updated"]
+                remaining = deadline - time.monotonic()
+                if progress["updated"] > since or remaining <= 0:
+                    response = {"status": "processing", "progress": progress}
+                    if preview is not None:
+                        response["preview"] = _result_response(preview["result"], backend.artifact_url())
+                    return response
+                # The next poll doubles as the sleep: it returns early if the job settles
+                timeout = min(JOB_STATUS_POLL_INTERVAL, remaining)
 
         # ── op = "process" ──────────────────────────────────────────
         is_async = request.get("async", False)
@@ -759,12 +3726,70 @@ async def anysplat_router(request: dict) -> dict:
         gen3c_enabled = bool(request.get("gen3c_enabled", False))
         gen3c_diffusion_steps = int(request.get("gen3c_diffusion_steps", 22))
         gen3c_movement_distance = float(request.get("gen3c_movement_distance", 0.3))
+        gen3c_num_frames = int(request.get("gen3c_num_frames", 12))
+        gen3c_refresh = bool(request.get("gen3c_refresh", False))
+        use_cache = bool(request.get("use_cache", True)) and not gen3c_refresh
+        gen3c_memory_mode = str(request.get("gen3c_memory_mode", "auto"))
+        if gen3c_memory_mode not in GEN3C_MEMORY_MODES:
+            return {"error": f"gen3c_memory_mode must be one of {list(GEN3C_MEMORY_MODES)}"}
+        gen3c_frame_transport = str(request.get("gen3c_frame_transport", "raw"))
+        if gen3c_frame_transport not in FRAME_TRANSPORTS:
+            return {"error": f"gen3c_frame_transport must be one of {list(FRAME_TRANSPORTS)}"}
+        gen3c_trajectories = list(request.get("gen3c_trajectories") or GEN3C_DEFAULT_TRAJECTORIES)
+        unknown = set(gen3c_trajectories) - set(GEN3C_TRAJECTORIES)
+        if unknown or len(set(gen3c_trajectories)) < len(gen3c_trajectories):
+            return {"error": f"gen3c_trajectories must be distinct values from {list(GEN3C_TRAJECTORIES)}"}
+        output_format = str(request.get("output_format", "ply"))
+        if output_format not in OUTPUT_FORMATS:
+            return {"error": f"output_format must be one of {list(OUTPUT_FORMATS)}"}
+        sh_codebook_size = int(request.get("sh_codebook_size", 0))
+        if sh_codebook_size and (output_format != "compact" or not 0 < sh_codebook_size <= SH_CODEBOOK_MAX_SIZE):
+            return {"error": f"sh_codebook_size must be 1-{SH_CODEBOOK_MAX_SIZE} with output_format='compact'"}
+        preview_refine = bool(request.get("preview_refine", False))
+        if preview_refine and not (gen3c_enabled and is_async):
+            return {"error": "preview_refine requires gen3c_enabled and async"}
+        prune = bool(request.get("prune", True))
+        lod_budgets = sorted({int(b) for b in request.get("lod_budgets") or []})
+        if len(lod_budgets) > LOD_MAX_LEVELS or any(b < LOD_MIN_BUDGET for b in lod_budgets):
+            return {"error": f"lod_budgets takes up to {LOD_MAX_LEVELS} budgets of ≥{LOD_MIN_BUDGET} Gaussians"}
+        input_size = int(request.get("input_size", ANYSPLAT_INPUT_SIZE))
+        if input_size not in ANYSPLAT_INPUT_SIZES:
+            return {"error": f"input_size must be one of {list(ANYSPLAT_INPUT_SIZES)}"}
+        export_options = dict(
+            output_format=output_format,
+            sh_codebook_size=sh_codebook_size,
+            prune=prune,
+            lod_budgets=lod_budgets,
+            input_size=input_size,
+        )
 
         # Collect images into lists
         images_b64: list[str] = []
+        upload_ids: list[str] = []
         filenames: list[str] = []
+        video_options: dict = {}
 
-        if request.get("images"):
+        if request.get("video"):
+            # Video mode: {upload_id: sha256, filename: str} → keyframes on the GPU
+            video = request["video"]
+            if gen3c_enabled:
+                return {"error": "video input is AnySplat only (gen3c_enabled must be false)"}
+            if not _is_upload_id(video.get("upload_id")):
+                return {"error": f"Invalid upload_id {video.get('upload_id')!r}"}
+            video_max_frames = int(request.get("video_max_frames", VIDEO_MAX_KEYFRAMES))
+            if not 2 <= video_max_frames <= VIDEO_MAX_KEYFRAMES_LIMIT:
+                return {"error": f"video_max_frames must be 2-{VIDEO_MAX_KEYFRAMES_LIMIT}"}
+            video_options = {"video_upload_id": video["upload_id"], "video_max_frames": video_max_frames}
+            upload_ids.append(video["upload_id"])
+            filenames.append(video.get("filename", "video.mp4"))
+        elif request.get("uploads"):
+            # Upload-store mode: [{upload_id: sha256, filename: str}, ...]
+            for item in request["uploads"]:
+                if not _is_upload_id(item.get("upload_id")):
+                    return {"error": f"Invalid upload_id {item.get('upload_id')!r}"}
+                upload_ids.append(item["upload_id"])
+                filenames.append(item.get("filename", f"image_{len(filenames)}.jpg"))
+        elif request.get("images"):
             # Multi-image mode: [{image: base64, filename: str}, ...]
             for item in request["images"]:
                 images_b64.append(item["image"])
@@ -777,48 +3802,132 @@ async def anysplat_router(request: dict) -> dict:
             return {"error": "No image provided"}
 
         image_bytes_list = [base64.b64decode(b) for b in images_b64]
+        # Uploads are passed by id; the GPU functions read them from the volume
+        if video_options:
+            input_options = video_options
+        else:
+            input_options = {"upload_ids": upload_ids} if upload_ids else {}
+        if upload_ids:
+            await backend.reload()
+            missing = [upload_id for upload_id in upload_ids if not _touch_artifact(UPLOAD_DIR, upload_id)]
+            if missing:
+                return {"error": f"Unknown upload id(s): {', '.join(missing)}"}
 
         mode = "GEN3C → AnySplat" if gen3c_enabled else "AnySplat"
         print(
-            f"🔄 {mode}: {len(images_b64)} image(s), async={is_async}, "
+            f"🔄 {mode}: {len(filenames)} {'video' if video_options else 'image(s)'}, async={is_async}, "
             f"filenames={filenames}"
         )
         if gen3c_enabled:
             print(
                 f"   GEN3C settings: steps={gen3c_diffusion_steps}, "
-                f"distance={gen3c_movement_distance}"
+                f"distance={gen3c_movement_distance}, frames={gen3c_num_frames}, "
+                f"memory_mode={gen3c_memory_mode}, trajectories={gen3c_trajectories}"
             )
 
-        # ── Dispatch ────────────────────────────────────────────────
-        if is_async:
-            if gen3c_enabled:
-                call = gen3c_pipeline.spawn(
-                    image_bytes_list,
-                    filenames,
-                    gen3c_diffusion_steps,
-                    gen3c_movement_distance,
-                    prompt,
-                    elevation,
-                )
-            else:
-                call = process_image.spawn(image_bytes_list, filenames, prompt, elevation)
-            return {"success": True, "call_id": call.object_id, "status": "processing"}
+        # ── Result cache lookup ─────────────────────────────────────
+        anysplat_params: dict = {
+            "mode": "anysplat",
+            "anysplat_checkpoint": ANYSPLAT_CHECKPOINT,
+            "export": ANYSPLAT_EXPORT_FLAGS,
+            **export_options,
+            # GEN3C-generated frames are detected by filename prefix
+            "gen3c_input": any(fn.startswith("gen3c_") for fn in filenames),
+        }
+        if video_options:
+            anysplat_params.update(video=VIDEO_CACHE_PARAMS, max_frames=video_options["video_max_frames"])
+        cache_params = dict(anysplat_params)
+        if gen3c_enabled:
+            cache_params.update(
+                mode="gen3c",
+                gen3c_checkpoint=GEN3C_CHECKPOINT,
+                diffusion_steps=gen3c_diffusion_steps,
+                movement_distance=gen3c_movement_distance,
+                num_frames=gen3c_num_frames,
+                frame_transport=gen3c_frame_transport,
+                trajectories=gen3c_trajectories,
+            )
+        image_digests = upload_ids or [_sha256(b) for b in image_bytes_list]
+        cache_key = _result_cache_key(image_digests, **cache_params)
+
+        if use_cache:
+            if not upload_ids:
+                await backend.reload()
+            cached = _cached_result(cache_key)
+            if cached is not None:
+                await backend.commit()  # persist the LRU recency bump
+                print(f"⚡ Result cache hit {cache_key[:12]}… ({cached['artifact']['size']:,} bytes)")
+                response = _result_response(cached, backend.artifact_url())
+                return {"success": True, "status": "completed", **response, "cached": True}
 
-        # Sync path
+        # ── Dispatch ────────────────────────────────────────────────
+        lane = "full" if gen3c_enabled else "preview"
         if gen3c_enabled:
-            ply_bytes = gen3c_pipeline.remote(
+            name = "gen3c_pipeline"
+            args = (
                 image_bytes_list,
                 filenames,
                 gen3c_diffusion_steps,
                 gen3c_movement_distance,
                 prompt,
                 elevation,
+                gen3c_num_frames,
+                cache_key,
+                gen3c_refresh,
+                gen3c_memory_mode,
+                gen3c_frame_transport,
             )
+            kwargs = {"trajectories": gen3c_trajectories}
         else:
-            ply_bytes = process_image.remote(image_bytes_list, filenames, prompt, elevation)
+            name = "process_image"
+            args = (image_bytes_list, filenames, prompt, elevation, cache_key)
+            kwargs = {}
+
+        # Identical requests share one call while it runs (a refresh only
+        # coalesces with other refreshes)
+        fingerprint = f"{cache_key}:refresh" if gen3c_refresh else cache_key
+        dispatch = await _dispatch(
+            backend,
+            lane,
+            fingerprint,
+            name,
+            args,
+            {**kwargs, **export_options, **input_options},
+            reuse_finished=use_cache,
+        )
+        if dispatch.get("status") == "rejected":
+            return dispatch
+        call_id, coalesced = dispatch["call_id"], dispatch["coalesced"]
 
-            ply_b64 = base64.b64encode(ply_bytes).decode("utf-8")
-            return {"success": True, "ply": ply_b64}
+        if is_async:
+            if preview_refine and await backend.inflight_get(f"preview:{call_id}") is None:
+                # Quick AnySplat-only preview of the same inputs, served until the refined result lands
+                preview_key = _result_cache_key(image_digests, **anysplat_params)
+                cached = _cached_result(preview_key) if use_cache else None
+                if cached is not None:
+                    await backend.inflight_put(f"preview:{call_id}", {"result": cached, "updated": time.time()})
+                else:
+                    preview = await _dispatch(
+                        backend,
+                        "preview",
+                        preview_key,
+                        "process_image",
+                        (image_bytes_list, filenames, prompt, elevation, preview_key),
+                        {**export_options, **input_options},
+                        reuse_finished=use_cache,
+                    )
+                    if preview.get("status") == "rejected":
+                        print(f"⚠️  Preview not started ({preview['error']}) — refine only")
+                    else:
+                        await backend.inflight_put(f"preview:{call_id}", {"call_id": preview["call_id"]})
+            return {"success": True, "status": "processing", **dispatch}
+
+        # Sync path
+        try:
+            result = await backend.poll(call_id, timeout=None)
+        finally:
+            await _settle_inflight(backend, call_id)
+        return {"success": True, **_result_response(result, backend.artifact_url()), "coalesced": coalesced}
 
     except Exception as e:
         import traceback
@@ -827,6 +3936,91 @@ async def anysplat_router(request: dict) -> dict:
         return {"error": str(e)}
 
 
+def _router_app(backend):
+    """Build the router's FastAPI app around `backend` (see _ModalBackend)."""
+    import asyncio
+
+    from fastapi import FastAPI, Request, Response
+    from fastapi.middleware.cors import CORSMiddleware
+    from fastapi.responses import JSONResponse
+
+    web = FastAPI()
+    web.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],
+        allow_methods=["GET", "HEAD", "POST"],
+        allow_headers=["*"],
+        expose_headers=["Content-Length", "Content-Range", "ETag"],
+    )
+
+    @web.post("/")
+    async def route(request: dict) -> JSONResponse:
+        response = await _route_request(request, backend)
+        if response.get("status") == "rejected":
+            return JSONResponse(response, status_code=429, headers={"Retry-After": str(response["retry_after"])})
+        return JSONResponse(response)
+
+    # ── Uploads: raw body (filename in X-Filename) or multipart files ──
+    async def file_chunks(upload):
+        while chunk := await upload.read(UPLOAD_CHUNK_BYTES):
+            yield chunk
+
+    def upload_limit(filename, content_type) -> int:
+        return UPLOAD_MAX_VIDEO_BYTES if _is_video(filename, content_type) else UPLOAD_MAX_FILE_BYTES
+
+    @web.post("/uploads")
+    async def upload(request: Request) -> JSONResponse:
+        uploads = []
+        try:
+            if request.headers.get("content-type", "").startswith("multipart/form-data"):
+                form = await request.form()
+                for _, value in form.multi_items():
+                    if isinstance(value, str):
+                        continue  # plain form fields
+                    limit = upload_limit(value.filename, value.content_type)
+                    stored = await _store_upload(UPLOAD_DIR, file_chunks(value), limit)
+                    uploads.append({**stored, "filename": value.filename})
+            else:
+                filename = request.headers.get("x-filename", "image.jpg")
+                limit = upload_limit(filename, request.headers.get("content-type"))
+                stored = await _store_upload(UPLOAD_DIR, request.stream(), limit)
+                uploads.append({**stored, "filename": filename})
+        except ValueError as e:
+            return JSONResponse({"error": str(e)}, status_code=400)
+        if not uploads:
+            return JSONResponse({"error": "No files in upload"}, status_code=400)
+        await backend.commit()
+        print(f"📥 Stored {len(uploads)} upload(s), {sum(u['size'] for u in uploads):,} bytes")
+        return JSONResponse({"uploads": uploads})
+
+    # ── Artifacts: immutable, cacheable forever by browsers and CDNs ──
+    @web.api_route("/artifacts/{name}", methods=["GET", "HEAD"])
+    async def get_artifact(name: str, request: Request) -> Response:
+        headers = {key.lower(): value for key, value in request.headers.items()}
+        head = request.method == "HEAD"
+        status, response_headers, body = await asyncio.to_thread(_serve_artifact, ARTIFACT_DIR, name, headers, head)
+        if status == 404 and _artifact_format(name) is not None:
+            await backend.reload()  # written by another container since our last view
+            status, response_headers, body = await asyncio.to_thread(
+                _serve_artifact, ARTIFACT_DIR, name, headers, head
+            )
+        return Response(content=body, status_code=status, headers=response_headers)
+
+    return web
+
+
+@app.function(image=web_image, timeout=900, volumes={"/cache": volume})
+@modal.concurrent(max_inputs=100)
+@modal.asgi_app()
+def anysplat_router():
+    return _router_app(_ModalBackend())
+
+
+def _fetch_artifact(artifact: dict) -> bytes:
+    """Download an artifact from the volume (for local entrypoints and scripts)."""
+    return b"".join(volume.read_file(f"{ARTIFACT_SUBDIR}/{artifact['name']}"))
+
+
 @app.local_entrypoint()
 def main():
     """
@@ -850,7 +4044,8 @@ def main():
         image_bytes = f.read()
 
     print(f"Processing {image_path} with AnySplat...")
-    ply_bytes = process_image.remote([image_bytes], [image_path.name])
+    result = AnySplatService().process_image.remote([image_bytes], [image_path.name])
+    ply_bytes = _fetch_artifact(result["artifact"])
 
     output_path = image_path.with_suffix(".ply")
     with output_path.open("wb") as f:
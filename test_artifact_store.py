@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Tests for the content-addressed artifact store and its GET semantics.
+
+Usage:
+    python -m pytest -q test_artifact_store.py
+
+Exercises _store_artifact / _serve_artifact against a temporary directory
+(the router's GET /artifacts/<name> route is a thin FastAPI wrapper around
+_serve_artifact — see _router_app).
+"""
+
+import builtins
+import gzip
+import os
+
+import pytest
+
+from modal_app import _parse_range, _serve_artifact, _store_artifact
+
+
+@pytest.fixture()
+def stored(tmp_path):
+    data = bytes(range(256)) * 64
+    artifact = _store_artifact(str(tmp_path), data, "ply")
+    return str(tmp_path), artifact, data
+
+
+def test_store_is_content_addressed(stored):
+    root, artifact, data = stored
+    assert artifact["name"] == f"{artifact['sha256']}.ply"
+    assert artifact["size"] == len(data)
+    assert _store_artifact(root, data, "ply") == artifact
+
+
+@pytest.mark.parametrize(
+    "header,expected",
+    [
+        ("bytes=0-99", (0, 99)),
+        ("bytes=100-", (100, 999)),
+        ("bytes=-10", (990, 999)),
+        ("bytes=900-5000", (900, 999)),
+        ("bytes=0-1,5-6", None),
+        ("items=0-1", None),
+    ],
+)
+def test_parse_range(header, expected):
+    assert _parse_range(header, 1000) == expected
+
+
+@pytest.mark.parametrize("header", ["bytes=1000-", "bytes=5-4", "bytes=-0"])
+def test_parse_range_unsatisfiable(header):
+    with pytest.raises(ValueError):
+        _parse_range(header, 1000)
+
+
+def test_full_and_conditional_get(stored):
+    root, artifact, data = stored
+    status, headers, body = _serve_artifact(root, artifact["name"], {})
+    assert status == 200 and body == data
+    assert headers["ETag"] == f'"{artifact["sha256"]}"'
+
+    status, _, body = _serve_artifact(root, artifact["name"], {"if-none-match": headers["ETag"]})
+    assert status == 304 and body == b""
+
+
+def test_range_get(stored):
+    root, artifact, data = stored
+    status, headers, body = _serve_artifact(root, artifact["name"], {"range": "bytes=10-19"})
+    assert status == 206 and body == data[10:20]
+    assert headers["Content-Range"] == f"bytes 10-19/{len(data)}"
+
+    status, headers, _ = _serve_artifact(root, artifact["name"], {"range": f"bytes={len(data)}-"})
+    assert status == 416 and headers["Content-Range"] == f"bytes */{len(data)}"
+
+
+def test_gzip_encoding(stored):
+    root, artifact, data = stored
+    status, headers, body = _serve_artifact(root, artifact["name"], {"accept-encoding": "gzip, br"})
+    assert status == 200 and headers["Content-Encoding"] == "gzip"
+    assert gzip.decompress(body) == data and len(body) < len(data)
+
+    # Already-compressed formats are served as is
+    compact = _store_artifact(root, b"CSPL" + bytes(100), "compact")
+    _, headers, _ = _serve_artifact(root, compact["name"], {"accept-encoding": "gzip"})
+    assert "Content-Encoding" not in headers
+
+
+
+def test_gzip_encoding_is_compressed_once(stored, monkeypatch):
+    root, artifact, _ = stored
+    first = _serve_artifact(root, artifact["name"], {"accept-encoding": "gzip"})
+    assert os.path.isfile(os.path.join(root, artifact["name"] + ".gz"))
+
+    monkeypatch.setattr(gzip, "compress", lambda *a, **k: pytest.fail("re-compressed a cached artifact"))
+    assert _serve_artifact(root, artifact["name"], {"accept-encoding": "gzip"}) == first
+    # The cached encoding is not an artifact of its own
+    assert _serve_artifact(root, artifact["name"] + ".gz", {})[0] == 404
+
+
+def test_head_reads_no_bytes(stored, monkeypatch):
+    root, artifact, data = stored
+    name = artifact["name"]
+    get_headers = _serve_artifact(root, name, {})[1]
+    gzip_body = _serve_artifact(root, name, {"accept-encoding": "gzip"})[2]
+
+    monkeypatch.setattr(builtins, "open", lambda *a, **k: pytest.fail("HEAD opened the artifact"))
+    status, headers, body = _serve_artifact(root, name, {}, head=True)
+    assert status == 200 and body == b"" and headers == {**get_headers, "Content-Length": str(len(data))}
+
+    status, headers, _ = _serve_artifact(root, name, {"accept-encoding": "gzip"}, head=True)
+    assert headers["Content-Encoding"] == "gzip" and headers["Content-Length"] == str(len(gzip_body))
+
+    status, headers, _ = _serve_artifact(root, name, {"range": "bytes=10-19"}, head=True)
+    assert status == 206 and headers["Content-Length"] == "10"
+
+
+@pytest.mark.parametrize("name", ["../etc/passwd", "0" * 64 + ".exe", "0" * 64 + ".ply"])
+def test_unknown_names(stored, name):
+    root, _, _ = stored
+    assert _serve_artifact(root, name, {})[0] == 404
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Tests for chunked reconstruction: windowing, pose alignment and merging.
+
+Usage:
+    python -m pytest -q test_chunked_reconstruction.py
+
+Builds one synthetic scene with cameras, re-expresses a second window of it
+in another frame (as a separate AnySplat pass would), and checks that
+_merge_windows brings it back and keeps one copy of the overlap.
+"""
+
+import pytest
+
+torch = pytest.importorskip("torch")
+np = pytest.importorskip("numpy")
+
+from modal_app import (  # noqa: E402
+    _chunk_windows,
+    _merge_windows,
+    _pose_similarity,
+    _sh_rest_basis,
+    _sh_rotation,
+    _transform_splat,
+)
+from test_splat_reduction import random_splat  # noqa: E402
+
+
+def random_rotation(seed: int) -> "torch.Tensor":
+    q, r = torch.linalg.qr(torch.randn(3, 3, generator=torch.Generator().manual_seed(seed)))
+    q = q * torch.sign(torch.diagonal(r))
+    return q if torch.linalg.det(q) > 0 else -q
+
+
+def random_poses(n: int, seed: int = 0) -> "torch.Tensor":
+    poses = torch.eye(4).repeat(n, 1, 1)
+    for i in range(n):
+        poses[i, :3, :3] = random_rotation(seed + i)
+    poses[:, :3, 3] = torch.randn(n, 3, generator=torch.Generator().manual_seed(seed)) * 2
+    return poses
+
+
+def move_poses(poses, scale, rotation, translation):
+    moved = poses.clone()
+    moved[:, :3, :3] = rotation @ poses[:, :3, :3]
+    moved[:, :3, 3] = scale * poses[:, :3, 3] @ rotation.T + translation
+    return moved
+
+
+def test_chunk_windows():
+    assert _chunk_windows(20) == [list(range(20))]
+    windows = _chunk_windows(100, size=32, overlap=4)
+    assert all(len(w) <= 32 for w in windows)
+    assert sorted(set(sum(windows, []))) == list(range(100))
+    assert all(len(set(a) & set(b)) == 4 for a, b in zip(windows, windows[1:]))
+
+
+def test_pose_similarity_recovers_transform():
+    poses = random_poses(4)
+    rotation, translation = random_rotation(10), torch.tensor([0.5, -1.0, 2.0])
+    scale, r, t = _pose_similarity(poses, move_poses(poses, 0.7, rotation, translation))
+    assert float(scale) == pytest.approx(0.7, abs=1e-4)
+    assert torch.allclose(r, rotation, atol=1e-4) and torch.allclose(t, translation, atol=1e-4)
+
+
+def test_sh_rotation_preserves_colour():
+    rotation = random_rotation(3)
+    dirs = np.random.default_rng(0).normal(size=(50, 3))
+    dirs /= np.linalg.norm(dirs, axis=1, keepdims=True)
+    coeffs = np.random.default_rng(1).normal(size=8)
+    rotated = _sh_rotation(rotation, 8).double().numpy() @ coeffs
+    # The rotated lobe seen from R·d matches the original seen from d
+    r = rotation.double().numpy()
+    assert np.allclose(_sh_rest_basis(dirs @ r.T, 8) @ rotated, _sh_rest_basis(dirs, 8) @ coeffs, atol=1e-6)
+
+
+def test_merge_windows_aligns_and_dedupes():
+    scene, poses = random_splat(3000), random_poses(8)
+    # Window 0 sees Gaussians [0, 2000), window 1 sees [1000, 3000) in its own frame
+    first = {name: t[:2000] for name, t in scene.items()}
+    second = {name: t[1000:] for name, t in scene.items()}
+    scale, rotation, translation = 2.0, random_rotation(20), torch.tensor([3.0, 0.0, -1.0])
+    second = _transform_splat(second, scale, rotation, translation)
+    second_poses = move_poses(poses[3:], scale, rotation, translation)
+
+    merged = _merge_windows([(first, poses[:5]), (second, second_poses)], [[0, 1, 2, 3, 4], [3, 4, 5, 6, 7]])
+    count = merged["means"].shape[0]
+    assert 3000 <= count < 3300  # the 1000 shared Gaussians are (almost all) kept once
+    # Every scene Gaussian is back where it was
+    nearest = torch.cdist(scene["means"].double(), merged["means"].double()).min(dim=1).values
+    assert nearest.max() < 1e-3
+
+
+def test_transform_splat_round_trip():
+    splat = random_splat(200)
+    rotation, translation = random_rotation(5), torch.tensor([1.0, 2.0, 3.0])
+    moved = _transform_splat(splat, 2.0, rotation, translation)
+    back = _transform_splat(moved, 0.5, rotation.T, -0.5 * translation @ rotation)
+    assert torch.allclose(back["means"], splat["means"], atol=1e-4)
+    assert torch.allclose(back["scales"], splat["scales"], atol=1e-6)
+    assert torch.allclose(back["harmonics"], splat["harmonics"], atol=1e-3)
+    # q and -q are the same rotation
+    assert torch.allclose((back["rotations"] * splat["rotations"]).sum(dim=1).abs(), torch.ones(200), atol=1e-4)
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Round-trip test for the compact quantized splat format.
+
+Usage:
+    python -m pytest -q test_compact_splat.py
+
+Encodes random Gaussians with _encode_compact_splat, decodes them with
+_decode_compact_splat and checks every attribute stays within the error
+bound implied by its quantization (no GPU or Modal account needed).
+"""
+
+import numpy as np
+import pytest
+
+import modal_app
+from modal_app import (
+    COMPACT_SH_REST_BITS,
+    PROGRESSIVE_CHUNK_GAUSSIANS,
+    SH_CODEBOOK_MAX_SIZE,
+    _build_sh_codebook,
+    _decode_compact_splat,
+    _encode_compact_splat,
+    _encode_progressive_splat,
+    _nearest_codewords,
+    _read_progressive_splat,
+)
+
+
+def random_splats(n: int, d_sh: int = 25, seed: int = 0) -> dict:
+    rng = np.random.default_rng(seed)
+    rotations = rng.normal(size=(n, 4)).astype(np.float32)
+    rotations /= np.linalg.norm(rotations, axis=1, keepdims=True)
+    return {
+        "means": rng.normal(scale=2.0, size=(n, 3)).astype(np.float32),
+        "scales": np.exp(rng.uniform(-7, -1, size=(n, 3))).astype(np.float32),
+        "rotations": rotations,
+        "opacities": rng.uniform(0, 1, size=n).astype(np.float32),
+        "sh_dc": rng.normal(scale=1.0, size=(n, 3)).astype(np.float32),
+        "sh_rest": rng.normal(scale=0.1, size=(n, 3, d_sh - 1)).astype(np.float32),
+    }
+
+
+def test_round_trip_error_bounds():
+    arrays = random_splats(5000)
+    data = _encode_compact_splat(arrays, sh_degree=2)
+    decoded = _decode_compact_splat(data)
+
+    # Positions: half a 16-bit step of the per-axis bounds
+    span = arrays["means"].max(axis=0) - arrays["means"].min(axis=0)
+    step = span / 65535
+    assert np.all(np.abs(decoded["means"] - arrays["means"]) <= step * 0.5 + 1e-5)
+
+    # Log-scales: half an 8-bit step of the log range
+    log_scales = np.log(arrays["scales"])
+    ls_step = (log_scales.max() - log_scales.min()) / 255
+    assert np.abs(np.log(decoded["scales"]) - log_scales).max() <= ls_step * 0.5 + 1e-5
+
+    assert np.abs(decoded["opacities"] - arrays["opacities"]).max() <= 0.5 / 255 + 1e-6
+
+    # Rotations: compare as rotations (q ≡ -q), within ~0.25°
+    dots = np.abs((decoded["rotations"] * arrays["rotations"]).sum(axis=1))
+    angle_deg = np.degrees(2 * np.arccos(np.clip(dots, 0, 1)))
+    assert angle_deg.max() < 0.25
+
+    dc_step = (arrays["sh_dc"].max() - arrays["sh_dc"].min()) / 255
+    assert np.abs(decoded["sh_dc"] - arrays["sh_dc"]).max() <= dc_step * 0.5 + 1e-5
+
+    # SH up to degree 2 survives, higher bands are dropped
+    assert decoded["sh_rest"].shape == (5000, 3, 8)
+    rest = arrays["sh_rest"][..., :8]
+    rest_step = 2 * np.abs(rest).max() / ((1 << COMPACT_SH_REST_BITS) - 1)
+    assert np.abs(decoded["sh_rest"] - rest).max() <= rest_step * 0.5 + 1e-5
+
+
+def test_smaller_than_float_ply():
+    arrays = random_splats(5000)
+    data = _encode_compact_splat(arrays, sh_degree=2)
+    # Float PLY with the same SH: 3 + 3 normals + 3 DC + 24 rest + 1 + 3 + 4 floats
+    ply_bytes = 5000 * 41 * 4
+    assert len(data) * 4 < ply_bytes
+
+
+@pytest.mark.parametrize("n,sh_degree", [(0, 2), (1, 2), (7, 0), (33, 1)])
+def test_edge_cases(n, sh_degree):
+    arrays = random_splats(n, seed=n)
+    decoded = _decode_compact_splat(_encode_compact_splat(arrays, sh_degree=sh_degree))
+    num_rest = (sh_degree + 1) ** 2 - 1
+    assert decoded["means"].shape == (n, 3)
+    assert decoded["rotations"].shape == (n, 4)
+    assert decoded["sh_rest"].shape == (n, 3, num_rest)
+
+
+def test_sh_codebook_round_trip():
+    arrays = random_splats(20000)
+    # Clustered SH rest: 32 prototypes plus small noise
+    rng = np.random.default_rng(1)
+    prototypes = rng.normal(scale=0.2, size=(32, 3, 8)).astype(np.float32)
+    rest = prototypes[rng.integers(0, 32, 20000)] + rng.normal(scale=0.005, size=(20000, 3, 8))
+    arrays["sh_rest"] = rest.astype(np.float32)
+
+    sh_codebook = _build_sh_codebook(arrays["sh_rest"], 64)
+    stats = sh_codebook["stats"]
+    assert stats["codebook_size"] == 64
+    assert stats["compression_ratio"] > 20
+    assert stats["colour_rmse"] < 0.02
+
+    data = _encode_compact_splat(arrays, sh_degree=2, sh_codebook=sh_codebook)
+    assert len(data) < len(_encode_compact_splat(arrays, sh_degree=2))
+    decoded = _decode_compact_splat(data)
+    expected = sh_codebook["codebook"].astype(np.float32)[sh_codebook["indices"]]
+    np.testing.assert_array_equal(decoded["sh_rest"], expected)
+    # The rest of the attributes are unaffected by the codebook
+    assert np.abs(decoded["opacities"] - arrays["opacities"]).max() <= 0.5 / 255 + 1e-6
+
+
+def test_sh_codebook_must_match_degree():
+    arrays = random_splats(100)
+    sh_codebook = _build_sh_codebook(arrays["sh_rest"][..., :3], 16)
+    with pytest.raises(ValueError):
+        _encode_compact_splat(arrays, sh_degree=2, sh_codebook=sh_codebook)
+
+
+@pytest.mark.parametrize("size", [0, SH_CODEBOOK_MAX_SIZE + 1, 65535])
+def test_sh_codebook_size_limits(size):
+    with pytest.raises(ValueError):
+        _build_sh_codebook(random_splats(100)["sh_rest"], size)
+
+
+def test_sh_codebook_chunks_are_bounded(monkeypatch):
+    # Rows per matmul shrink as the codebook grows; results match one big matmul
+    monkeypatch.setattr(modal_app, "SH_CODEBOOK_CHUNK_BYTES", 4 * 64 * 100)  # 100 rows at 64 entries
+    rng = np.random.default_rng(2)
+    vectors = rng.normal(size=(1000, 24)).astype(np.float32)
+    codebook = vectors[:64].copy()
+    distances = ((vectors[:, None].astype(np.float64) - codebook[None]) ** 2).sum(axis=-1)
+    np.testing.assert_array_equal(_nearest_codewords(vectors, codebook), distances.argmin(axis=1))
+
+
+def test_progressive_prefixes():
+    arrays = random_splats(3 * PROGRESSIVE_CHUNK_GAUSSIANS)
+    data = _encode_progressive_splat(arrays)
+
+    full = _read_progressive_splat(data)
+    assert full["complete"] and full["chunks_loaded"] == full["chunks_total"]
+    assert len(full["means"]) == len(arrays["means"])
+    # Every Gaussian arrives exactly once (compare quantized opacities as multisets)
+    assert np.allclose(np.sort(full["opacities"]), np.sort(np.rint(arrays["opacities"] * 255) / 255), atol=1e-6)
+
+    counts = [len(_read_progressive_splat(data[:cut])["means"]) for cut in range(0, len(data) + 1, len(data) // 20)]
+    assert counts == sorted(counts) and counts[0] == 0
+
+    # The first chunk alone already spans the scene
+    first = None
+    for cut in range(0, len(data), len(data) // 50):
+        first = _read_progressive_splat(data[:cut])
+        if first["chunks_loaded"]:
+            break
+    assert not first["complete"]
+    assert len(first["means"]) < len(arrays["means"]) // 32
+    spread = np.percentile(arrays["means"], [5, 95], axis=0)
+    first_spread = np.percentile(first["means"], [5, 95], axis=0)
+    assert np.allclose(first_spread, spread, atol=0.1 * (spread[1] - spread[0]).max())
+
+
+def test_progressive_empty():
+    decoded = _read_progressive_splat(_encode_progressive_splat(random_splats(0)))
+    assert decoded["complete"] and decoded["means"].shape == (0, 3)
+    assert not _read_progressive_splat(b"")["complete"]
+
+
+def test_rejects_other_data():
+    with pytest.raises(ValueError):
+        _decode_compact_splat(b"ply\n" + bytes(64))
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Tests for the GEN3C-side caches, keyframe selection and merging.
+
+Usage:
+    python -m pytest -q test_gen3c_cache.py
+
+Round-trips MoGe outputs through the MoGe depth cache in a temporary
+directory, selects keyframes from synthetic videos (a texture panning
+across the frame) and merges keyframe payloads the way gen3c_pipeline does.
+"""
+
+import pytest
+
+from modal_app import (
+    MOGE_OUTPUTS,
+    _gen3c_cache_key,
+    _keyframe_cache_read,
+    _keyframe_cache_write,
+    _merge_keyframes,
+    _moge_cache_key,
+    _moge_cache_read,
+    _moge_cache_write,
+    _pack_raw_frames,
+    _select_keyframes,
+)
+
+torch = pytest.importorskip("torch")
+np = pytest.importorskip("numpy")
+
+
+def test_moge_cache_round_trip(tmp_path):
+    outputs = {name: torch.rand(1, 1, 3, 8, 16) for name in MOGE_OUTPUTS}
+    key = _moge_cache_key("0" * 64)
+    assert _moge_cache_read(str(tmp_path), key) is None
+    _moge_cache_write(str(tmp_path), key, outputs)
+    cached = _moge_cache_read(str(tmp_path), key)
+    assert set(cached) == set(MOGE_OUTPUTS)
+    assert all(torch.equal(cached[name], outputs[name]) for name in MOGE_OUTPUTS)
+
+
+def test_moge_key_is_shared_across_generation_settings():
+    # One MoGe entry per image, while GEN3C output is keyed per setting
+    assert _moge_cache_key("a" * 64) != _moge_cache_key("b" * 64)
+    assert _gen3c_cache_key("a" * 64, 22, 0.3) != _gen3c_cache_key("a" * 64, 22, 0.5)
+    assert _gen3c_cache_key("a" * 64, 22, 0.3, "up") != _gen3c_cache_key("a" * 64, 22, 0.3)
+
+
+def test_keyframe_cache_returns_raw_frames_at_the_input_size(tmp_path):
+    sized = {size: _pack_raw_frames(np.full((2, size, size, 3), size % 256, dtype=np.uint8)) for size in (224, 448)}
+    key = _gen3c_cache_key("a" * 64, 22, 0.3)
+    _keyframe_cache_write(str(tmp_path), key, 12, [b"jpg-0", b"jpg-1"], {"keyframe_indices": [3, 9]}, raw_frames=sized)
+
+    assert _keyframe_cache_read(str(tmp_path), key, 12, "raw", raw_size=224) == sized[224]
+    assert _keyframe_cache_read(str(tmp_path), key, 12, "raw", raw_size=448) == sized[448]
+    assert _keyframe_cache_read(str(tmp_path), key, 12, "raw", raw_size=336) is None  # not stored: a miss
+    assert _keyframe_cache_read(str(tmp_path), key, 12) == [b"jpg-0", b"jpg-1"]
+
+
+def test_merge_keyframes():
+    a = np.zeros((2, 4, 4, 3), dtype=np.uint8)
+    b = np.full((3, 4, 4, 3), 7, dtype=np.uint8)
+    merged = _merge_keyframes([_pack_raw_frames(a), _pack_raw_frames(b)])
+    assert merged == _pack_raw_frames(np.concatenate([a, b]))
+    assert _merge_keyframes([[b"1"], [b"2", b"3"]]) == [b"1", b"2", b"3"]
+    with pytest.raises(ValueError):
+        _merge_keyframes([_pack_raw_frames(a), _pack_raw_frames(np.zeros((1, 8, 8, 3), dtype=np.uint8))])
+
+
+def panning_video(shifts, blurred=()) -> "np.ndarray":
+    """uint8 [T, 48, 64, 3] windows of one textured strip, shifted by `shifts` px."""
+    y, x, c = np.mgrid[:48, :256, :3]
+    strip = 110 + 60 * np.sin(x / 9 + c) + 40 * np.sin(y / 6 + x / 13)
+    strip = strip + np.random.default_rng(0).uniform(0, 50, strip.shape)  # fine detail blur removes
+    frames = np.stack([strip[:, s : s + 64] for s in shifts])
+    for t in blurred:
+        frames[t] = sum(np.roll(frames[t], shift, (0, 1)) for shift in [(0, 0), (1, 0), (0, 1), (1, 1)]) / 4
+    return frames.clip(0, 255).astype(np.uint8)
+
+
+def test_select_keyframes_uniform_motion():
+    video = panning_video(range(0, 121))
+    indices, stats = _select_keyframes(video, 12, margin=6)
+    assert 6 <= len(indices) <= 12 and stats["coverage"] >= 0.95
+    assert indices.min() >= 6 and indices.max() <= 114
+    assert list(indices) == sorted(indices)
+
+
+def test_select_keyframes_skips_redundant_frames():
+    # The camera stops halfway: the static half needs one view, not six
+    video = panning_video([min(t, 60) for t in range(121)])
+    uniform = _select_keyframes(panning_video(range(121)), 12, margin=6)[1]
+    indices, stats = _select_keyframes(video, 12, margin=6)
+    assert stats["selected"] < uniform["selected"] and stats["saved"] > 0
+    assert sum(i > 60 for i in indices) <= 1
+
+
+def test_select_keyframes_prefers_sharp_frames():
+    blurred = set(range(0, 121, 2))
+    indices, _ = _select_keyframes(panning_video(range(121), blurred), 12, margin=6)
+    assert sum(i in blurred for i in indices) <= len(indices) // 4
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+Tests for the GEN3C memory-mode decision table.
+
+Usage:
+    python -m pytest -q test_gen3c_memory.py
+
+_gen3c_offload_plan is pure: it maps a memory mode and the free VRAM
+(GB) to the Gen3cPipeline offload flags, so no GPU is needed.
+"""
+
+import pytest
+
+from modal_app import (
+    GEN3C_NETWORK_GB,
+    GEN3C_OFFLOAD_PEAK_GB,
+    GEN3C_TOKENIZER_GB,
+    GEN3C_VRAM_HEADROOM_GB,
+    _gen3c_offload_plan,
+)
+
+# Free VRAM at which "auto" can keep each component resident
+TOKENIZER_FITS = GEN3C_OFFLOAD_PEAK_GB + GEN3C_VRAM_HEADROOM_GB + GEN3C_TOKENIZER_GB
+BOTH_FIT = TOKENIZER_FITS + GEN3C_NETWORK_GB
+
+
+@pytest.mark.parametrize(
+    "mode,free_gb,network,tokenizer",
+    [
+        ("offload", 80.0, True, True),
+        ("resident", 10.0, False, False),
+        ("auto", 79.0, False, False),  # A100-80GB: everything resident
+        ("auto", BOTH_FIT, False, False),
+        ("auto", BOTH_FIT - 0.1, True, False),  # tokenizer is kept first
+        ("auto", TOKENIZER_FITS, True, False),
+        ("auto", TOKENIZER_FITS - 0.1, True, True),
+        ("auto", 40.0, True, True),
+    ],
+)
+def test_offload_plan(mode, free_gb, network, tokenizer):
+    assert _gen3c_offload_plan(mode, free_gb) == {"offload_network": network, "offload_tokenizer": tokenizer}
+
+
+def test_unknown_mode():
+    with pytest.raises(ValueError):
+        _gen3c_offload_plan("turbo", 80.0)
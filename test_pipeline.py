@@ -42,7 +42,7 @@ def main():
     print(f"📷 Input: {image_path} ({len(image_bytes) / 1024:.0f} KB)")
 
     # Import the production app's functions
-    from modal_app import process_image, gen3c_pipeline
+    from modal_app import AnySplatService, _fetch_artifact, gen3c_pipeline
 
     # ── Test 1: AnySplat ONLY (single image, no GEN3C) ──────────────
     print("\n" + "=" * 60)
@@ -50,12 +50,13 @@ def main():
     print("=" * 60)
     t0 = time.time()
     try:
-        ply_single = process_image.remote(
+        result_single = AnySplatService().process_image.remote(
             [image_bytes],
             [image_path.name],
             prompt="",
             elevation=20,
         )
+        ply_single = _fetch_artifact(result_single["artifact"])
         t1 = time.time()
         out_single = Path("debug/output_single.ply")
         out_single.parent.mkdir(parents=True, exist_ok=True)
@@ -74,7 +75,7 @@ def main():
     print("=" * 60)
     t0 = time.time()
     try:
-        ply_multi = gen3c_pipeline.remote(
+        result_multi = gen3c_pipeline.remote(
             [image_bytes],
             [image_path.name],
             diffusion_steps=22,
@@ -82,6 +83,7 @@ def main():
             prompt="",
             elevation=20,
         )
+        ply_multi = _fetch_artifact(result_multi["artifact"])
         t1 = time.time()
         out_multi = Path("debug/output_multi.ply")
         out_multi.parent.mkdir(parents=True, exist_ok=True)
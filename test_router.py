@@ -0,0 +1,532 @@
+#!/usr/bin/env python3
+"""
+Local harness for the CPU router, with a fake function-call backend.
+
+Usage:
+    python -m pytest -q test_router.py
+    python test_router.py [--requests 20000] [--concurrency 200]   # load test
+
+Builds the real router app (_router_app) around FakeBackend, which stands in
+for _ModalBackend: spawned calls "finish" after a fixed latency with a small
+artifact, so dispatch, status polling, uploads, the result cache and artifact
+downloads all run without Modal or a GPU.
+"""
+
+import asyncio
+import itertools
+import time
+
+import pytest
+
+pytest.importorskip("fastapi")
+httpx = pytest.importorskip("httpx")
+
+import modal_app  # noqa: E402
+from modal_app import _cache_result, _JobProgress, _router_app, _store_artifact  # noqa: E402
+
+
+class FakeBackend:
+    """Function calls complete (or fail) `latency` seconds after they are spawned."""
+
+    def __init__(self, latency: float = 0.0, fail: bool = False, capacity: int = 1000, latencies: dict | None = None):
+        self.latency = latency
+        self.latencies = latencies or {}  # per-function overrides of `latency`
+        self.fail = fail
+        self.capacity = capacity  # concurrent inputs per GPU pool; the rest queue
+        self.calls: dict[str, dict] = {}
+        self.progress_store: dict[str, dict] = {}  # stands in for the job_progress Dict
+        self.inflight: dict = {}  # stands in for the job_inflight Dict
+        self._ids = itertools.count()
+
+    async def spawn(self, name: str, *args, **kwargs) -> str:
+        call_id = f"fc-{next(self._ids):06d}"
+        self.calls[call_id] = {"name": name, "args": args, "kwargs": kwargs, "done_at": time.monotonic() + self.latencies.get(name, self.latency)}
+        return call_id
+
+    async def poll(self, call_id: str, timeout: float | None = 0) -> dict:
+        call = self.calls.get(call_id)
+        if call is None:
+            raise KeyError(f"Unknown call {call_id}")
+        pending = call["done_at"] - time.monotonic()
+        if pending > 0:
+            await asyncio.sleep(pending if timeout is None else min(pending, timeout))
+            if timeout is not None and pending > timeout:
+                raise TimeoutError
+        if self.fail:
+            raise RuntimeError("CUDA out of memory")
+        if "result" not in call:
+            # Mimic process_image: store the artifact, then the cache manifest
+            data = b"CSPL" + call_id.encode()
+            output_format = call["kwargs"].get("output_format", "ply")
+            call["result"] = {
+                "format": output_format,
+                "num_gaussians": 1,
+                "artifact": _store_artifact(modal_app.ARTIFACT_DIR, data, output_format),
+                "input_size": call["kwargs"].get("input_size", modal_app.ANYSPLAT_INPUT_SIZE),
+            }
+            if call["name"] == "gen3c_pipeline":
+                gpu = {"peak_gb": 61.5, "memory_mode": "auto", "offload_network": False, "offload_tokenizer": False}
+                call["result"]["gen3c_gpu"] = {"peak_gb": 61.5, "trajectories": {"clockwise": gpu}}
+            cache_key = call["args"][4 if call["name"] == "process_image" else 7]
+            _cache_result(cache_key, call["result"])
+        return call["result"]
+
+    async def progress(self, call_id: str) -> dict | None:
+        return self.progress_store.get(call_id)
+
+    async def queue_stats(self, name: str) -> dict:
+        """Like _ModalBackend: GPU pools only; every gen3c_pipeline call puts one input per trajectory on GEN3C."""
+        now = time.monotonic()
+        active_calls = [call for call in self.calls.values() if call["done_at"] > now]
+        if name == "generate_views":
+            default = modal_app.GEN3C_DEFAULT_TRAJECTORIES
+            active = sum(
+                len(call["kwargs"].get("trajectories") or default)
+                for call in active_calls
+                if call["name"] == "gen3c_pipeline"
+            )
+        elif name == "process_image":
+            active = sum(call["name"] == name for call in active_calls)
+        else:
+            raise KeyError(name)  # not a GPU pool: _ModalBackend has no stats for it either
+        running = min(active, self.capacity)
+        return {"queued": active - running, "running": running, "containers": running}
+
+    async def inflight_get(self, key: str):
+        return self.inflight.get(key)
+
+    async def inflight_put(self, key: str, value, skip_if_exists: bool = False) -> bool:
+        if skip_if_exists and key in self.inflight:
+            return False
+        self.inflight[key] = value
+        return True
+
+    async def inflight_pop(self, key: str):
+        return self.inflight.pop(key, None)
+
+    def artifact_url(self) -> str:
+        return "http://router/artifacts"
+
+    async def reload(self) -> None:
+        pass
+
+    async def commit(self) -> None:
+        pass
+
+
+@pytest.fixture(autouse=True)
+def cache_dirs(tmp_path, monkeypatch):
+    for name in ("ARTIFACT_DIR", "UPLOAD_DIR", "RESULT_CACHE_DIR"):
+        monkeypatch.setattr(modal_app, name, str(tmp_path / name.lower()))
+
+
+def client(backend: FakeBackend) -> "httpx.AsyncClient":
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=_router_app(backend)), base_url="http://router")
+
+
+async def upload_and_process(http, images=(b"image-a", b"image-b"), **params) -> dict:
+    files = [("images", (f"{i}.jpg", image)) for i, image in enumerate(images)]
+    response = await http.post("/uploads", files=files)
+    uploads = [{"upload_id": u["upload_id"], "filename": u["filename"]} for u in response.json()["uploads"]]
+    return (await http.post("/", json={"async": True, "uploads": uploads, **params})).json()
+
+
+def test_health():
+    async def scenario():
+        async with client(FakeBackend()) as http:
+            return (await http.post("/", json={"op": "health"})).json()
+
+    health = asyncio.run(scenario())
+    assert health["status"] == "ok"
+    assert set(health["lanes"]) == set(modal_app.ADMISSION_LANES)
+    assert health["lanes"]["full"]["queued"] == 0
+
+
+def test_admission_rejects_saturated_lane():
+    backend = FakeBackend(latency=60, capacity=2)
+    max_queued = modal_app.ADMISSION_LANES["full"]["max_queued"]
+
+    async def scenario():
+        async with client(backend) as http:
+            full = [
+                await upload_and_process(http, images=[b"gen3c-%d" % i], gen3c_enabled=True)
+                for i in range(2 + max_queued)
+            ]
+            # Saturated full lane: a new GEN3C job is turned away…
+            response = await http.post("/uploads", files=[("images", ("x.jpg", b"one more"))])
+            uploads = response.json()["uploads"]
+            rejected = await http.post("/", json={"async": True, "uploads": uploads, "gen3c_enabled": True})
+            # …but a duplicate of a running job still attaches, and previews are admitted
+            duplicate = await upload_and_process(http, images=[b"gen3c-0"], gen3c_enabled=True)
+            preview = await upload_and_process(http, images=[b"preview"])
+            health = (await http.post("/", json={"op": "health"})).json()
+            return full, rejected, duplicate, preview, health
+
+    full, rejected, duplicate, preview, health = asyncio.run(scenario())
+    assert full[-1]["queue"]["queued"] == max_queued - 1
+    assert full[-1]["queue"]["estimated_wait_seconds"] > 0
+    assert rejected.status_code == 429 and int(rejected.headers["retry-after"]) > 0
+    assert rejected.json()["queue"]["saturated"]
+    assert duplicate["coalesced"] and duplicate["call_id"] == full[0]["call_id"]
+    assert preview["status"] == "processing" and preview["queue"]["lane"] == "preview"
+    assert health["lanes"]["full"]["saturated"] and not health["lanes"]["preview"]["saturated"]
+    # The rejected request released its coalescing claim
+    claims = [value for key, value in backend.inflight.items() if key.startswith("fingerprint:")]
+    assert all(claim["call_id"] is not None for claim in claims)
+
+
+def test_trajectory_fan_out_counts_against_the_full_lane():
+    backend = FakeBackend(latency=60, capacity=2)
+    fan_out = {"gen3c_enabled": True, "gen3c_trajectories": ["clockwise", "counterclockwise", "up"]}
+
+    async def scenario():
+        async with client(backend) as http:
+            # 3 jobs × 3 trajectories = 9 GEN3C inputs on 2 GPUs → 7 queued ≥ max_queued
+            admitted = [await upload_and_process(http, images=[b"orbit-%d" % i], **fan_out) for i in range(3)]
+            rejected = await upload_and_process(http, images=[b"orbit-3"], **fan_out)
+            return admitted, rejected
+
+    admitted, rejected = asyncio.run(scenario())
+    assert [job["queue"]["queued"] for job in admitted] == [0, 1, 4]
+    assert rejected["status"] == "rejected" and rejected["queue"]["queued"] == 7
+
+
+def test_upload_dispatch_poll_and_download():
+    backend = FakeBackend(latency=0.2)
+
+    async def scenario():
+        async with client(backend) as http:
+            started = await upload_and_process(http, output_format="compact")
+            polls = [(await http.post("/", json={"op": "status", "call_id": started["call_id"]})).json()]
+            await asyncio.sleep(0.25)
+            polls.append((await http.post("/", json={"op": "status", "call_id": started["call_id"]})).json())
+            download = await http.get(polls[-1]["url"])
+            return started, polls, download
+
+    started, polls, download = asyncio.run(scenario())
+    call = backend.calls[started["call_id"]]
+    # The GPU function gets upload ids, not image bytes
+    assert call["name"] == "process_image" and call["args"][0] == []
+    assert len(call["kwargs"]["upload_ids"]) == 2
+    assert [p["status"] for p in polls] == ["processing", "completed"]
+    assert download.status_code == 200 and download.content.startswith(b"CSPL")
+    assert download.headers["etag"] == f'"{polls[-1]["sha256"]}"'
+
+
+def test_long_poll_returns_on_progress():
+    backend = FakeBackend(latency=60)
+
+    async def scenario():
+        async with client(backend) as http:
+            call_id = (await upload_and_process(http))["call_id"]
+            first = (await http.post("/", json={"op": "status", "call_id": call_id})).json()
+
+            async def publish():
+                await asyncio.sleep(0.3)
+                progress = _JobProgress(call_id, "anysplat", store=backend.progress_store)
+                progress.stage("export", "compact")
+
+            t0 = time.monotonic()
+            status = {"op": "status", "call_id": call_id, "wait": 10, "since": first["progress"]["updated"]}
+            changed, _ = await asyncio.gather(http.post("/", json=status), publish())
+            waited = time.monotonic() - t0
+
+            # No change within the wait: returns the unchanged progress at the deadline
+            status["since"] = changed.json()["progress"]["updated"]
+            t1 = time.monotonic()
+            unchanged = (await http.post("/", json={**status, "wait": 0.3})).json()
+            return first, changed.json(), waited, unchanged, time.monotonic() - t1
+
+    first, changed, waited, unchanged, timed_out = asyncio.run(scenario())
+    assert first["progress"]["stage"] == "queued"
+    assert changed["progress"]["stage"] == "export" and 0.2 < waited < 5
+    assert changed["progress"]["eta_seconds"] <= 15 and changed["progress"]["pct"] > 60
+    assert unchanged["progress"] == changed["progress"] and timed_out >= 0.3
+
+
+def test_fan_out_progress_reports_the_slowest_trajectory():
+    store = {}
+    progress = _JobProgress("job", "gen3c", store=store)
+    progress.combine(["clockwise", "up"], done=0)
+    assert "job" not in store  # nothing from the parts yet
+
+    _JobProgress(progress.part("clockwise"), "gen3c", store=store).stage("keyframe_sampling")
+    slow = _JobProgress(progress.part("up"), "gen3c", store=store)
+    slow.stage("diffusion")
+    slow.update(11, 22, "step 11/22", force=True)
+    progress.combine(["clockwise", "up"], done=1)
+    assert store["job"]["stage"] == "diffusion" and store["job"]["pct"] == store["job/up"]["pct"]
+    assert store["job"]["detail"] == "step 11/22 — 1/2 trajectories done"
+
+
+def test_preview_then_refine(monkeypatch):
+    monkeypatch.setattr(modal_app, "JOB_STATUS_POLL_INTERVAL", 0.05)
+    backend = FakeBackend(latency=0.6, latencies={"process_image": 0.1})
+
+    async def scenario():
+        async with client(backend) as http:
+            started = await upload_and_process(http, gen3c_enabled=True, preview_refine=True)
+            status = {"op": "status", "call_id": started["call_id"], "wait": 5}
+            first = (await http.post("/", json=status)).json()
+            # The preview shows up on the first poll; the next long-poll waits for the refined result
+            second = (await http.post("/", json={**status, "since": first["progress"]["updated"]})).json()
+            return started, first, second
+
+    started, first, second = asyncio.run(scenario())
+    names = sorted(call["name"] for call in backend.calls.values())
+    assert names == ["gen3c_pipeline", "process_image"]
+    assert first["status"] == "processing" and first["preview"]["url"].startswith("http://router/artifacts/")
+    assert second["status"] == "completed" and "preview" not in second
+    assert second["sha256"] != first["preview"]["sha256"]
+    assert backend.inflight == {}  # preview link and both claims are settled
+
+
+def test_gen3c_trajectories():
+    backend = FakeBackend(latency=60)
+
+    async def scenario():
+        async with client(backend) as http:
+            default = await upload_and_process(http, gen3c_enabled=True)
+            fan_out = await upload_and_process(
+                http, gen3c_enabled=True, gen3c_trajectories=["clockwise", "counterclockwise", "up"]
+            )
+            invalid = await upload_and_process(http, gen3c_enabled=True, gen3c_trajectories=["spiral"])
+            return default, fan_out, invalid
+
+    default, fan_out, invalid = asyncio.run(scenario())
+    # One orbit (one GPU) unless the caller opts into fan-out
+    assert backend.calls[default["call_id"]]["kwargs"]["trajectories"] == ["clockwise"]
+    assert len(backend.calls[fan_out["call_id"]]["kwargs"]["trajectories"]) == 3
+    # The trajectory set is part of the job's identity
+    assert fan_out["call_id"] != default["call_id"] and not fan_out["coalesced"]
+    assert "gen3c_trajectories" in invalid["error"]
+
+
+def test_video_upload(monkeypatch):
+    monkeypatch.setattr(modal_app, "UPLOAD_MAX_FILE_BYTES", 1024)  # videos get UPLOAD_MAX_VIDEO_BYTES
+    backend = FakeBackend(latency=60)
+
+    async def scenario():
+        async with client(backend) as http:
+            photo = await http.post("/uploads", files=[("images", ("big.jpg", bytes(2048)))])
+            response = await http.post("/uploads", files=[("images", ("walk.mp4", bytes(2048)))])
+            video = response.json()["uploads"][0]
+
+            async def process(**params):
+                return (await http.post("/", json={"async": True, "video": video, **params})).json()
+
+            job, smaller, gen3c = await process(), await process(video_max_frames=12), await process(gen3c_enabled=True)
+            return photo, job, smaller, gen3c, video
+
+    photo, job, smaller, gen3c, video = asyncio.run(scenario())
+    assert photo.status_code == 400
+    call = backend.calls[job["call_id"]]
+    assert call["name"] == "process_image" and call["kwargs"]["video_upload_id"] == video["upload_id"]
+    assert "upload_ids" not in call["kwargs"]
+    # The keyframe budget is part of the job's identity
+    assert smaller["call_id"] != job["call_id"]
+    assert "AnySplat only" in gen3c["error"]
+
+
+def test_input_size_ladder():
+    backend = FakeBackend()
+
+    async def scenario():
+        async with client(backend) as http:
+            draft = await upload_and_process(http, input_size=224, **{"async": False})
+            full = await upload_and_process(http, **{"async": False})
+            gen3c = await upload_and_process(http, gen3c_enabled=True, input_size=336)
+            invalid = await upload_and_process(http, input_size=512)
+            return draft, full, gen3c, invalid
+
+    draft, full, gen3c, invalid = asyncio.run(scenario())
+    assert draft["input_size"] == 224 and full["input_size"] == modal_app.ANYSPLAT_INPUT_SIZE
+    # Each size is its own result (no cache hit across tiers)
+    assert draft["url"] != full["url"] and not full.get("cached")
+    assert backend.calls[gen3c["call_id"]]["kwargs"]["input_size"] == 336
+    assert "input_size" in invalid["error"]
+
+
+def test_sh_codebook_size_is_bounded():
+    async def scenario():
+        async with client(FakeBackend()) as http:
+            params = {"output_format": "compact"}
+            too_big = await upload_and_process(http, sh_codebook_size=modal_app.SH_CODEBOOK_MAX_SIZE + 1, **params)
+            largest = await upload_and_process(http, sh_codebook_size=modal_app.SH_CODEBOOK_MAX_SIZE, **params)
+            return too_big, largest
+
+    too_big, largest = asyncio.run(scenario())
+    assert "sh_codebook_size" in too_big["error"]
+    assert largest["status"] == "processing"
+
+
+def test_status_reports_gen3c_peak_memory():
+    async def scenario():
+        async with client(FakeBackend()) as http:
+            job = await upload_and_process(http, gen3c_enabled=True, gen3c_memory_mode="auto")
+            return (await http.post("/", json={"op": "status", "call_id": job["call_id"]})).json()
+
+    status = asyncio.run(scenario())
+    assert status["status"] == "completed"
+    assert status["gen3c_gpu"]["peak_gb"] == 61.5
+    assert status["gen3c_gpu"]["trajectories"]["clockwise"]["memory_mode"] == "auto"
+
+
+def test_repeat_request_is_served_from_cache():
+    backend = FakeBackend()
+
+    async def scenario():
+        async with client(backend) as http:
+            first = await upload_and_process(http)
+            await http.post("/", json={"op": "status", "call_id": first["call_id"]})
+            return await upload_and_process(http)
+
+    second = asyncio.run(scenario())
+    assert second["cached"] and second["status"] == "completed"
+    assert len(backend.calls) == 1
+
+
+def test_duplicate_requests_coalesce():
+    backend = FakeBackend(latency=0.3)
+
+    async def scenario():
+        async with client(backend) as http:
+            # Double submit, then a sync retry, all for the same inputs
+            first, second = await asyncio.gather(upload_and_process(http), upload_and_process(http))
+            running = dict(backend.inflight)
+            sync = await upload_and_process(http, **{"async": False})
+            settled = dict(backend.inflight)
+            # A different output format is a different job
+            other = await upload_and_process(http, output_format="compact")
+            return first, second, running, sync, settled, other
+
+    first, second, running, sync, settled, other = asyncio.run(scenario())
+    assert first["call_id"] == second["call_id"]
+    assert running[f"call:{first['call_id']}"]
+    assert [first["coalesced"], second["coalesced"]].count(True) == 1
+    assert sync["coalesced"] and sync["url"].startswith("http://router/artifacts/")
+    assert settled == {}  # records expire once the call settles
+    assert other["call_id"] != first["call_id"] and not other["coalesced"]
+    assert len(backend.calls) == 2
+
+
+def test_exhausted_claim_is_rejected_as_busy(monkeypatch):
+    monkeypatch.setattr(modal_app, "INFLIGHT_CLAIM_ATTEMPTS", 3)
+    monkeypatch.setattr(modal_app, "INFLIGHT_CLAIM_RETRY", 0.01)
+
+    class ContendedBackend(FakeBackend):
+        """Another router holds a fresh, still-pending claim on every fingerprint."""
+
+        async def inflight_put(self, key, value, skip_if_exists=False):
+            if skip_if_exists and key.startswith("fingerprint:"):
+                self.inflight.setdefault(key, {"call_id": None, "started": time.time()})
+                return False
+            return await super().inflight_put(key, value, skip_if_exists)
+
+    backend = ContendedBackend()
+
+    async def scenario():
+        async with client(backend) as http:
+            files = [("images", ("0.jpg", b"image-a"))]
+            uploads = (await http.post("/uploads", files=files)).json()["uploads"]
+            return await http.post("/", json={"async": True, "uploads": uploads})
+
+    response = asyncio.run(scenario())
+    assert response.status_code == 429 and response.json()["status"] == "rejected"
+    assert "Retry-After" in response.headers
+    assert backend.calls == {}  # never spawned behind the other router's back
+
+
+def test_use_cache_false_skips_finished_calls():
+    backend = FakeBackend()
+
+    async def scenario():
+        async with client(backend) as http:
+            first = await upload_and_process(http)  # finishes at once, nobody polls it
+            attached = await upload_and_process(http)
+            fresh = await upload_and_process(http, use_cache=False)
+            return first, attached, fresh
+
+    first, attached, fresh = asyncio.run(scenario())
+    assert attached["call_id"] == first["call_id"] and attached["coalesced"]
+    assert fresh["call_id"] != first["call_id"] and not fresh["coalesced"]
+
+
+def test_failed_call_is_not_reused():
+    backend = FakeBackend(fail=True)
+
+    async def scenario():
+        async with client(backend) as http:
+            first = await upload_and_process(http)
+            second = await upload_and_process(http)
+            status = (await http.post("/", json={"op": "status", "call_id": second["call_id"]})).json()
+            return first, second, status
+
+    first, second, status = asyncio.run(scenario())
+    assert second["call_id"] != first["call_id"] and not second["coalesced"]
+    assert status["status"] == "failed" and "out of memory" in status["error"]
+
+
+def test_unknown_call_and_upload():
+    async def scenario():
+        async with client(FakeBackend()) as http:
+            status = (await http.post("/", json={"op": "status", "call_id": "fc-missing"})).json()
+            process = (await http.post("/", json={"uploads": [{"upload_id": "0" * 64}]})).json()
+            return status, process
+
+    status, process = asyncio.run(scenario())
+    assert status["status"] == "failed"
+    assert "Unknown upload" in process["error"]
+
+
+async def load_test(requests: int, concurrency: int, latency: float = 0.05) -> dict:
+    """Hammer the router with status polls for `concurrency` in-flight jobs."""
+    backend = FakeBackend(latency=latency)
+    timings: list[float] = []
+    async with client(backend) as http:
+        call_ids = [(await upload_and_process(http, images=[b"job-%d" % i]))["call_id"] for i in range(concurrency)]
+
+        async def worker(call_id: str, n: int):
+            for _ in range(n):
+                t0 = time.perf_counter()
+                response = await http.post("/", json={"op": "status", "call_id": call_id})
+                timings.append(time.perf_counter() - t0)
+                assert response.json()["status"] in ("processing", "completed")
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(worker(call_id, requests // concurrency) for call_id in call_ids))
+        elapsed = time.perf_counter() - t0
+
+    timings.sort()
+    return {
+        "requests": len(timings),
+        "seconds": elapsed,
+        "rps": len(timings) / elapsed,
+        "p50_ms": 1000 * timings[len(timings) // 2],
+        "p99_ms": 1000 * timings[int(len(timings) * 0.99)],
+    }
+
+
+def test_concurrent_status_polls():
+    stats = asyncio.run(load_test(requests=1000, concurrency=50))
+    assert stats["requests"] == 1000
+
+
+if __name__ == "__main__":
+    import argparse
+    import tempfile
+
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds until a fake call completes")
+    cli = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in ("ARTIFACT_DIR", "UPLOAD_DIR", "RESULT_CACHE_DIR"):
+            setattr(modal_app, name, f"{tmp}/{name.lower()}")
+        stats = asyncio.run(load_test(cli.requests, cli.concurrency, cli.latency))
+    print(
+        f"📊 {stats['requests']:,} status polls in {stats['seconds']:.2f}s — "
+        f"{stats['rps']:,.0f} req/s, p50 {stats['p50_ms']:.1f} ms, p99 {stats['p99_ms']:.1f} ms"
+    )
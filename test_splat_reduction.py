@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Tests for the post-inference Gaussian reduction (pruning + voxel LOD).
+
+Usage:
+    python -m pytest -q test_splat_reduction.py
+
+Runs the same torch code the GPU uses, on CPU, with synthetic Gaussians.
+"""
+
+import pytest
+
+torch = pytest.importorskip("torch")
+
+from modal_app import PRUNE_MIN_OPACITY, _prune_gaussians, _voxel_merge  # noqa: E402
+
+
+def random_splat(n: int, seed: int = 0) -> dict:
+    g = torch.Generator().manual_seed(seed)
+    rotations = torch.randn(n, 4, generator=g)
+    return {
+        "means": torch.randn(n, 3, generator=g),
+        "scales": torch.rand(n, 3, generator=g) * 0.05 + 1e-3,
+        "rotations": rotations / rotations.norm(dim=1, keepdim=True),
+        "harmonics": torch.randn(n, 3, 9, generator=g),
+        "opacities": torch.rand(n, generator=g) * 0.9 + 0.1,
+    }
+
+
+def test_prune_drops_transparent_and_tiny():
+    splat = random_splat(1000)
+    splat["opacities"][:10] = PRUNE_MIN_OPACITY / 2
+    splat["scales"][10:20] = 1e-9
+    pruned = _prune_gaussians(splat)
+    assert pruned["means"].shape[0] == 980
+    assert all(t.shape[0] == 980 for t in pruned.values())
+
+
+@pytest.mark.parametrize("budget", [1000, 5000])
+def test_voxel_merge_fits_budget(budget):
+    splat = random_splat(20000)
+    merged = _voxel_merge(splat, budget)
+    n = merged["means"].shape[0]
+    assert budget * 0.8 <= n <= budget
+    assert merged["harmonics"].shape == (n, 3, 9)
+    assert torch.allclose(merged["rotations"].norm(dim=1), torch.ones(n), atol=1e-5)
+    assert float(merged["opacities"].min()) >= float(splat["opacities"].min()) - 1e-6
+    assert float(merged["opacities"].max()) <= 1.0
+    # Merged Gaussians stay inside the original bounds
+    assert torch.all(merged["means"] >= splat["means"].amin(dim=0) - 1e-5)
+    assert torch.all(merged["means"] <= splat["means"].amax(dim=0) + 1e-5)
+
+
+def test_voxel_merge_keeps_small_sets():
+    splat = random_splat(500)
+    assert _voxel_merge(splat, 1000) is splat
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Tests for the content-addressed upload store behind anysplat_upload.
+
+Usage:
+    python -m pytest -q test_upload_store.py
+
+Streams chunked bodies through _store_upload into a temporary directory and
+reads them back with _read_uploads, the way the GPU functions do.
+"""
+
+import asyncio
+import os
+
+import pytest
+
+from modal_app import _read_uploads, _result_cache_key, _sha256, _store_upload
+
+
+async def chunked(data: bytes, size: int = 1000):
+    for i in range(0, len(data), size):
+        yield data[i : i + size]
+
+
+def store(root, data: bytes, **kwargs) -> dict:
+    return asyncio.run(_store_upload(str(root), chunked(data), **kwargs))
+
+
+def test_upload_round_trip(tmp_path):
+    data = os.urandom(10_000)
+    stored = store(tmp_path, data)
+    assert stored == {"upload_id": _sha256(data), "size": len(data)}
+    assert _read_uploads(str(tmp_path), [stored["upload_id"]]) == [data]
+    # The id is the digest the router keys the result cache on
+    assert _result_cache_key([stored["upload_id"]]) == _result_cache_key([_sha256(data)])
+
+
+def test_duplicate_upload_is_stored_once(tmp_path):
+    data = os.urandom(5000)
+    assert store(tmp_path, data) == store(tmp_path, data)
+    assert os.listdir(tmp_path) == [_sha256(data)]
+
+
+@pytest.mark.parametrize("data", [b"", bytes(2048)])
+def test_rejects_empty_and_oversized(tmp_path, data):
+    with pytest.raises(ValueError):
+        store(tmp_path, data, max_file_bytes=1024)
+    assert os.listdir(tmp_path) == []  # no temp files left behind
+
+
+def test_unknown_upload_ids(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        _read_uploads(str(tmp_path), ["0" * 64])
+    with pytest.raises(FileNotFoundError):
+        _read_uploads(str(tmp_path), ["../secret"])
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Tests for the online keyframe picker behind video uploads.
+
+Usage:
+    python -m pytest -q test_video_keyframes.py
+
+Feeds synthetic panning videos to _VideoKeyframes one frame at a time, the
+way _video_keyframes streams ffmpeg's output into it.
+"""
+
+from modal_app import VIDEO_CANDIDATE_WINDOW, _is_video, _VideoKeyframes
+from test_gen3c_cache import panning_video
+
+
+def pick(video, max_frames: int, **kwargs) -> tuple[list[int], int]:
+    """(picked frame indices, most frames ever held by the picker)."""
+    picker = _VideoKeyframes(max_frames, **kwargs)
+    held = 0
+    for t, frame in enumerate(video):
+        picker.push(float(t), frame)
+        held = max(held, len(picker.keyframes) + len(picker.candidates))
+    return [int(t) for t, _ in picker.finish()], held
+
+
+def test_static_footage_yields_one_keyframe():
+    # The camera holds still for 40 frames, then pans
+    video = panning_video([0] * 40 + list(range(0, 160, 2)))
+    indices, _ = pick(video, 48)
+    assert sum(t < 40 for t in indices) == 1
+    assert sum(t >= 40 for t in indices) >= 10
+    assert indices == sorted(indices)
+
+
+def test_memory_is_bounded_by_the_budget():
+    sweep = list(range(0, 192, 2))
+    video = panning_video(sweep + sweep[::-1] + sweep + sweep[::-1])  # long back-and-forth pan
+    indices, held = pick(video, 8)
+    assert 4 <= len(indices) <= 8
+    assert held <= 8 + VIDEO_CANDIDATE_WINDOW
+    # Thinning keeps the picks spread over the whole video
+    assert indices[0] < len(video) // 8 and indices[-1] > len(video) * 3 // 4
+
+
+def test_prefers_sharp_frames():
+    video = panning_video(range(0, 120), blurred=range(1, 120, 2))
+    indices, _ = pick(video, 48)
+    assert indices and all(t % 2 == 0 for t in indices)
+
+
+def test_is_video():
+    assert _is_video("walkaround.MOV") and _is_video("clip", "video/mp4")
+    assert not _is_video("photo.jpg", "image/jpeg") and not _is_video(None)
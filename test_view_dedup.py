@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""
+Tests for near-duplicate filtering of multi-image uploads.
+
+Usage:
+    python -m pytest -q test_view_dedup.py
+
+Runs the same torch code the GPU uses, on CPU, with synthetic views: a
+"burst" of slightly perturbed copies of one scene next to distinct scenes.
+"""
+
+import pytest
+
+torch = pytest.importorskip("torch")
+
+from modal_app import _dedupe_views  # noqa: E402
+
+
+def scene(seed: int) -> "torch.Tensor":
+    """A smooth random [3, 448, 448] view in [-1, 1]."""
+    g = torch.Generator().manual_seed(seed)
+    coarse = torch.rand(1, 3, 7, 7, generator=g) * 2 - 1
+    return torch.nn.functional.interpolate(coarse, size=(448, 448), mode="bicubic")[0].clamp(-1, 1)
+
+
+def blurred(view: "torch.Tensor") -> "torch.Tensor":
+    return torch.nn.functional.avg_pool2d(view[None], 9, stride=1, padding=4, count_include_pad=False)[0]
+
+
+def test_burst_keeps_sharpest_shot():
+    g = torch.Generator().manual_seed(0)
+    base = scene(0)
+    sharp = (base + 0.05 * torch.randn(base.shape, generator=g)).clamp(-1, 1)  # fine detail
+    views = torch.stack([blurred(sharp), sharp, blurred(sharp) + 0.01, scene(1), scene(2)])
+
+    duplicate_of = _dedupe_views(views)
+    assert duplicate_of == [1, None, 1, None, None]
+
+
+def test_distinct_views_are_all_kept():
+    views = torch.stack([scene(seed) for seed in range(6)])
+    assert _dedupe_views(views) == [None] * 6
+
+    # The same scene after a real camera move has parallax worth keeping
+    wide = torch.nn.functional.interpolate(scene(0)[None], size=(600, 600), mode="bilinear")[0]
+    panned = torch.stack([wide[:, 50:498, 50:498], wide[:, 50:498, 110:558]])
+    assert _dedupe_views(panned) == [None, None]
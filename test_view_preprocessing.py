@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Tests for the batched view preprocessing in front of AnySplat.
+
+Usage:
+    python -m pytest -q test_view_preprocessing.py
+
+Compares _preprocess_views (roi_align, CPU here) with the per-view PIL
+crop + Lanczos resize it replaced.  Skipped without torchvision or PIL.
+"""
+
+import numpy as np
+import pytest
+
+torch = pytest.importorskip("torch")
+pytest.importorskip("torchvision")
+Image = pytest.importorskip("PIL.Image")
+
+import modal_app  # noqa: E402
+from modal_app import _preprocess_views, _view_boxes  # noqa: E402
+
+
+def smooth_image(h: int, w: int, phase: float) -> np.ndarray:
+    """uint8 [h, w, 3] low-frequency test pattern (resamplers agree on it)."""
+    y, x, c = np.mgrid[:h, :w, :3]
+    img = 128 + 60 * np.sin(x / 37 + phase + c) + 50 * np.cos(y / 29 - phase)
+    return img.clip(0, 255).astype(np.uint8)
+
+
+def pil_views(img: np.ndarray, augment: bool, size: int) -> np.ndarray:
+    """The old make_view path: PIL crop → Lanczos resize → [-1, 1]."""
+    pil = Image.fromarray(img)
+    views = []
+    for box in _view_boxes(img.shape[1], img.shape[0], augment):
+        resized = pil.crop(box).resize((size, size), Image.LANCZOS)
+        views.append(np.asarray(resized, dtype=np.float32).transpose(2, 0, 1) / 255.0 * 2.0 - 1.0)
+    return np.stack(views)
+
+
+@pytest.mark.parametrize("augment", [False, True])
+def test_matches_pil_crop_resize(monkeypatch, augment):
+    monkeypatch.setattr(modal_app, "VIEW_BATCH_IMAGES", 2)  # several slices per size group
+    images = [smooth_image(300, 400, p) for p in range(3)] + [smooth_image(360, 270, p) for p in range(2)]
+    views = _preprocess_views(images, augment=augment, device="cpu", size=112).numpy()
+
+    expected = np.concatenate([pil_views(img, augment, 112) for img in images])
+    assert views.shape == expected.shape
+    assert np.abs(views - expected).mean() < 0.02
+    assert np.abs(views - expected).max() < 0.15
+
+
+def test_slicing_does_not_change_views(monkeypatch):
+    frames = torch.from_numpy(np.stack([smooth_image(240, 320, p) for p in range(5)]))
+    whole = _preprocess_views(frames, augment=False, device="cpu", size=64)
+    monkeypatch.setattr(modal_app, "VIEW_BATCH_IMAGES", 2)
+    sliced = _preprocess_views(frames, augment=False, device="cpu", size=64)
+    torch.testing.assert_close(sliced, whole)
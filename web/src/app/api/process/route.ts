@@ -29,6 +29,9 @@ const IS_VERCEL = process.env.VERCEL === "1";
 const MODAL_ENDPOINT =
   process.env.MODAL_ENDPOINT ||
   "https://revelium-studio--anysplat-anysplat-router.modal.run";
+// Binary uploads go to the router's /uploads route: images are streamed to
+// Modal's volume first and the JSON request only carries their upload ids
+const MODAL_UPLOAD_ENDPOINT = process.env.MODAL_UPLOAD_ENDPOINT || `${MODAL_ENDPOINT}/uploads`;
 
 // Paths for local development
 const PROJECT_ROOT = path.resolve(process.cwd(), "..");
@@ -43,6 +46,8 @@ interface JobStatus {
   status: "processing" | "completed" | "failed";
   splatUrl?: string;
   plyBase64?: string;
+  artifactUrl?: string;
+  format?: OutputFormat;
   error?: string;
   fileName: string;
   startTime: number;
@@ -61,6 +66,10 @@ async function getJobStatus(jobId: string): Promise<JobStatus | null> {
   return JSON.parse(data);
 }
 
+// Splat encoding returned by Modal: "compact" keeps SH up to degree 2 within
+// Vercel's response limit and is decoded in the viewer (lib/compactSplat.ts)
+type OutputFormat = "ply" | "compact" | "progressive";
+
 // GEN3C + Modal configuration
 interface Gen3cConfig {
   enabled: boolean;
@@ -68,47 +77,63 @@ interface Gen3cConfig {
   movementDistance: number;
 }
 
+// The router's admission control turned the job away (HTTP 429)
+class ModalQueueFullError extends Error {
+  constructor(message: string, public retryAfter: number) {
+    super(message);
+  }
+}
+
+interface ModalUpload {
+  upload_id: string;
+  filename: string;
+}
+
+// Stream the raw image files to Modal's upload store (multipart, no base64)
+async function uploadToModal(files: File[]): Promise<ModalUpload[]> {
+  const form = new FormData();
+  for (const file of files) form.append("images", file, file.name);
+
+  const response = await fetch(MODAL_UPLOAD_ENDPOINT, {
+    method: "POST",
+    body: form,
+    signal: AbortSignal.timeout(60000),
+  });
+  const result = await response.json().catch(() => ({}));
+  if (!response.ok || !result.uploads) {
+    throw new Error(`Failed to upload to Modal: ${response.status} - ${result.error ?? "no uploads returned"}`);
+  }
+  return result.uploads;
+}
+
 // Process with Modal (GPU cloud) — supports single or multiple images
 async function processWithModal(
-  images: Array<{ base64: string; filename: string }>,
+  uploads: ModalUpload[],
   prompt: string = "",
   elevation: number = 20,
-  gen3c: Gen3cConfig = { enabled: true, diffusionSteps: 18, movementDistance: 0.3 }
-): Promise<{ callId: string } | { plyBase64: string }> {
+  gen3c: Gen3cConfig = { enabled: true, diffusionSteps: 18, movementDistance: 0.3 },
+  outputFormat: OutputFormat = "compact"
+): Promise<{ callId: string } | { artifactUrl: string; format: OutputFormat }> {
   const mode = gen3c.enabled ? "GEN3C → AnySplat" : "AnySplat";
-  console.log(`🚀 Sending ${images.length} image(s) to Modal (${mode})...`);
+  console.log(`🚀 Sending ${uploads.length} uploaded image(s) to Modal (${mode})...`);
   console.log(`📍 Modal endpoint: ${MODAL_ENDPOINT}`);
   if (gen3c.enabled) {
     console.log(`   GEN3C: steps=${gen3c.diffusionSteps}, distance=${gen3c.movementDistance}`);
   }
 
-  // Build the request body.  If only one image, use backward-compatible
-  // single-image fields.  If multiple, use the "images" array.
-  let body: Record<string, unknown>;
-  if (images.length === 1) {
-    body = {
-      op: "process",
-      image: images[0].base64,
-      filename: images[0].filename,
-      prompt,
-      elevation,
-      async: true,
-      gen3c_enabled: gen3c.enabled,
-      gen3c_diffusion_steps: gen3c.diffusionSteps,
-      gen3c_movement_distance: gen3c.movementDistance,
-    };
-  } else {
-    body = {
-      op: "process",
-      images: images.map((i) => ({ image: i.base64, filename: i.filename })),
-      prompt,
-      elevation,
-      async: true,
-      gen3c_enabled: gen3c.enabled,
-      gen3c_diffusion_steps: gen3c.diffusionSteps,
-      gen3c_movement_distance: gen3c.movementDistance,
-    };
-  }
+  const body = {
+    op: "process",
+    uploads,
+    prompt,
+    elevation,
+    async: true,
+    gen3c_enabled: gen3c.enabled,
+    gen3c_diffusion_steps: gen3c.diffusionSteps,
+    gen3c_movement_distance: gen3c.movementDistance,
+    // Serve a quick AnySplat-only preview while GEN3C refines the result
+    preview_refine: gen3c.enabled,
+    output_format: outputFormat,
+  };
 
   const response = await fetch(MODAL_ENDPOINT, {
     method: "POST",
@@ -117,6 +142,16 @@ async function processWithModal(
     signal: AbortSignal.timeout(60000),
   });
 
+  if (response.status === 429) {
+    const rejected = await response.json().catch(() => ({}));
+    const retryAfter = rejected.retry_after ?? parseInt(response.headers.get("Retry-After") || "60", 10);
+    console.warn(`🚦 Modal queue full: ${rejected.error ?? "rejected"} (retry in ${retryAfter}s)`);
+    throw new ModalQueueFullError(
+      `The processing queue is full right now. Please try again in about ${Math.ceil(retryAfter / 60)} minute(s).`,
+      retryAfter
+    );
+  }
+
   if (!response.ok) {
     const errorText = await response.text();
     console.error(`❌ Modal request failed: ${response.status} - ${errorText}`);
@@ -134,9 +169,9 @@ async function processWithModal(
     return { callId: result.call_id };
   }
   
-  if (result.ply) {
+  if (result.url) {
     console.log(`✅ Modal returned synchronous result`);
-    return { plyBase64: result.ply };
+    return { artifactUrl: result.url, format: result.format ?? "ply" };
   }
   
   throw new Error("Unexpected response from Modal");
@@ -255,26 +290,23 @@ export async function POST(request: NextRequest) {
       (formData.get("gen3c_movement_distance") as string) || "0.3"
     );
 
+    const requestedFormat = formData.get("output_format");
+    const outputFormat: OutputFormat =
+      requestedFormat === "ply" || requestedFormat === "progressive" ? requestedFormat : "compact";
+
     const mode = gen3cEnabled ? "GEN3C → AnySplat" : "AnySplat";
     console.log(`🚀 Starting Modal ${mode} processing with ${files.length} image(s)...`);
     if (gen3cEnabled) {
       console.log(`   GEN3C: steps=${gen3cDiffusionSteps}, distance=${gen3cMovementDistance}`);
     }
 
-    // Convert all files to base64
-    const images: Array<{ base64: string; filename: string }> = [];
-    for (const file of files) {
-      const bytes = await file.arrayBuffer();
-      const buffer = Buffer.from(bytes);
-      images.push({ base64: buffer.toString("base64"), filename: file.name });
-    }
-
     try {
-      const result = await processWithModal(images, prompt, elevation, {
+      const uploads = await uploadToModal(files);
+      const result = await processWithModal(uploads, prompt, elevation, {
         enabled: gen3cEnabled,
         diffusionSteps: gen3cDiffusionSteps,
         movementDistance: gen3cMovementDistance,
-      });
+      }, outputFormat);
 
       if ("callId" in result) {
         console.log(`✅ Modal async job created with call_id: ${result.callId}`);
@@ -288,10 +320,16 @@ export async function POST(request: NextRequest) {
         return corsResponse(NextResponse.json({
           success: true,
           status: "completed",
-          plyBase64: result.plyBase64,
+          artifactUrl: result.artifactUrl,
+          format: result.format,
         }));
       }
     } catch (modalError) {
+      if (modalError instanceof ModalQueueFullError) {
+        const response = NextResponse.json({ error: modalError.message }, { status: 429 });
+        response.headers.set("Retry-After", String(modalError.retryAfter));
+        return corsResponse(response);
+      }
       const errorMessage = modalError instanceof Error ? modalError.message : "Failed to process with Modal";
       console.error("❌ Failed to process with Modal:", errorMessage);
       return corsResponse(NextResponse.json(
@@ -312,6 +350,10 @@ export async function POST(request: NextRequest) {
 export async function GET(request: NextRequest) {
   const { searchParams } = new URL(request.url);
   const jobId = searchParams.get("jobId");
+  // Long-poll: the router holds the request until the job's progress moves
+  // past `since` (its last "updated") or the job settles, up to `wait` seconds
+  const since = searchParams.get("since");
+  const wait = Math.min(parseFloat(searchParams.get("wait") || "0") || 0, 20);
 
   if (!jobId) {
     return corsResponse(NextResponse.json({ error: "No jobId provided" }, { status: 400 }));
@@ -330,8 +372,10 @@ export async function GET(request: NextRequest) {
         body: JSON.stringify({
           op: "status",
           call_id: jobId,
+          wait,
+          ...(since ? { since: parseFloat(since) } : {}),
         }),
-        signal: AbortSignal.timeout(30000), // 30 second timeout
+        signal: AbortSignal.timeout(30000 + wait * 1000), // 30 seconds past the long-poll
       });
 
       console.log(`📍 Modal AnySplat router status response: ${response.status}`);
@@ -360,7 +404,12 @@ export async function GET(request: NextRequest) {
         return corsResponse(
           NextResponse.json({
             status: "completed",
-            plyBase64: modalStatus.ply,
+            // The splat is downloaded by the browser straight from Modal's
+            // artifact endpoint, so it never passes through this function
+            artifactUrl: modalStatus.url,
+            format: modalStatus.format ?? "ply",
+            // {kept, dropped: [{filename, duplicate_of}]} when near-duplicate uploads were filtered
+            inputViews: modalStatus.input_views,
             fileName: "",
             startTime: Date.now(),
           })
@@ -382,6 +431,11 @@ export async function GET(request: NextRequest) {
           NextResponse.json({
             status: "processing",
             modalStatus: modalStatus.status,
+            // {stage, stage_pct, pct, eta_seconds, detail, updated}
+            progress: modalStatus.progress,
+            // AnySplat-only preview of a GEN3C job, replaced once it completes
+            previewArtifactUrl: modalStatus.preview?.url,
+            previewFormat: modalStatus.preview?.format,
             fileName: "",
             startTime: Date.now(),
           })
@@ -12,7 +12,10 @@ export interface ProcessedResult {
   originalImage: string;
   splatUrl?: string;
   plyBase64?: string;
+  artifactUrl?: string; // binary download from Modal's artifact endpoint
+  format?: "ply" | "compact" | "progressive"; // encoding of plyBase64 (default "ply")
   fileName: string;
+  refining?: boolean; // a quick preview, shown while the refined splat is computed
 }
 
 // Get the API URL - bypass router for API calls to avoid edge timeout
@@ -51,7 +54,7 @@ export default function Home() {
   // Cleanup on unmount
   useEffect(() => {
     return () => {
-      if (pollingRef.current) clearInterval(pollingRef.current);
+      if (pollingRef.current) clearTimeout(pollingRef.current);
       if (progressRef.current) clearTimeout(progressRef.current);
       if (abortRef.current) abortRef.current.abort();
     };
@@ -97,6 +100,11 @@ export default function Home() {
     async (jobId: string, imagePreviewUrl: string, fileName: string) => {
       const startTime = Date.now();
       const maxDuration = 300000; // 5 minutes max
+      // "updated" of the last server progress seen; the status route
+      // long-polls until the job moves past it
+      let since: number | undefined;
+      // Set once the quick preview is in the viewer; the refined result replaces it
+      let previewShown = false;
 
       const poll = async () => {
         try {
@@ -106,7 +114,8 @@ export default function Home() {
             throw new Error("Processing timeout");
           }
 
-          const response = await fetch(getApiUrl(`/api/process?jobId=${jobId}`));
+          const sinceParam = since !== undefined ? `&since=${since}` : "";
+          const response = await fetch(getApiUrl(`/api/process?jobId=${jobId}&wait=20${sinceParam}`));
           
           // Handle 504 Gateway Timeout specifically
           if (response.status === 504) {
@@ -171,18 +180,18 @@ export default function Home() {
           // Enhanced logging to debug status issues
           console.log(`📊 Polling response status:`, data.status);
           console.log(`📊 Polling response data:`, JSON.stringify(data, null, 2));
-          console.log(`📊 Has plyBase64:`, !!data.plyBase64);
+          console.log(`📊 Has artifact:`, !!(data.artifactUrl || data.plyBase64));
 
           if (data.status === "completed") {
-            if (!data.plyBase64) {
-              console.error("❌ Polling: Job marked as completed but no plyBase64 found!");
+            if (!data.artifactUrl && !data.plyBase64) {
+              console.error("❌ Polling: Job marked as completed but no artifact found!");
               console.error("Full response:", data);
               throw new Error("Processing completed but no output received. The job may have completed without generating a PLY file.");
             }
             
             console.log("✅ Polling: Job completed, animating to 100%");
             if (pollingRef.current) {
-              clearInterval(pollingRef.current);
+              clearTimeout(pollingRef.current);
               pollingRef.current = null;
             }
             if (progressRef.current) {
@@ -212,10 +221,16 @@ export default function Home() {
                 originalImage: imagePreviewUrl,
                 splatUrl: data.splatUrl,
                 plyBase64: data.plyBase64,
+                artifactUrl: data.artifactUrl,
+                format: data.format,
                 fileName: fileName.replace(/\.[^/.]+$/, ""),
               });
               setState("viewer");
             }, 400);
+          } else if (data.status === "failed" && previewShown) {
+            // Keep the preview on screen if the refinement fails
+            console.error("❌ Polling: Refinement failed, keeping the preview:", data.error);
+            setResult((prev) => (prev ? { ...prev, refining: false } : prev));
           } else if (data.status === "failed") {
             console.error("❌ Polling: Job failed:", data.error);
             throw new Error(data.error || "Processing failed");
@@ -229,7 +244,14 @@ export default function Home() {
             let progress = 0;
             const statusUpper = String(runPodStatus).toUpperCase();
             
-            if (statusUpper === "IN_QUEUE" || statusUpper === "QUEUED") {
+            if (data.progress && typeof data.progress.pct === "number") {
+              // Stage-level progress published by the Modal workers
+              progress = Math.min(data.progress.pct, 95);
+              since = data.progress.updated;
+              console.log(
+                `⏳ Stage: ${data.progress.stage} ${data.progress.detail ?? ""}, ETA ${data.progress.eta_seconds ?? "?"}s`
+              );
+            } else if (statusUpper === "IN_QUEUE" || statusUpper === "QUEUED") {
               // In queue: 5% to 15% over first 10 seconds
               const queueTime = Math.min(elapsed, 10000);
               progress = 5 + (queueTime / 10000) * 10;
@@ -246,17 +268,33 @@ export default function Home() {
             }
             
             setProgress((prev) => {
-              const target = Math.min(85, progress);
+              const target = data.progress ? progress : Math.min(85, progress);
               const newProgress = prev + (target - prev) * 0.2;
               return Math.max(prev, newProgress);
             });
             
             console.log(`⏳ Polling: Job still processing, RunPod status: "${runPodStatus}", progress: ${Math.round(progress)}%`);
             console.log(`⏳ Elapsed time: ${Math.round(elapsed / 1000)}s`);
+
+            if (data.previewArtifactUrl && !previewShown) {
+              console.log("👀 Polling: Preview ready, showing it while the result is refined");
+              previewShown = true;
+              setResult({
+                originalImage: imagePreviewUrl,
+                artifactUrl: data.previewArtifactUrl,
+                format: data.previewFormat,
+                fileName: fileName.replace(/\.[^/.]+$/, ""),
+                refining: true,
+              });
+              setState("viewer");
+            }
+
+            // The server already waited for a change, so poll again right away
+            pollingRef.current = setTimeout(poll, data.progress ? 250 : 3000) as unknown as NodeJS.Timeout;
           }
         } catch (err) {
           console.error("❌ Polling error:", err);
-          if (pollingRef.current) clearInterval(pollingRef.current);
+          if (pollingRef.current) clearTimeout(pollingRef.current);
           if (progressRef.current) clearTimeout(progressRef.current);
           setError(err instanceof Error ? err.message : "Processing failed");
           setState("upload");
@@ -264,7 +302,6 @@ export default function Home() {
         }
       };
 
-      pollingRef.current = setInterval(poll, 3000);
       poll();
     },
     []
@@ -409,7 +446,7 @@ export default function Home() {
       }
 
       // Check if this is a synchronous result (Vercel/Modal) or async (local)
-      if (data.status === "completed" && data.plyBase64) {
+      if (data.status === "completed" && (data.artifactUrl || data.plyBase64)) {
         // Synchronous result - smoothly animate to 100%
         console.log("✅ Synchronous completion: Animating to 100%");
         if (progressRef.current) {
@@ -437,6 +474,8 @@ export default function Home() {
           setResult({
             originalImage: imagePreview,
             plyBase64: data.plyBase64,
+            artifactUrl: data.artifactUrl,
+            format: data.format,
             fileName: uploadedImage.name.replace(/\.[^/.]+$/, ""),
           });
           setState("viewer");
@@ -470,7 +509,7 @@ export default function Home() {
   }, [uploadedImage, uploadedImages, imagePreview, pollJobStatus, gen3cEnabled, gen3cDiffusionSteps, gen3cMovementDistance]);
 
   const handleReset = useCallback(() => {
-    if (pollingRef.current) clearInterval(pollingRef.current);
+    if (pollingRef.current) clearTimeout(pollingRef.current);
     if (progressRef.current) clearTimeout(progressRef.current);
     if (abortRef.current) abortRef.current.abort();
 
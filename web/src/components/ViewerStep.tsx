@@ -19,6 +19,14 @@ import {
   Zap,
 } from "lucide-react";
 import type { ProcessedResult } from "@/app/page";
+import {
+  compactSplatToPly,
+  concatSplats,
+  decodeCompactSplat,
+  readProgressiveSplat,
+  streamProgressiveSplat,
+  type CompactSplat,
+} from "@/lib/compactSplat";
 
 interface ViewerStepProps {
   result: ProcessedResult;
@@ -407,6 +415,7 @@ export default function ViewerStep({ result, onBack }: ViewerStepProps) {
   const [isMobile, setIsMobile] = useState(false);
   const viewerInstanceRef = useRef<ExtendedViewer | null>(null);
   const blobUrlRef = useRef<string | null>(null);
+  const plyBufferRef = useRef<ArrayBuffer | null>(null);
   const grainAnimationRef = useRef<number | null>(null);
   const [isEnhancing, setIsEnhancing] = useState(false);
 
@@ -615,11 +624,13 @@ export default function ViewerStep({ result, onBack }: ViewerStepProps) {
   // Initialize viewer
   useEffect(() => {
     if (!containerRef.current) return;
-    if (!result.splatUrl && !result.plyBase64) return;
+    if (!result.splatUrl && !result.plyBase64 && !result.artifactUrl) return;
 
     let mounted = true;
 
     const initViewer = async () => {
+      // Progressive downloads show their first chunks while the rest streams in
+      let stream: AsyncGenerator<CompactSplat[]> | null = null;
       try {
         setIsLoading(true);
         setLoadingProgress(0);
@@ -627,7 +638,48 @@ export default function ViewerStep({ result, onBack }: ViewerStepProps) {
 
         const GaussianSplats3D = await import("@mkkellogg/gaussian-splats-3d");
 
-        if (!mounted || !containerRef.current) return;
+        // Compact results are decoded to a PLY that keeps their higher SH bands
+        let plyBuffer: ArrayBuffer | null = null;
+        let shDegree = 0;
+        const streamed: CompactSplat[] = [];
+        if (result.artifactUrl) {
+          const response = await fetch(result.artifactUrl);
+          if (!response.ok) throw new Error(`Failed to download splat: ${response.status}`);
+          if (result.format === "progressive" && response.body) {
+            stream = streamProgressiveSplat(response.body);
+            const first = await stream.next();
+            if (first.done) throw new Error("Progressive splat stream is empty");
+            streamed.push(...first.value);
+            const splat = concatSplats(streamed);
+            plyBuffer = compactSplatToPly(splat);
+            shDegree = splat.shDegree;
+            plyBufferRef.current = plyBuffer;
+          } else {
+            plyBuffer = await response.arrayBuffer();
+          }
+        } else if (result.plyBase64) {
+          plyBuffer = base64ToArrayBuffer(result.plyBase64);
+        }
+        if (plyBuffer && !stream) {
+          if (result.format === "compact" || result.format === "progressive") {
+            let splat: CompactSplat;
+            if (result.format === "progressive") {
+              const chunks: CompactSplat[] = [];
+              for await (const chunk of readProgressiveSplat(plyBuffer)) chunks.push(chunk);
+              splat = concatSplats(chunks);
+            } else {
+              splat = await decodeCompactSplat(plyBuffer);
+            }
+            plyBuffer = compactSplatToPly(splat);
+            shDegree = splat.shDegree;
+          }
+          plyBufferRef.current = plyBuffer;
+        }
+
+        if (!mounted || !containerRef.current) {
+          void stream?.return(undefined);
+          return;
+        }
         containerRef.current.innerHTML = "";
 
         const viewer = new GaussianSplats3D.Viewer({
@@ -642,7 +694,7 @@ export default function ViewerStep({ result, onBack }: ViewerStepProps) {
           antialiased: false,
           logLevel: GaussianSplats3D.LogLevel.None,
           splatSortDistanceMapPrecision: 16,
-          sphericalHarmonicsDegree: 0,
+          sphericalHarmonicsDegree: shDegree,
           integerBasedSort: true,
           halfPrecisionCovariancesOnGPU: true,
         });
@@ -651,9 +703,8 @@ export default function ViewerStep({ result, onBack }: ViewerStepProps) {
 
         let splatPath: string;
 
-        if (result.plyBase64) {
-          const arrayBuffer = base64ToArrayBuffer(result.plyBase64);
-          const blob = new Blob([arrayBuffer], { type: "application/octet-stream" });
+        if (plyBuffer) {
+          const blob = new Blob([plyBuffer], { type: "application/octet-stream" });
           splatPath = URL.createObjectURL(blob);
           blobUrlRef.current = splatPath;
 
@@ -772,7 +823,30 @@ export default function ViewerStep({ result, onBack }: ViewerStepProps) {
         }
 
         if (mounted) setIsLoading(false);
+
+        // Each later batch of chunks is added as its own scene, so the
+        // refinement shows up without re-uploading what is already drawn
+        if (stream) {
+          for await (const batch of stream) {
+            if (!mounted) break;
+            streamed.push(...batch);
+            const batchUrl = URL.createObjectURL(
+              new Blob([compactSplatToPly(concatSplats(batch))], { type: "application/octet-stream" }),
+            );
+            try {
+              await viewer.addSplatScene(batchUrl, {
+                splatAlphaRemovalThreshold: settings.splatThreshold,
+                showLoadingUI: false,
+                format: GaussianSplats3D.SceneFormat.Ply,
+              });
+            } finally {
+              URL.revokeObjectURL(batchUrl);
+            }
+          }
+          if (mounted) plyBufferRef.current = compactSplatToPly(concatSplats(streamed));
+        }
       } catch (error) {
+        void stream?.return(undefined);
         console.error("Error initializing viewer:", error);
         if (mounted) {
           setIsLoading(false);
@@ -805,7 +879,7 @@ export default function ViewerStep({ result, onBack }: ViewerStepProps) {
         blobUrlRef.current = null;
       }
     };
-  }, [result.splatUrl, result.plyBase64, settings.bgColor]);
+  }, [result.splatUrl, result.plyBase64, result.artifactUrl, result.format, settings.bgColor]);
 
   // Enhance handler
   const handleEnhance = useCallback(async () => {
@@ -835,7 +909,12 @@ export default function ViewerStep({ result, onBack }: ViewerStepProps) {
     let downloadUrl: string;
     let shouldRevoke = false;
 
-    if (result.plyBase64) {
+    if (plyBufferRef.current) {
+      // Decoded PLY, so compact results download in the same format
+      const blob = new Blob([plyBufferRef.current], { type: "application/octet-stream" });
+      downloadUrl = URL.createObjectURL(blob);
+      shouldRevoke = true;
+    } else if (result.plyBase64) {
       downloadUrl = base64ToBlobUrl(result.plyBase64);
       shouldRevoke = true;
     } else if (result.splatUrl) {
@@ -892,6 +971,11 @@ export default function ViewerStep({ result, onBack }: ViewerStepProps) {
 
           <h2 className="absolute left-1/2 transform -translate-x-1/2 text-xs sm:text-sm font-medium text-foreground truncate max-w-[200px] sm:max-w-[300px] hidden sm:block">
             {result.fileName}
+            {result.refining && (
+              <span className="ml-2 text-[10px] sm:text-xs font-medium text-muted opacity-80 border border-muted/30 rounded px-1.5 py-0.5">
+                Refining…
+              </span>
+            )}
           </h2>
 
         <div className="flex items-center gap-1 sm:gap-2 shrink-0">
@@ -0,0 +1,295 @@
+// Decoder for the compact quantized splat format produced by the Modal
+// backend (output_format="compact", see _encode_compact_splat in
+// modal_app.py).  The viewer only understands PLY, so the decoded splats are
+// re-emitted as a standard 3DGS binary PLY with SH up to the encoded degree.
+//
+// Layout (little-endian): 60-byte header, then one zlib stream with
+//   positions  uint16 [N, 3]  relative to the scene bounds
+//   log-scales uint8  [N, 3]  over [logScaleMin, logScaleMax]
+//   opacity    uint8  [N]     over [0, 1]
+//   rotation   uint32 [N]     smallest-three: 2-bit index + 3 × 10 bits
+//   sh_dc      uint8  [N, 3]  over [shDcMin, shDcMax]
+//   sh_rest    shRestBits per coefficient, MSB-first bitstream, ±shRestAbsMax
+//              or, with FLAG_SH_CODEBOOK: uint16 codebook size S,
+//              float16 [S, 3, K] codebook, uint16 [N] indices
+
+const COMPACT_MAGIC = "CSPL";
+const COMPACT_VERSION = 1;
+const HEADER_BYTES = 60;
+const ROTATION_BITS = 10;
+const FLAG_SH_CODEBOOK = 1;
+
+export interface CompactSplat {
+  count: number;
+  shDegree: number;
+  means: Float32Array; // [N, 3]
+  scales: Float32Array; // [N, 3] log-scales
+  rotations: Float32Array; // [N, 4] wxyz
+  opacities: Float32Array; // [N] 0-1
+  shDc: Float32Array; // [N, 3]
+  shRest: Float32Array; // [N, 3, K] channel-major
+}
+
+export function isCompactSplat(buffer: ArrayBuffer): boolean {
+  if (buffer.byteLength < HEADER_BYTES) return false;
+  return new TextDecoder().decode(new Uint8Array(buffer, 0, 4)) === COMPACT_MAGIC;
+}
+
+async function inflate(data: Uint8Array): Promise<ArrayBuffer> {
+  // "deflate" in the Compression Streams API is the zlib-wrapped format
+  const stream = new Blob([data as BlobPart]).stream().pipeThrough(new DecompressionStream("deflate"));
+  return new Response(stream).arrayBuffer();
+}
+
+function float16(bits: number): number {
+  const exponent = (bits >>> 10) & 0x1f;
+  const fraction = bits & 0x3ff;
+  const sign = bits & 0x8000 ? -1 : 1;
+  if (exponent === 0) return sign * fraction * 2 ** -24;
+  if (exponent === 0x1f) return fraction ? NaN : sign * Infinity;
+  return sign * (1 + fraction / 1024) * 2 ** (exponent - 15);
+}
+
+function dequantize(q: number, lo: number, hi: number, bits: number): number {
+  return lo + (q * (hi - lo)) / ((1 << bits) - 1);
+}
+
+export async function decodeCompactSplat(buffer: ArrayBuffer): Promise<CompactSplat> {
+  if (!isCompactSplat(buffer)) throw new Error("Not a compact splat file");
+  const header = new DataView(buffer, 0, HEADER_BYTES);
+  const version = header.getUint8(4);
+  if (version !== COMPACT_VERSION) {
+    throw new Error(`Unsupported compact splat version ${version}`);
+  }
+  const shDegree = header.getUint8(5);
+  const flags = header.getUint16(6, true);
+  const count = header.getUint32(8, true);
+  const f = (i: number) => header.getFloat32(12 + 4 * i, true);
+  const posMin = [f(0), f(1), f(2)];
+  const posMax = [f(3), f(4), f(5)];
+  const [lsMin, lsMax, dcMin, dcMax, restAbsMax] = [f(6), f(7), f(8), f(9), f(10)];
+  const restBits = header.getUint8(56);
+  const numRest = (shDegree + 1) ** 2 - 1;
+
+  const body = new Uint8Array(await inflate(new Uint8Array(buffer, HEADER_BYTES)));
+  const view = new DataView(body.buffer, body.byteOffset, body.byteLength);
+  let offset = 0;
+
+  const means = new Float32Array(count * 3);
+  for (let i = 0; i < count * 3; i++, offset += 2) {
+    const axis = i % 3;
+    means[i] = dequantize(view.getUint16(offset, true), posMin[axis], posMax[axis], 16);
+  }
+
+  const scales = new Float32Array(count * 3);
+  for (let i = 0; i < count * 3; i++) scales[i] = dequantize(body[offset++], lsMin, lsMax, 8);
+
+  const opacities = new Float32Array(count);
+  for (let i = 0; i < count; i++) opacities[i] = dequantize(body[offset++], 0, 1, 8);
+
+  const rotations = new Float32Array(count * 4);
+  const mask = (1 << ROTATION_BITS) - 1;
+  for (let i = 0; i < count; i++, offset += 4) {
+    const packed = view.getUint32(offset, true);
+    const largest = packed >>> (3 * ROTATION_BITS);
+    const others = [
+      (packed >>> (2 * ROTATION_BITS)) & mask,
+      (packed >>> ROTATION_BITS) & mask,
+      packed & mask,
+    ].map((q) => ((q / mask) * 2 - 1) / Math.SQRT2);
+    const dropped = Math.sqrt(Math.max(0, 1 - others.reduce((s, v) => s + v * v, 0)));
+    let k = 0;
+    for (let c = 0; c < 4; c++) {
+      rotations[i * 4 + c] = c === largest ? dropped : others[k++];
+    }
+  }
+
+  const shDc = new Float32Array(count * 3);
+  for (let i = 0; i < count * 3; i++) shDc[i] = dequantize(body[offset++], dcMin, dcMax, 8);
+
+  const stride = 3 * numRest;
+  const shRest = new Float32Array(count * stride);
+  if (flags & FLAG_SH_CODEBOOK && numRest > 0) {
+    const size = view.getUint16(offset, true);
+    offset += 2;
+    const codebook = new Float32Array(size * stride);
+    for (let i = 0; i < codebook.length; i++, offset += 2) codebook[i] = float16(view.getUint16(offset, true));
+    for (let i = 0; i < count; i++, offset += 2) {
+      const entry = view.getUint16(offset, true);
+      shRest.set(codebook.subarray(entry * stride, (entry + 1) * stride), i * stride);
+    }
+  } else {
+    for (let i = 0, bit = offset * 8; i < shRest.length; i++) {
+      let q = 0;
+      for (let b = 0; b < restBits; b++, bit++) {
+        q = (q << 1) | ((body[bit >>> 3] >>> (7 - (bit & 7))) & 1);
+      }
+      shRest[i] = dequantize(q, -restAbsMax, restAbsMax, restBits);
+    }
+  }
+
+  return { count, shDegree, means, scales, rotations, opacities, shDc, shRest };
+}
+
+export function compactSplatToPly(splat: CompactSplat): ArrayBuffer {
+  const numRest = (splat.shDegree + 1) ** 2 - 1;
+  const properties = [
+    "x", "y", "z", "nx", "ny", "nz",
+    "f_dc_0", "f_dc_1", "f_dc_2",
+    ...Array.from({ length: 3 * numRest }, (_, i) => `f_rest_${i}`),
+    "opacity",
+    "scale_0", "scale_1", "scale_2",
+    "rot_0", "rot_1", "rot_2", "rot_3",
+  ];
+  const header =
+    "ply\nformat binary_little_endian 1.0\n" +
+    `element vertex ${splat.count}\n` +
+    properties.map((p) => `property float ${p}\n`).join("") +
+    "end_header\n";
+  const headerBytes = new TextEncoder().encode(header);
+
+  const stride = properties.length;
+  const out = new ArrayBuffer(headerBytes.length + splat.count * stride * 4);
+  new Uint8Array(out).set(headerBytes);
+  const floats = new DataView(out, headerBytes.length);
+
+  let o = 0;
+  const put = (v: number) => {
+    floats.setFloat32(o, v, true);
+    o += 4;
+  };
+  for (let i = 0; i < splat.count; i++) {
+    for (let a = 0; a < 3; a++) put(splat.means[i * 3 + a]);
+    put(0); put(0); put(0);
+    for (let c = 0; c < 3; c++) put(splat.shDc[i * 3 + c]);
+    for (let k = 0; k < 3 * numRest; k++) put(splat.shRest[i * 3 * numRest + k]);
+    // PLY stores opacity as a logit
+    const alpha = Math.min(Math.max(splat.opacities[i], 1e-6), 1 - 1e-6);
+    put(Math.log(alpha / (1 - alpha)));
+    for (let a = 0; a < 3; a++) put(splat.scales[i * 3 + a]);
+    for (let c = 0; c < 4; c++) put(splat.rotations[i * 4 + c]);
+  }
+  return out;
+}
+
+// ── Progressive stream (output_format="progressive") ─────────────────
+// Header "<4sBBHII" (magic "PSPL", version, SH degree, reserved, total
+// Gaussians, chunk count), then "<III" (byte length, Gaussian count, level)
+// per chunk, then the chunks — each a standalone compact blob, coarse first.
+
+const PROGRESSIVE_MAGIC = "PSPL";
+const PROGRESSIVE_VERSION = 1;
+const PROGRESSIVE_HEADER_BYTES = 16;
+const PROGRESSIVE_ENTRY_BYTES = 12;
+
+export function isProgressiveSplat(buffer: ArrayBuffer): boolean {
+  if (buffer.byteLength < PROGRESSIVE_HEADER_BYTES) return false;
+  return new TextDecoder().decode(new Uint8Array(buffer, 0, 4)) === PROGRESSIVE_MAGIC;
+}
+
+// Chunk byte lengths and where the first chunk starts, or null while the
+// header or chunk table of a stream prefix is still incomplete.
+function progressiveLayout(bytes: Uint8Array): { start: number; lengths: number[] } | null {
+  if (bytes.byteLength < PROGRESSIVE_HEADER_BYTES) return null;
+  if (new TextDecoder().decode(bytes.subarray(0, 4)) !== PROGRESSIVE_MAGIC) {
+    throw new Error("Not a progressive splat stream");
+  }
+  const header = new DataView(bytes.buffer, bytes.byteOffset, bytes.byteLength);
+  const version = header.getUint8(4);
+  if (version !== PROGRESSIVE_VERSION) {
+    throw new Error(`Unsupported progressive splat version ${version}`);
+  }
+  const chunks = header.getUint32(12, true);
+  const start = PROGRESSIVE_HEADER_BYTES + chunks * PROGRESSIVE_ENTRY_BYTES;
+  if (bytes.byteLength < start) return null;
+  const lengths = Array.from({ length: chunks }, (_, i) =>
+    header.getUint32(PROGRESSIVE_HEADER_BYTES + i * PROGRESSIVE_ENTRY_BYTES, true),
+  );
+  return { start, lengths };
+}
+
+// Yields the decoded chunks of `buffer` (any prefix of a stream) in order,
+// stopping at the first chunk that has not fully arrived.
+export async function* readProgressiveSplat(buffer: ArrayBuffer): AsyncGenerator<CompactSplat> {
+  const layout = progressiveLayout(new Uint8Array(buffer));
+  if (!layout) return;
+  let offset = layout.start;
+  for (const length of layout.lengths) {
+    if (offset + length > buffer.byteLength) return;
+    yield decodeCompactSplat(buffer.slice(offset, offset + length));
+    offset += length;
+  }
+}
+
+// Reads a stream while it downloads (e.g. a fetch Response.body), yielding
+// the chunks completed by each read as one batch, coarse first, so each
+// prefix can be shown before the rest arrives.  Throws if the stream ends
+// before its last chunk.
+export async function* streamProgressiveSplat(
+  body: ReadableStream<Uint8Array>,
+): AsyncGenerator<CompactSplat[]> {
+  const reader = body.getReader();
+  let bytes = new Uint8Array(64 * 1024);
+  let received = 0;
+  let layout: { start: number; lengths: number[] } | null = null;
+  let offset = 0;
+  let next = 0;
+  try {
+    for (;;) {
+      const { done, value } = await reader.read();
+      if (value) {
+        if (received + value.byteLength > bytes.byteLength) {
+          const grown = new Uint8Array(Math.max(received + value.byteLength, bytes.byteLength * 2));
+          grown.set(bytes.subarray(0, received));
+          bytes = grown;
+        }
+        bytes.set(value, received);
+        received += value.byteLength;
+      }
+      if (!layout && (layout = progressiveLayout(bytes.subarray(0, received)))) {
+        // The table gives the full size: grow once instead of doubling
+        const total = layout.start + layout.lengths.reduce((sum, length) => sum + length, 0);
+        if (total > bytes.byteLength) {
+          const sized = new Uint8Array(total);
+          sized.set(bytes.subarray(0, received));
+          bytes = sized;
+        }
+        offset = layout.start;
+      }
+      const batch: CompactSplat[] = [];
+      while (layout && next < layout.lengths.length && offset + layout.lengths[next] <= received) {
+        batch.push(await decodeCompactSplat(bytes.slice(offset, offset + layout.lengths[next]).buffer));
+        offset += layout.lengths[next++];
+      }
+      if (batch.length) yield batch;
+      if (done) break;
+    }
+    if (!layout || next < layout.lengths.length) throw new Error("Progressive splat stream ended early");
+  } finally {
+    reader.cancel().catch(() => {});
+  }
+}
+
+export function concatSplats(splats: CompactSplat[]): CompactSplat {
+  const count = splats.reduce((sum, s) => sum + s.count, 0);
+  const shDegree = splats.length ? splats[0].shDegree : 0;
+  const join = (key: "means" | "scales" | "rotations" | "opacities" | "shDc" | "shRest") => {
+    const out = new Float32Array(splats.reduce((sum, s) => sum + s[key].length, 0));
+    let o = 0;
+    for (const s of splats) {
+      out.set(s[key], o);
+      o += s[key].length;
+    }
+    return out;
+  };
+  return {
+    count,
+    shDegree,
+    means: join("means"),
+    scales: join("scales"),
+    rotations: join("rotations"),
+    opacities: join("opacities"),
+    shDc: join("shDc"),
+    shRest: join("shRest"),
+  };
+}